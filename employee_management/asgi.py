@@ -9,8 +9,22 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'employee_management.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after the apps are loaded by get_asgi_application().
+from employment.api.events import events_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Serves the Server-Sent Events stream of changes, which Django cannot stream, and passes everything else to Django.
+    """
+    if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH:
+        await events_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,12 +1,32 @@
-from rest_framework.pagination import LimitOffsetPagination, PageNumberPagination
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination, PageNumberPagination
 
 
-class PagePagination(PageNumberPagination):
+class ColumnarPaginationMixin(object):
+    """
+    Returns a page in the columnar format, with the same links and counts as the paginated responses of rows.
+    """
+
+    def get_columnar_paginated_response(self, columns, data):
+        response = self.get_paginated_response(None)
+        response.data.pop('results')
+        response.data['columns'] = columns
+        response.data['data'] = data
+        return response
+
+
+class PagePagination(ColumnarPaginationMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 40
 
 
-class OffsetPagination(LimitOffsetPagination):
+class OffsetPagination(ColumnarPaginationMixin, LimitOffsetPagination):
     default_limit = 10
     max_limit = 40
+
+
+class DateCursorPagination(ColumnarPaginationMixin, CursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 40
+    ordering = ('-create_date', '-id')
@@ -28,6 +28,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'employment.api.middleware.SamplingProfilerMiddleware',
+    'employment.api.middleware.SingleFlightMiddleware',
+    # After SingleFlight, so that requests which wait for an identical one neither take a token nor a slot.
+    'employment.api.middleware.ThrottleMiddleware',
+    # Keep it last so that its render time only covers rendering the response.
+    'employment.api.middleware.ServerTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'employee_management.urls'
@@ -100,3 +106,107 @@ EMPLOYEE_ID_MAX_LEN = 12
 # Salary related constants
 LEADER_COEFFICIENT = 1.1
 FULL_TIME_HOURS = 40
+# Maximum number of employees whose salaries can be requested at once
+SALARY_LOOKUP_MAX_IDS = 5000
+# Maximum number of employees or teams which can be deleted at once (the bulk-delete endpoints)
+BULK_DELETE_MAX_IDS = 5000
+# Maximum number of company employee ids which can be looked up at once (/api/employees/by-code/)
+EMPLOYEE_CODE_LOOKUP_MAX_IDS = 1000
+# Number of employees which each process caches by company employee id (/api/employees/by-code/)
+EMPLOYEE_CODE_CACHE_SIZE = 10000
+# Maximum number of employees of a sync (/api/employees/sync/), and number of rows written per query
+EMPLOYEE_SYNC_MAX_EMPLOYEES = 5000
+EMPLOYEE_SYNC_BATCH_SIZE = 500
+# Maximum number of employee ids of the active employees which were not synced, returned with report_missing
+EMPLOYEE_SYNC_MAX_MISSING = 1000
+
+# Memory mapped snapshot of the workforce, written by the export_snapshot command and read by the /api/snapshot/ views
+SNAPSHOT_PATH = BASE_DIR / 'snapshots' / 'workforce.snapshot'
+# Seconds between two checks for a new snapshot file
+SNAPSHOT_CHECK_INTERVAL = 5
+
+# In-process indexes (membership index, employee autocomplete). Seconds after which a query reads the changes
+# made by other processes from the change log
+INDEX_SYNC_INTERVAL = 1
+# Maximum ?depth= of /api/employees/<id>/colleagues/
+COLLEAGUES_MAX_DEPTH = 3
+# Default and maximum ?limit= of /api/employees/autocomplete/
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Seconds after which a running job which has not reported progress is failed, e.g. because its worker was killed
+JOB_TIMEOUT = 3600
+
+# Batch endpoint (/api/batch/). Maximum number of sub-requests of a batch, and of threads running a parallel batch
+BATCH_MAX_REQUESTS = 50
+BATCH_MAX_WORKERS = 8
+
+# Change feed (/api/changes/). Number of changes returned by default and at most in one response
+CHANGE_FEED_DEFAULT_LIMIT = 100
+CHANGE_FEED_MAX_LIMIT = 1000
+# Number of rows read and written per query when logging the changes of a set based operation
+CHANGE_LOG_BATCH_SIZE = 500
+# Seconds between taking the time of a change and inserting it, also covering the precision of the transaction start
+# times which the database reports. The change log is not read past a missing sequence number while the transaction
+# which may still commit it runs (employment.models.settle_cutoff).
+CHANGE_LOG_SETTLE_TIME = 2
+# Seconds a missing sequence number is waited for when the database does not report its running transactions
+CHANGE_LOG_GAP_TIMEOUT = 600
+
+# Server-Sent Events stream of changes, served by the ASGI application (employee_management/asgi.py)
+EVENTS_PATH = '/api/events/'
+# Seconds between two reads of the change log, and between two keep-alive comments on an idle stream
+EVENTS_POLL_INTERVAL = 0.5
+EVENTS_HEARTBEAT_INTERVAL = 15
+# Number of events which can wait for a slow client before it is disconnected
+EVENTS_QUEUE_SIZE = 1000
+
+# Throttling of the API. Routes (URL names) are limited by the rates of their scope, other routes by 'default'.
+THROTTLE_SCOPES = {
+    'salary_list': 'salaries',
+    'employee_hourly_rate': 'bulk',
+    'employee_bulk_delete': 'bulk',
+    'employee_sync': 'bulk',
+    'team_bulk_delete': 'bulk',
+    'job_create': 'bulk',
+}
+# Scope: (token bucket capacity per client, tokens added per second, maximum requests the route runs at once)
+THROTTLE_RATES = {
+    'default': (100, 20, 50),
+    'salaries': (30, 1, 8),
+    'bulk': (10, 0.2, 2),
+}
+# Cache alias of the throttle state. Use a cache shared by the worker processes to limit them together.
+THROTTLE_CACHE = 'default'
+# Number of trusted proxies which add the client address to X-Forwarded-For. REMOTE_ADDR is used when it is 0.
+THROTTLE_NUM_PROXIES = 0
+# Seconds after which the running requests counter of a route expires when no request of the route starts or ends.
+# It should be longer than the slowest request.
+THROTTLE_RUNNING_TIMEOUT = 300
+
+# Concurrent identical GET requests to these views (URL names) share one response
+SINGLE_FLIGHT_VIEWS = ['salary_list', 'team_list_create']
+# Seconds a request waits for the identical request which computes its response
+SINGLE_FLIGHT_TIMEOUT = 30
+# Alias of a cache shared by the worker processes (e.g. memcached or redis), to share responses between them too.
+# Requests are only shared within each process when it is None.
+SINGLE_FLIGHT_CACHE = None
+# Seconds between two checks of the shared cache for the response of another process
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+# Performance instrumentation
+SERVER_TIMING_ENABLED = True
+# Histogram buckets of the /api/_metrics endpoint (seconds and number of queries)
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+# Sampling profiler. A fraction of requests (0 to 1) is profiled, plus requests which send PROFILER_HEADER
+# with PROFILER_TOKEN as its value. Collapsed stacks for flamegraph tools are written to PROFILER_OUTPUT_DIR.
+PROFILER_SAMPLE_RATE = 0
+PROFILER_HEADER = 'X-Profile'
+PROFILER_TOKEN = None
+PROFILER_OUTPUT_DIR = BASE_DIR / 'profiles'
+# Seconds between two stack samples
+PROFILER_INTERVAL = 0.005
+# Number of profiles kept in the slowest requests index
+PROFILER_SLOWEST_COUNT = 20
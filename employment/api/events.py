@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+from collections import namedtuple
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from rest_framework.utils.encoders import JSONEncoder
+from ..models import Change, Employee, Salary, CHANGE_ENTITIES, settled_sequence, settled_start
+from .serializers import ChangeSerializer, SalarySerializer
+
+logger = logging.getLogger(__name__)
+
+# Salary events are sent for the employees whose salary may be changed by a change.
+SALARY = 'salary'
+ENTITIES = [entity for entity, references in CHANGE_ENTITIES.values()] + [SALARY]
+
+# An event is encoded once and the same bytes are sent to every subscriber which wants it.
+Event = namedtuple('Event', ['seq', 'entity', 'object_id', 'body'])
+
+
+def encode_event(seq, entity, data):
+    return f'id: {seq}\nevent: {entity}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'.encode()
+
+
+def salary_employee_ids(change, previous_leader=None):
+    """
+    Returns the ids of the employees whose salary may be changed by a change.
+    The leader of a team before the change is given as previous_leader, it may have lost its leader bonus.
+    """
+    if change.entity == 'employee':
+        return [change.object_id]
+    if change.entity == 'team':
+        leaders = [change.data['leader']]
+        if previous_leader is not None and previous_leader != change.data['leader']:
+            leaders.append(previous_leader)
+        return leaders
+    return [change.data['employee']]
+
+
+def previous_leader(change):
+    """
+    Returns the leader of the team of a team change before the change, from the previous change of the team.
+    """
+    if change.action == Change.Actions.Create:
+        return None
+    data = Change.objects.filter(entity='team', object_id=change.object_id, id__lt=change.id) \
+        .order_by('-id').values_list('data', flat=True).first()
+    return data['leader'] if data else None
+
+
+def start_position():
+    """
+    Returns the position from which the poller follows the change log, and the sequence numbers after it which are
+    committed already. Those changes were made before the subscribers connected and are not sent. The others after
+    the position are sent when they are committed, even if that is below the last of the committed ones.
+    """
+    since = settled_start()
+    return since, set(Change.objects.filter(id__gt=since).values_list('id', flat=True))
+
+
+def load_events(since, with_salaries):
+    """
+    Returns the events of the changes after the sequence number since, the sequence number to continue from,
+    and whether there are more changes to read at once.
+    """
+    # Drops broken and expired connections between polls, as is done between requests.
+    if not connection.in_atomic_block:
+        close_old_connections()
+    position, more = settled_sequence(since)
+    if position == since:
+        return [], since, more
+    changes = list(Change.objects.filter(id__gt=since, id__lte=position).order_by('id'))
+    events = [Event(change.id, change.entity, change.object_id,
+                    encode_event(change.id, change.entity, ChangeSerializer(change).data)) for change in changes]
+    if with_salaries:
+        # The salary of an employee is sent once, with the sequence number of the last change which affected it.
+        affected = {}
+        for change in changes:
+            leader = previous_leader(change) if change.entity == 'team' else None
+            for employee_id in salary_employee_ids(change, leader):
+                affected[employee_id] = change.id
+        employees = Employee.objects.in_bulk(list(affected))
+        for salary in Salary.for_employees(employees.values()):
+            seq = affected[salary.employee.id]
+            events.append(Event(seq, SALARY, salary.employee.id,
+                                encode_event(seq, SALARY, SalarySerializer(salary).data)))
+        events.sort(key=lambda event: event.seq)
+    return events, position, more
+
+
+class Subscriber(object):
+    """
+    A connected client, with its entity and id filters and the queue of events which are waiting to be sent to it.
+    """
+
+    def __init__(self, entities, ids):
+        self.entities = entities
+        self.ids = ids
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    @property
+    def wants_salaries(self):
+        return not self.entities or SALARY in self.entities
+
+    def wants(self, event):
+        return (not self.entities or event.entity in self.entities) and (not self.ids or event.object_id in self.ids)
+
+    def push(self, event):
+        """
+        Queues an event. A client which does not keep up is disconnected, and replays the events it missed
+        with Last-Event-ID when it reconnects.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class ChangeBroadcaster(object):
+    """
+    Polls the change log and hands the new events to the subscribers of the process.
+    There is a single poller per process, so the DB load does not depend on the number of connected clients.
+    It runs while there are subscribers.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.since = None
+        # Sequence numbers after since which are not sent (start_position)
+        self.skipped = set()
+        self._task = None
+
+    def subscribe(self, subscriber):
+        self.subscribers.add(subscriber)
+        loop = asyncio.get_event_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self.since = None
+            self._task = loop.create_task(self.run())
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def run(self):
+        failures = 0
+        while self.subscribers:
+            try:
+                more = await self.poll()
+            except Exception:
+                # A failed read, e.g. while the database is unavailable, is retried with a growing delay,
+                # the subscribers stay connected and receive the changes once it succeeds.
+                failures += 1
+                delay = min(settings.EVENTS_POLL_INTERVAL * 2 ** failures, settings.EVENTS_HEARTBEAT_INTERVAL)
+                logger.exception('Reading the change log failed, retrying in %s seconds.', delay)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            if not more:
+                await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+
+    async def poll(self):
+        """
+        Reads the changes after the position once and hands their events to the subscribers.
+        Returns whether there are more changes to read at once.
+        """
+        if self.since is None:
+            self.since, self.skipped = await sync_to_async(start_position)()
+            return False
+        with_salaries = any(subscriber.wants_salaries for subscriber in self.subscribers)
+        events, self.since, more = await sync_to_async(load_events)(self.since, with_salaries)
+        if self.skipped:
+            events = [event for event in events if event.seq not in self.skipped]
+            self.skipped = {seq for seq in self.skipped if seq > self.since}
+        for subscriber in list(self.subscribers):
+            for event in events:
+                if subscriber.wants(event):
+                    subscriber.push(event)
+        return more
+
+
+broadcaster = ChangeBroadcaster()
+
+
+async def send_text(send, status, text):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def events_application(scope, receive, send):
+    """
+    ASGI application of the Server-Sent Events stream of changes (settings.EVENTS_PATH).
+    Django 3.2 views cannot stream asynchronously, so the stream is served next to Django by the ASGI application
+    in employee_management/asgi.py. Every connection is a coroutine waiting on its queue, no thread is used per client.
+
+    Clients can filter the events by entity (?entity=employee,salary) and by the id of the changed object
+    (?id=1,2, the employee id for salary events). A client which reconnects with the Last-Event-ID header
+    (or ?since=) first receives the events it missed from the change log.
+    """
+    if scope['method'] != 'GET':
+        await send_text(send, 405, 'Method not allowed.')
+        return
+    params = parse_qs(scope['query_string'].decode())
+    headers = dict(scope['headers'])
+    entities = [entity for value in params.get('entity', []) for entity in value.split(',') if entity]
+    unknown = [entity for entity in entities if entity not in ENTITIES]
+    if unknown:
+        await send_text(send, 400, f"Unknown entities: {', '.join(unknown)}. Entities are: {', '.join(ENTITIES)}.")
+        return
+    since = headers.get(b'last-event-id', b'').decode() or params.get('since', [None])[0]
+    try:
+        ids = {int(object_id) for value in params.get('id', []) for object_id in value.split(',') if object_id}
+        since = int(since) if since is not None else None
+    except ValueError:
+        await send_text(send, 400, 'Ids and the last event id should be integers.')
+        return
+
+    subscriber = Subscriber(entities, ids)
+    broadcaster.subscribe(subscriber)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    get = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Stops nginx from buffering the stream.
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        replayed = 0
+        if since is not None:
+            # Events which arrive during the replay are queued too. Those are skipped by their sequence number.
+            while not disconnected.done():
+                events, since, more = await sync_to_async(load_events)(since, subscriber.wants_salaries)
+                body = b''.join(event.body for event in events if subscriber.wants(event))
+                if body:
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                if not more:
+                    break
+            replayed = since
+        while not subscriber.overflowed:
+            if get is None:
+                get = asyncio.ensure_future(subscriber.queue.get())
+            done, pending = await asyncio.wait({get, disconnected}, timeout=settings.EVENTS_HEARTBEAT_INTERVAL,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                return
+            if get in done:
+                event, get = get.result(), None
+                if event.seq > replayed:
+                    await send({'type': 'http.response.body', 'body': event.body, 'more_body': True})
+            else:
+                # Keeps proxies from closing the idle connection.
+                await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
+        if get is not None:
+            get.cancel()
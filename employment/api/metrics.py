@@ -0,0 +1,98 @@
+from bisect import bisect_left
+from threading import Lock
+from django.conf import settings
+
+
+class Histogram(object):
+    """
+    A cumulative histogram with fixed bucket boundaries, in the shape Prometheus expects.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        # One counter per bucket plus the implicit +Inf bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry(object):
+    """
+    Keeps per-route histograms of request phase durations and DB query counts.
+    The registry lives in the memory of the worker process, so every worker exposes its own numbers.
+    """
+    PHASE_METRIC = 'employment_api_request_phase_seconds'
+    QUERIES_METRIC = 'employment_api_request_db_queries'
+
+    def __init__(self):
+        self._lock = Lock()
+        self._phases = {}
+        self._queries = {}
+
+    def observe(self, method, route, phases, query_count):
+        """
+        Records one request. phases is a dict of phase name to duration in seconds.
+        """
+        with self._lock:
+            for phase, duration in phases.items():
+                key = (method, route, phase)
+                histogram = self._phases.get(key)
+                if histogram is None:
+                    histogram = self._phases[key] = Histogram(settings.METRICS_LATENCY_BUCKETS)
+                histogram.observe(duration)
+            key = (method, route)
+            histogram = self._queries.get(key)
+            if histogram is None:
+                histogram = self._queries[key] = Histogram(settings.METRICS_QUERY_COUNT_BUCKETS)
+            histogram.observe(query_count)
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+            self._queries = {}
+
+    def render(self):
+        """
+        Returns all histograms in the Prometheus text exposition format.
+        """
+        lines = [
+            f'# HELP {self.PHASE_METRIC} Time spent in each phase of an API request.',
+            f'# TYPE {self.PHASE_METRIC} histogram',
+        ]
+        with self._lock:
+            for (method, route, phase), histogram in sorted(self._phases.items()):
+                labels = f'method="{method}",route="{_escape(route)}",phase="{phase}"'
+                lines.extend(_histogram_lines(self.PHASE_METRIC, labels, histogram))
+            lines.append(f'# HELP {self.QUERIES_METRIC} Number of DB queries executed by an API request.')
+            lines.append(f'# TYPE {self.QUERIES_METRIC} histogram')
+            for (method, route), histogram in sorted(self._queries.items()):
+                labels = f'method="{method}",route="{_escape(route)}"'
+                lines.extend(_histogram_lines(self.QUERIES_METRIC, labels, histogram))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, labels, histogram):
+    for bound, count in histogram.cumulative_counts():
+        le = '+Inf' if bound == float('inf') else repr(float(bound))
+        yield f'{name}_bucket{{{labels},le="{le}"}} {count}'
+    yield f'{name}_sum{{{labels}}} {histogram.sum!r}'
+    yield f'{name}_count{{{labels}}} {histogram.count}'
+
+
+# The registry shared by the middleware and the metrics endpoint.
+registry = MetricsRegistry()
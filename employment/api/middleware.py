@@ -0,0 +1,389 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+from contextlib import ExitStack, contextmanager
+from operator import itemgetter
+from threading import Event, Lock, get_ident
+from time import perf_counter, sleep, time
+from urllib.parse import urlencode
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from .metrics import registry
+from .profiling import StackSampler, slowest_requests
+
+API_NAMESPACE = 'employment-api'
+
+
+class RequestTimings(object):
+    """
+    Collects the timings of a single request.
+    Also acts as the DB execute wrapper that counts and times every query of the request.
+    """
+    __slots__ = ('query_count', 'db_time', 'view_start', 'view_end', 'view_start_db_time', 'view_end_db_time')
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.view_start = None
+        self.view_end = None
+        self.view_start_db_time = 0.0
+        self.view_end_db_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.query_count += 1
+
+
+class ServerTimingMiddleware(object):
+    """
+    Measures the DB, serialization and render time of every request to the employment API,
+    returns them in a Server-Timing header and records them in the per-route histograms of employment.api.metrics.
+
+    Serialization time is the time spent in the view minus the time spent waiting for the DB, which for the
+    API views is the time spent building the serializer data.
+    Render time is only measured precisely when this middleware is the last one in settings.MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SERVER_TIMING_ENABLED:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        request.timings = timings
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            response = self.get_response(request)
+        end = perf_counter()
+
+        match = request.resolver_match
+        if match is None or match.namespace != API_NAMESPACE or match.url_name == 'metrics':
+            return response
+
+        phases = {'db': timings.db_time, 'total': end - start}
+        if timings.view_start is not None:
+            view_end = timings.view_end if timings.view_end is not None else end
+            view_end_db_time = timings.view_end_db_time if timings.view_end is not None else timings.db_time
+            view_db_time = view_end_db_time - timings.view_start_db_time
+            phases['serialize'] = max(view_end - timings.view_start - view_db_time, 0.0)
+            if timings.view_end is not None:
+                phases['render'] = end - timings.view_end
+        response['Server-Timing'] = ', '.join(
+            f'{phase};dur={duration * 1000:.2f}' + (f';desc="{timings.query_count} queries"' if phase == 'db' else '')
+            for phase, duration in phases.items()
+        )
+        registry.observe(request.method, match.route, phases, timings.query_count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            timings.view_start = perf_counter()
+            timings.view_start_db_time = timings.db_time
+
+    def process_template_response(self, request, response):
+        """
+        DRF responses are rendered right after this hook, so this is where the view ends and rendering begins.
+        """
+        timings = getattr(request, 'timings', None)
+        if timings is not None and timings.view_start is not None:
+            timings.view_end = perf_counter()
+            timings.view_end_db_time = timings.db_time
+        return response
+
+
+class SamplingProfilerMiddleware(object):
+    """
+    Profiles a sampled fraction of requests (settings.PROFILER_SAMPLE_RATE) and requests which send the
+    settings.PROFILER_HEADER header with the value of settings.PROFILER_TOKEN.
+    A stack sampler runs next to the request thread and its collapsed stacks are written to
+    settings.PROFILER_OUTPUT_DIR, which also holds the index of the slowest profiled requests.
+    Requests which are not profiled only pay for a random number and a header lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILER_HEADER.upper().replace('-', '_')
+
+    def should_profile(self, request):
+        token = settings.PROFILER_TOKEN
+        if token and request.META.get(self.header) == token:
+            return True
+        return settings.PROFILER_SAMPLE_RATE > 0 and random.random() < settings.PROFILER_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(get_ident(), settings.PROFILER_INTERVAL)
+        start = perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration_ms = (perf_counter() - start) * 1000
+
+        directory = str(settings.PROFILER_OUTPUT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        now = timezone.now()
+        slug = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-')
+        file_name = f'{now:%Y%m%dT%H%M%S%f}-{request.method}-{slug}.folded'
+        with open(os.path.join(directory, file_name), 'w') as profile_file:
+            profile_file.write(sampler.collapsed())
+        slowest_requests.add(directory, {
+            'profile': file_name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'samples': sum(sampler.stacks.values()),
+            'date': int(now.timestamp()),
+        })
+        response['X-Profile-Id'] = file_name
+        return response
+
+
+class Flight(object):
+    """
+    A computation of a response which concurrent identical requests wait for.
+    """
+    __slots__ = ('done', 'snapshot')
+
+    def __init__(self):
+        self.done = Event()
+        self.snapshot = None
+
+
+class SingleFlightMiddleware(object):
+    """
+    Lets concurrent identical GET requests to the views in settings.SINGLE_FLIGHT_VIEWS share one computation:
+    the first request (the leader) runs the view and the requests which arrive while it runs wait for it and get a
+    copy of its response. Requests are identical when they have the same path, query parameters (in any order)
+    and Accept header, so the shared views must not return different responses to different users.
+
+    Within a process the requests wait for each other with thread events. If settings.SINGLE_FLIGHT_CACHE names a
+    cache which the worker processes share, the first request of each process takes a lock in the cache and the
+    other processes wait for the response which the leader stores there.
+    Only successful responses are shared. If the leader fails or takes longer than settings.SINGLE_FLIGHT_TIMEOUT,
+    the waiting requests run the view themselves.
+    """
+    # Headers which describe the leader request only. Followers are marked with SHARED_HEADER instead.
+    private_headers = ('Server-Timing',)
+    SHARED_HEADER = 'X-Single-Flight'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._flights = {}
+        self._lock = Lock()
+
+    def flight_key(self, request):
+        """
+        Returns the key of the request, or None if the request is not shared.
+        """
+        if request.method != 'GET':
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.namespace != API_NAMESPACE or match.url_name not in settings.SINGLE_FLIGHT_VIEWS:
+            return None
+        # Parameters are sorted by name. The order of the values of a parameter is kept, because it can matter.
+        params = sorted(((name, value) for name, values in request.GET.lists() for value in values if value != ''),
+                        key=itemgetter(0))
+        key = f"{request.path}?{urlencode(params)}|{request.META.get('HTTP_ACCEPT', '')}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def __call__(self, request):
+        key = self.flight_key(request)
+        if key is None:
+            return self.get_response(request)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            if flight.done.wait(settings.SINGLE_FLIGHT_TIMEOUT) and flight.snapshot is not None:
+                return self.shared_response(flight.snapshot)
+            return self.get_response(request)
+
+        try:
+            response, flight.snapshot = self.get_shared_response(request, key)
+            return response
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def get_shared_response(self, request, key):
+        """
+        Returns the response of the request and its snapshot for other requests, sharing it with the other
+        processes through settings.SINGLE_FLIGHT_CACHE if it is set.
+        """
+        if not settings.SINGLE_FLIGHT_CACHE:
+            response = self.get_response(request)
+            return response, self.snapshot(response)
+
+        cache = caches[settings.SINGLE_FLIGHT_CACHE]
+        lock_key = f'single-flight:{key}'
+        flight_id = uuid4().hex
+        if cache.add(lock_key, flight_id, settings.SINGLE_FLIGHT_TIMEOUT):
+            try:
+                response = self.get_response(request)
+                snapshot = self.snapshot(response)
+                if snapshot is not None:
+                    cache.set(f'{lock_key}:{flight_id}', snapshot, settings.SINGLE_FLIGHT_TIMEOUT)
+                return response, snapshot
+            finally:
+                cache.delete(lock_key)
+
+        leader_id = cache.get(lock_key)
+        if leader_id is not None:
+            deadline = perf_counter() + settings.SINGLE_FLIGHT_TIMEOUT
+            while perf_counter() < deadline and cache.get(lock_key) == leader_id:
+                sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+            snapshot = cache.get(f'{lock_key}:{leader_id}')
+            if snapshot is not None:
+                return self.shared_response(snapshot), snapshot
+        response = self.get_response(request)
+        return response, self.snapshot(response)
+
+    def snapshot(self, response):
+        """
+        Returns what is needed to copy a successful response, or None if the response is not shared.
+        """
+        if response.status_code != 200 or response.streaming:
+            return None
+        headers = [(header, value) for header, value in response.items() if header not in self.private_headers]
+        return response.status_code, response.content, headers
+
+    def shared_response(self, snapshot):
+        status_code, content, headers = snapshot
+        response = HttpResponse(content, status=status_code)
+        for header, value in headers:
+            response[header] = value
+        response[self.SHARED_HEADER] = 'shared'
+        return response
+
+
+class ThrottleMiddleware(object):
+    """
+    Limits the requests to the employment API with a token bucket per client and route, and the number of
+    requests which a route runs at the same time. The budgets of a route are those of its scope in
+    settings.THROTTLE_RATES, where settings.THROTTLE_SCOPES gives the expensive routes stricter scopes.
+    The state is kept in the cache settings.THROTTLE_CACHE: a local memory cache limits every process on its own,
+    a cache shared by the processes limits them together.
+    Rejected requests get a 429 response before the view runs. It runs after SingleFlightMiddleware, so the
+    requests which get a copy of the response of an identical request are not limited.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        if match.namespace != API_NAMESPACE:
+            return self.get_response(request)
+
+        wait = take_route_token(request, match.url_name)
+        if wait:
+            return too_many_requests(f'Request limit exceeded. Try again in {math.ceil(wait)} seconds.', wait)
+
+        with route_slot(match.url_name) as acquired:
+            if not acquired:
+                return too_many_requests('Too many requests are running. Try again later.', 1)
+            return self.get_response(request)
+
+
+def client_address(request):
+    """
+    Returns the address of the client, behind settings.THROTTLE_NUM_PROXIES trusted proxies.
+    """
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded_for and settings.THROTTLE_NUM_PROXIES:
+        addresses = [address.strip() for address in forwarded_for.split(',')]
+        return addresses[-min(settings.THROTTLE_NUM_PROXIES, len(addresses))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+@contextmanager
+def route_slot(url_name):
+    """
+    Holds one of the slots of a route for the requests which it runs at the same time while the block runs.
+    Yields whether a slot was free; the block should not run the request if it was not.
+    """
+    cache = caches[settings.THROTTLE_CACHE]
+    max_concurrent = settings.THROTTLE_RATES[settings.THROTTLE_SCOPES.get(url_name, 'default')][2]
+    running_key = f'throttle:running:{url_name}'
+    # The counter expires, so that requests of a process which died do not hold their slots forever. Every request
+    # which starts or ends renews it, so it only expires once the route is idle for settings.THROTTLE_RUNNING_TIMEOUT.
+    cache.add(running_key, 0, settings.THROTTLE_RUNNING_TIMEOUT)
+    try:
+        running = cache.incr(running_key)
+        cache.touch(running_key, settings.THROTTLE_RUNNING_TIMEOUT)
+    except ValueError:
+        # The counter expired between add and incr.
+        running = 1
+    try:
+        yield running <= max_concurrent
+    finally:
+        try:
+            if cache.decr(running_key) < 0:
+                # The counter expired while the request ran and counts from 0 again without it.
+                cache.incr(running_key)
+            cache.touch(running_key, settings.THROTTLE_RUNNING_TIMEOUT)
+        except ValueError:
+            pass
+
+
+def take_route_token(request, url_name):
+    """
+    Takes a token from the bucket of the client for a route. Returns the seconds to wait if there is none.
+    """
+    capacity, rate, max_concurrent = settings.THROTTLE_RATES[settings.THROTTLE_SCOPES.get(url_name, 'default')]
+    key = f'throttle:bucket:{url_name}:{client_address(request)}'
+    return take_token(caches[settings.THROTTLE_CACHE], key, capacity, rate)
+
+
+def take_token(cache, key, capacity, rate):
+    """
+    Takes a token from a bucket which holds at most capacity tokens and gets rate tokens per second.
+    Returns 0 if a token was taken, otherwise the seconds until the next token.
+    Concurrent requests of the same client can read the same bucket state, so a client can go slightly over its budget.
+    """
+    now = time()
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    # The bucket is full again when it expires.
+    cache.set(key, (tokens - 1, now), math.ceil(capacity / rate) + 1)
+    return 0
+
+
+def too_many_requests(message, retry_after):
+    response = HttpResponse(json.dumps(message), status=429, content_type='application/json')
+    response['Retry-After'] = str(math.ceil(retry_after))
+    return response
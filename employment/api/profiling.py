@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+from collections import Counter
+from threading import Event, Lock, Thread
+from django.conf import settings
+
+
+class StackSampler(Thread):
+    """
+    Samples the call stack of another thread at a fixed interval and counts identical stacks.
+    The result is in the collapsed stack format used by flamegraph tools ("frame;frame;frame count").
+    """
+
+    def __init__(self, thread_id, interval):
+        super(StackSampler, self).__init__(name='stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(frames))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class SlowestRequestsIndex(object):
+    """
+    Keeps the "slowest N profiled requests" index in slowest.json in the profiles directory.
+    Profiles which fall out of the index are deleted, so the directory does not grow without bound.
+    """
+    FILE_NAME = 'slowest.json'
+
+    def __init__(self):
+        self._lock = Lock()
+
+    def add(self, directory, entry):
+        path = os.path.join(directory, self.FILE_NAME)
+        with self._lock:
+            try:
+                with open(path) as index_file:
+                    entries = json.load(index_file)
+            except (OSError, ValueError):
+                entries = []
+            entries.append(entry)
+            entries.sort(key=lambda item: item['duration_ms'], reverse=True)
+            kept, dropped = entries[:settings.PROFILER_SLOWEST_COUNT], entries[settings.PROFILER_SLOWEST_COUNT:]
+            for item in dropped:
+                try:
+                    os.remove(os.path.join(directory, item['profile']))
+                except OSError:
+                    pass
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as index_file:
+                json.dump(kept, index_file, indent=2)
+            os.replace(temp_path, path)
+
+
+slowest_requests = SlowestRequestsIndex()
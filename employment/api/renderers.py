@@ -0,0 +1,51 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class Normalizer(object):
+    """
+    Collects the related objects of a response by entity, serializing each distinct object once.
+    """
+
+    def __init__(self):
+        self.entities = {}
+
+    def add(self, entity, instance, serializer_class):
+        """
+        Adds an object to the map of its entity and returns its id, which the response refers to it with.
+        """
+        objects = self.entities.setdefault(entity, {})
+        if instance.pk not in objects:
+            objects[instance.pk] = serializer_class(instance).data
+        return instance.pk
+
+
+class NormalizedJSONRenderer(JSONRenderer):
+    """
+    Renders responses of views which serialize relations by id (?format=normalized), with the related objects in
+    top level maps by entity: {"results": [...], "employees": {"1": {...}}, "teams": {...}}.
+    A single object is returned as "result".
+    """
+    format = 'normalized'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        normalizer = getattr(renderer_context.get('view'), 'normalizer', None)
+        response = renderer_context.get('response')
+        if normalizer is not None and data is not None and not (response is not None and response.exception):
+            if isinstance(data, list):
+                data = {'results': data}
+            elif 'results' in data:
+                data = dict(data)
+            else:
+                data = {'result': data}
+            data.update(normalizer.entities)
+        return super(NormalizedJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Selects the columnar response format (?format=columnar) of the list views which support it:
+    {"columns": ["id", "name"], "data": {"id": [1, 2], "name": ["John Doe", "Jane Doe"]}}.
+    The views build the columns straight from values_list(), the renderer only encodes them.
+    """
+    format = 'columnar'
@@ -1,9 +1,70 @@
 from rest_framework.serializers import (ModelSerializer, SerializerMethodField, ValidationError, Serializer,
-                                        DecimalField)
-from ..models import Team, Employee, TeamEmployee, WorkArrangement
+                                        DecimalField, ListField, IntegerField, CharField, ChoiceField, JSONField,
+                                        BooleanField, Field, ListSerializer)
+from django.conf import settings
+from ..models import Team, Employee, TeamEmployee, WorkArrangement, Job, Change, CHANGE_ENTITIES
 import re
-from rest_framework.validators import UniqueTogetherValidator
-from django.db.models import Sum
+from collections import Counter
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+
+
+class SparseFieldsMixin(object):
+    """
+    Allows limiting the fields of a serializer with the 'fields' (fields to keep) and 'omit' (fields to drop)
+    keyword arguments.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        unknown = set(fields or []).union(omit or []).difference(self.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
+        for name in omit or []:
+            self.fields.pop(name)
+
+
+class ReferenceField(Field):
+    """
+    Serializes a related object (or the objects of a to-many relation) as its id and adds it to the normalizer of
+    the serializer context, which serializes every distinct object once for the whole response.
+    """
+
+    def __init__(self, entity, serializer_class, many=False, **kwargs):
+        kwargs['read_only'] = True
+        super(ReferenceField, self).__init__(**kwargs)
+        self.entity = entity
+        self.serializer_class = serializer_class
+        self.many = many
+
+    def to_representation(self, value):
+        normalizer = self.context['normalizer']
+        if self.many:
+            return [normalizer.add(self.entity, instance, self.serializer_class) for instance in value.all()]
+        return normalizer.add(self.entity, value, self.serializer_class)
+
+
+class NormalizedRelationsMixin(object):
+    """
+    Serializes the nested relations in related_entities by id when the serializer context has a normalizer
+    (?format=normalized), instead of serializing the related objects under every object which refers to them.
+    """
+    # Field name: (entity name, serializer of the related objects)
+    related_entities = {}
+
+    def to_representation(self, instance):
+        if self.context.get('normalizer') is not None:
+            for name, (entity, serializer_class) in self.related_entities.items():
+                if name in self.fields and not isinstance(self.fields[name], ReferenceField):
+                    many = isinstance(self.fields[name], ListSerializer)
+                    self.fields[name] = ReferenceField(entity, serializer_class, many=many)
+        return super(NormalizedRelationsMixin, self).to_representation(instance)
 
 
 class EmployeeBriefSerializer(ModelSerializer):
@@ -39,18 +100,40 @@ class TeamBriefSerializer(ModelSerializer):
         return int(obj.update_date.timestamp())
 
 
-class EmployeeSerializer(ModelSerializer):
+class EmployeeValidationMixin(object):
+    """
+    Validation of the employee fields which are set by clients.
+    """
+
+    def validate_name(self, value):
+        if re.match("^[a-zA-Z0-9_ ]*$", value):
+            return value
+        else:
+            raise ValidationError("Employee name can only contain alphabetic characters, numbers, spaces and _.")
+
+    def validate_employee_id(self, value):
+        if re.match("^[a-zA-Z0-9_]*$", value):
+            return value
+        else:
+            raise ValidationError("Employee_ID can only contain alphabetic characters, numbers and _.")
+
+
+class EmployeeSerializer(EmployeeValidationMixin, NormalizedRelationsMixin, SparseFieldsMixin, ModelSerializer):
     """
     Serializes employee objects
     """
     create_date = SerializerMethodField()
     update_date = SerializerMethodField()
     teams = TeamBriefSerializer(many=True, read_only=True)
+    related_entities = {'teams': ('teams', TeamBriefSerializer)}
 
     class Meta:
         model = Employee
         fields = '__all__'
-        read_only_fields = ['id', 'teams', 'create_date', 'update_date']
+        read_only_fields = ['id', 'teams', 'is_deleted', 'create_date', 'update_date']
+        # Deleted employees keep their employee id until they are purged.
+        extra_kwargs = {'employee_id': {'validators': [UniqueValidator(
+            queryset=Employee.all_objects.all(), message="An employee with this employee_id already exists.")]}}
 
     def get_create_date(self, obj):
         return int(obj.create_date.timestamp())
@@ -58,31 +141,22 @@ class EmployeeSerializer(ModelSerializer):
     def get_update_date(self, obj):
         return int(obj.update_date.timestamp())
 
-    def validate_name(self, value):
-        if re.match("^[a-zA-Z0-9_ ]*$", value):
-            return value
-        else:
-            raise ValidationError("Employee name can only contain alphabetic characters, numbers, spaces and _.")
 
-    def validate_employee_id(self, value):
-        if re.match("^[a-zA-Z0-9_]*$", value):
-            return value
-        else:
-            raise ValidationError("Employee_ID can only contain alphabetic characters, numbers and _.")
-
-
-class TeamSerializer(ModelSerializer):
+class TeamSerializer(NormalizedRelationsMixin, SparseFieldsMixin, ModelSerializer):
     """
     Serializes team objects.
     """
     create_date = SerializerMethodField()
     update_date = SerializerMethodField()
+    member_count = SerializerMethodField()
     members = EmployeeBriefSerializer(many=True, read_only=True)
+    related_entities = {'leader': ('employees', EmployeeBriefSerializer),
+                        'members': ('employees', EmployeeBriefSerializer)}
 
     class Meta:
         model = Team
         fields = '__all__'
-        read_only_fields = ['id', 'members', 'create_date', 'update_date']
+        read_only_fields = ['id', 'members', 'is_deleted', 'create_date', 'update_date']
 
     def get_create_date(self, obj):
         return int(obj.create_date.timestamp())
@@ -90,11 +164,21 @@ class TeamSerializer(ModelSerializer):
     def get_update_date(self, obj):
         return int(obj.update_date.timestamp())
 
+    def get_member_count(self, obj):
+        """
+        Uses the member_count annotation of the team views when it is present.
+        """
+        member_count = getattr(obj, 'member_count', None)
+        if member_count is None:
+            member_count = obj.teamemployee_set.count()
+        return member_count
+
     def to_representation(self, instance):
         """
         Allows to send the leader's id as 'leader' in PUT and POST (Instead of 'leader_id').
         """
-        self.fields['leader'] = EmployeeBriefSerializer()
+        if 'leader' in self.fields:
+            self.fields['leader'] = EmployeeBriefSerializer()
         return super(TeamSerializer, self).to_representation(instance)
 
     def validate_name(self, value):
@@ -104,11 +188,12 @@ class TeamSerializer(ModelSerializer):
             raise ValidationError("Team name can only contain alphabetic characters, numbers, spaces and _.")
 
 
-class TeamEmployeeSerializer(ModelSerializer):
+class TeamEmployeeSerializer(NormalizedRelationsMixin, SparseFieldsMixin, ModelSerializer):
     """
     Serializes team objects.
     """
     create_date = SerializerMethodField()
+    related_entities = {'employee': ('employees', EmployeeBriefSerializer), 'team': ('teams', TeamBriefSerializer)}
 
     class Meta:
         model = TeamEmployee
@@ -130,17 +215,20 @@ class TeamEmployeeSerializer(ModelSerializer):
         Allows to send the team and employee's id as 'team' and 'employee' in PUT and POST
         (Instead of 'team_id' and 'employee_id').
         """
-        self.fields['employee'] = EmployeeBriefSerializer()
-        self.fields['team'] = TeamBriefSerializer()
+        if 'employee' in self.fields:
+            self.fields['employee'] = EmployeeBriefSerializer()
+        if 'team' in self.fields:
+            self.fields['team'] = TeamBriefSerializer()
         return super(TeamEmployeeSerializer, self).to_representation(instance)
 
 
-class WorkArrangementSerializer(ModelSerializer):
+class WorkArrangementSerializer(NormalizedRelationsMixin, SparseFieldsMixin, ModelSerializer):
     """
     Serializes WorkArrangement objects.
     """
     create_date = SerializerMethodField()
     update_date = SerializerMethodField()
+    related_entities = {'employee': ('employees', EmployeeBriefSerializer)}
 
     class Meta:
         model = WorkArrangement
@@ -155,25 +243,37 @@ class WorkArrangementSerializer(ModelSerializer):
 
     def validate(self, attrs):
         """
-        If WorkArrangement is full time, user must have no other work arrangements. (On create only)
-        If WorkArrangement is part time, percentage is mandatory. (On create and update)
-        If WorkArrangement is part time, user must not have a full time job. (On create only)
+        If WorkArrangement is full time, user must have no other work arrangements.
+        If WorkArrangement is part time, percentage is mandatory.
+        If WorkArrangement is part time, user must not have a full time job.
         If WorkArrangement is part time, sum of all user work arrangement percentages must be less than or equal 100.
-        (On create and update)
+        On update, the work arrangement itself is not one of the others.
+        The other work arrangements are counted with one locking read, which also locks the employee, so that
+        parallel writes for the same employee are checked one after the other. A locking read sees the rows saved by
+        the transaction which held the lock before, not the snapshot of this transaction (repeatable read).
         """
-        if attrs['type'] == WorkArrangement.WorkTypes.FullTime:
-            if WorkArrangement.objects.filter(employee_id=attrs['employee']).exists() and not self.instance:
+        partial_instance = self.instance if self.partial else None
+        employee = attrs.get('employee', getattr(partial_instance, 'employee', None))
+        work_type = attrs.get('type', getattr(partial_instance, 'type', None))
+        percentage = attrs.get('percentage', getattr(partial_instance, 'percentage', None))
+        if work_type == WorkArrangement.WorkTypes.PartTime and percentage is None:
+            raise ValidationError("Percentage should be specified for work assignments.")
+
+        others = Q()
+        if self.instance:
+            others = ~Q(workarrangement__pk=self.instance.pk)
+        full_time = Q(workarrangement__type=WorkArrangement.WorkTypes.FullTime)
+        totals = Employee.all_objects.select_for_update().filter(pk=employee.pk).aggregate(
+            count=Count('workarrangement', filter=others),
+            full_time=Count('workarrangement', filter=others & full_time),
+            percentage=Coalesce(Sum('workarrangement__percentage', filter=others), 0))
+        if work_type == WorkArrangement.WorkTypes.FullTime:
+            if totals['count']:
                 raise ValidationError("Employee already has another work assignment.")
-        elif attrs['type'] == WorkArrangement.WorkTypes.PartTime:
-            if 'percentage' not in attrs or attrs['percentage'] is None:
-                raise ValidationError("Percentage should be specified for work assignments.")
-            work_arrangements = WorkArrangement.objects.filter(employee_id=attrs['employee']).all()
-            if any(work_arrangement.type == WorkArrangement.WorkTypes.FullTime for work_arrangement in
-                   work_arrangements) and not self.instance:
+        elif work_type == WorkArrangement.WorkTypes.PartTime:
+            if totals['full_time']:
                 raise ValidationError("User already has a full time work assignment.")
-            sum_percentage = WorkArrangement.objects.filter(employee_id=attrs['employee']).aggregate(Sum('percentage'))[
-                'percentage__sum']
-            if sum_percentage is not None and sum_percentage + int(attrs['percentage']) > 100:
+            if totals['percentage'] + int(percentage) > 100:
                 raise ValidationError("Sum of user work assignment percentages can not exceed 100.")
         return attrs
 
@@ -181,7 +281,8 @@ class WorkArrangementSerializer(ModelSerializer):
         """
         Allows to send the employee's id as 'employee' in PUT and POST (Instead of 'employee_id').
         """
-        self.fields['employee'] = EmployeeBriefSerializer()
+        if 'employee' in self.fields:
+            self.fields['employee'] = EmployeeBriefSerializer()
         return super(WorkArrangementSerializer, self).to_representation(instance)
 
 
@@ -191,3 +292,180 @@ class SalarySerializer(Serializer):
     """
     employee = EmployeeBriefSerializer()
     payable = DecimalField(max_digits=5, decimal_places=2)
+
+
+class SalaryLookupSerializer(Serializer):
+    """
+    Validates the list of employee ids whose salaries are requested.
+    """
+    employees = ListField(child=IntegerField(min_value=1), allow_empty=False,
+                          max_length=settings.SALARY_LOOKUP_MAX_IDS)
+
+
+class EmployeeCodeLookupSerializer(Serializer):
+    """
+    Validates the list of company employee ids whose employees are requested.
+    """
+    employee_ids = ListField(child=CharField(max_length=settings.EMPLOYEE_ID_MAX_LEN), allow_empty=False,
+                             max_length=settings.EMPLOYEE_CODE_LOOKUP_MAX_IDS)
+
+
+class EmployeeSyncItemSerializer(EmployeeValidationMixin, ModelSerializer):
+    """
+    Validates an employee of a sync. The employee id may belong to an existing employee, which is then updated.
+    """
+
+    class Meta:
+        model = Employee
+        fields = ['name', 'employee_id', 'hourly_rate']
+        extra_kwargs = {'employee_id': {'validators': []}}
+
+
+class EmployeeSyncSerializer(Serializer):
+    """
+    Validates the employees of a sync with an HR system, and whether the active employees which are not in the sync
+    should be reported.
+    """
+    employees = EmployeeSyncItemSerializer(many=True, allow_empty=False)
+    report_missing = BooleanField(default=False)
+
+    def validate_employees(self, value):
+        if len(value) > settings.EMPLOYEE_SYNC_MAX_EMPLOYEES:
+            raise ValidationError(f"At most {settings.EMPLOYEE_SYNC_MAX_EMPLOYEES} employees can be synced at once.")
+        counts = Counter(employee['employee_id'] for employee in value)
+        duplicates = sorted(code for code, count in counts.items() if count > 1)
+        if duplicates:
+            raise ValidationError(f"Employee ids are given more than once: {', '.join(duplicates)}.")
+        return value
+
+
+class HourlyRateAdjustmentSerializer(Serializer):
+    """
+    Validates a change of the hourly rates of a group of employees.
+    Either a percentage (5 is a raise of 5%) or an absolute amount is applied to the rates.
+    The employees can be limited to the members of a team and a list of ids. Changing the rates of all employees
+    has to be asked for explicitly with all.
+    """
+    percentage = DecimalField(max_digits=5, decimal_places=2, min_value=-99.99, required=False)
+    amount = DecimalField(max_digits=5, decimal_places=2, required=False)
+    team = IntegerField(min_value=1, required=False)
+    employees = ListField(child=IntegerField(min_value=1), allow_empty=False, required=False,
+                          max_length=settings.SALARY_LOOKUP_MAX_IDS)
+    all = BooleanField(default=False)
+
+    def validate(self, attrs):
+        if ('percentage' in attrs) == ('amount' in attrs):
+            raise ValidationError("Exactly one of percentage and amount should be specified.")
+        return attrs
+
+
+class BulkDeleteSerializer(Serializer):
+    """
+    Validates the list of ids of the objects to delete.
+    """
+    ids = ListField(child=IntegerField(min_value=1), allow_empty=False, max_length=settings.BULK_DELETE_MAX_IDS)
+
+
+class BatchRequestSerializer(Serializer):
+    """
+    Validates a sub-request of a batch. The url is the path of an API view with its query string.
+    """
+    method = ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    url = CharField()
+    body = JSONField(required=False)
+
+    def validate_url(self, value):
+        if not value.startswith('/'):
+            raise ValidationError("Url should be a path starting with /.")
+        return value
+
+
+class BatchSerializer(Serializer):
+    """
+    Validates a batch of sub-requests. Parallel batches can only read.
+    """
+    requests = BatchRequestSerializer(many=True, allow_empty=False)
+    parallel = BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise ValidationError(f"A batch should have at most {settings.BATCH_MAX_REQUESTS} requests.")
+        return value
+
+    def validate(self, data):
+        if data['parallel'] and any(request['method'] != 'GET' for request in data['requests']):
+            raise ValidationError("Only GET requests can run in parallel.")
+        return data
+
+
+class JobSerializer(ModelSerializer):
+    """
+    Serializes Job objects. Only the kind and the params of a job can be written.
+    """
+    create_date = SerializerMethodField()
+    update_date = SerializerMethodField()
+    start_date = SerializerMethodField()
+    finish_date = SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = '__all__'
+        read_only_fields = ['id', 'status', 'progress', 'result', 'error', 'worker', 'create_date', 'update_date',
+                            'start_date', 'finish_date']
+
+    def get_create_date(self, obj):
+        return int(obj.create_date.timestamp())
+
+    def get_update_date(self, obj):
+        return int(obj.update_date.timestamp())
+
+    def get_start_date(self, obj):
+        return int(obj.start_date.timestamp()) if obj.start_date else None
+
+    def get_finish_date(self, obj):
+        return int(obj.finish_date.timestamp()) if obj.finish_date else None
+
+    def validate_kind(self, value):
+        # Imported here, because employment.jobs uses the serializers of this module.
+        from ..jobs import handlers
+        if value not in handlers:
+            raise ValidationError(f"Job kind should be one of: {', '.join(sorted(handlers))}.")
+        return value
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise ValidationError("Job params should be an object.")
+        return value
+
+
+class ChangeSerializer(ModelSerializer):
+    """
+    Serializes entries of the change log. The id is the sequence number of the change.
+    """
+    create_date = SerializerMethodField()
+
+    class Meta:
+        model = Change
+        fields = '__all__'
+
+    def get_create_date(self, obj):
+        return int(obj.create_date.timestamp())
+
+
+class ChangeFeedSerializer(Serializer):
+    """
+    Validates the query parameters of the change feed.
+    """
+    since = IntegerField(min_value=0, default=0)
+    limit = IntegerField(min_value=1, max_value=settings.CHANGE_FEED_MAX_LIMIT,
+                         default=settings.CHANGE_FEED_DEFAULT_LIMIT)
+    # Comma separated entity names
+    entity = CharField(required=False)
+
+    def validate_entity(self, value):
+        entities = [entity.strip() for entity in value.split(',') if entity.strip()]
+        known = [entity for entity, references in CHANGE_ENTITIES.values()]
+        unknown = [entity for entity in entities if entity not in known]
+        if unknown:
+            raise ValidationError(f"Unknown entities: {', '.join(unknown)}. Entities are: {', '.join(known)}.")
+        return entities
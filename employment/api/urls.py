@@ -1,7 +1,12 @@
 from django.urls import path
-from .views import EmployeeListCreateAPIView, EmployeeRetrieveUpdateDestroyAPIView, TeamListCreateAPIView, \
-    TeamRetrieveUpdateDestroyAPIView, TeamEmployeeListCreateAPIView, TeamEmployeeRetrieveUpdateDestroyAPIView, \
-    WorkArrangementListCreateAPIView, WorkArrangementRetrieveUpdateDestroyAPIView, SalaryAPIView
+from .views import EmployeeListCreateAPIView, EmployeeRetrieveUpdateDestroyAPIView, EmployeeHourlyRateAPIView, \
+    EmployeeBulkDeleteAPIView, EmployeeSyncAPIView, TeamListCreateAPIView, TeamRetrieveUpdateDestroyAPIView, \
+    TeamMemberListAPIView, TeamBulkDeleteAPIView, TeamEmployeeListCreateAPIView, \
+    TeamEmployeeRetrieveUpdateDestroyAPIView, WorkArrangementListCreateAPIView, \
+    WorkArrangementRetrieveUpdateDestroyAPIView, SalaryAPIView, SnapshotSalaryAPIView, SnapshotMembershipAPIView, \
+    MembershipQueryAPIView, EmployeeColleaguesAPIView, EmployeeAutocompleteAPIView, \
+    EmployeeByCodeAPIView, EmployeeByCodeListAPIView, JobCreateAPIView, JobRetrieveAPIView, ChangeListAPIView, \
+    BatchAPIView, MetricsAPIView
 
 app_name = 'employment-api'
 
@@ -9,10 +14,19 @@ urlpatterns = [
     path('employees/', EmployeeListCreateAPIView.as_view(), name="employee_list_create"),
     path('employees/<int:pk>/', EmployeeRetrieveUpdateDestroyAPIView.as_view(),
          name="employee_retrieve_update_destroy"),
+    path('employees/<int:pk>/colleagues/', EmployeeColleaguesAPIView.as_view(), name="employee_colleagues"),
+    path('employees/hourly-rate/', EmployeeHourlyRateAPIView.as_view(), name="employee_hourly_rate"),
+    path('employees/bulk-delete/', EmployeeBulkDeleteAPIView.as_view(), name="employee_bulk_delete"),
+    path('employees/sync/', EmployeeSyncAPIView.as_view(), name="employee_sync"),
+    path('employees/autocomplete/', EmployeeAutocompleteAPIView.as_view(), name="employee_autocomplete"),
+    path('employees/by-code/', EmployeeByCodeListAPIView.as_view(), name="employee_by_code_list"),
+    path('employees/by-code/<str:code>/', EmployeeByCodeAPIView.as_view(), name="employee_by_code"),
 
     path('teams/', TeamListCreateAPIView.as_view(), name="team_list_create"),
     path('teams/<int:pk>/', TeamRetrieveUpdateDestroyAPIView.as_view(),
          name="team_retrieve_update_destroy"),
+    path('teams/<int:pk>/members/', TeamMemberListAPIView.as_view(), name="team_member_list"),
+    path('teams/bulk-delete/', TeamBulkDeleteAPIView.as_view(), name="team_bulk_delete"),
 
     path('team-employees/', TeamEmployeeListCreateAPIView.as_view(), name="team_employee_list_create"),
     path('team-employees/<int:pk>/', TeamEmployeeRetrieveUpdateDestroyAPIView.as_view(),
@@ -23,4 +37,18 @@ urlpatterns = [
          name="work_arrangement_retrieve_update_destroy"),
 
     path('salaries/', SalaryAPIView.as_view(), name="salary_list"),
+
+    path('snapshot/salaries/', SnapshotSalaryAPIView.as_view(), name="snapshot_salary_list"),
+    path('snapshot/memberships/', SnapshotMembershipAPIView.as_view(), name="snapshot_membership_list"),
+
+    path('memberships/query/', MembershipQueryAPIView.as_view(), name="membership_query"),
+
+    path('jobs/', JobCreateAPIView.as_view(), name="job_create"),
+    path('jobs/<int:pk>/', JobRetrieveAPIView.as_view(), name="job_retrieve"),
+
+    path('changes/', ChangeListAPIView.as_view(), name="change_list"),
+
+    path('batch/', BatchAPIView.as_view(), name="batch"),
+
+    path('_metrics', MetricsAPIView.as_view(), name="metrics"),
 ]
@@ -1,15 +1,206 @@
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.generics import (GenericAPIView, CreateAPIView, ListAPIView, ListCreateAPIView, RetrieveAPIView,
+                                     RetrieveUpdateDestroyAPIView)
 from rest_framework.views import APIView
+from rest_framework.permissions import SAFE_METHODS
 from django_filters.rest_framework import (DjangoFilterBackend, FilterSet, DateTimeFromToRangeFilter,
                                            CharFilter, NumberFilter)
 from rest_framework.filters import OrderingFilter
-from ..models import Employee, Team, TeamEmployee, WorkArrangement, Salary
+from ..models import Employee, Team, TeamEmployee, WorkArrangement, Salary, Job, Change, settled_sequence
 from .serializers import EmployeeSerializer, TeamSerializer, TeamEmployeeSerializer, WorkArrangementSerializer, \
-    SalarySerializer
-from employee_management.paginations import PagePagination
+    SalarySerializer, SalaryLookupSerializer, HourlyRateAdjustmentSerializer, BulkDeleteSerializer, JobSerializer, \
+    ChangeSerializer, ChangeFeedSerializer, BatchSerializer, EmployeeCodeLookupSerializer, EmployeeSyncSerializer
+from employee_management.paginations import PagePagination, DateCursorPagination
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, OuterRef, Subquery, F, Func, Value
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.conf import settings
+from decimal import Decimal, ROUND_HALF_UP
+from ..signals import bulk_changed
+from ..snapshot import snapshots
+from ..membership import membership_index
+from ..autocomplete import autocomplete_index
+from ..codes import employee_codes
+from django.db.models.functions import Coalesce
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.urls import Resolver404, resolve
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+import json
+import logging
+from .metrics import registry
+from .renderers import Normalizer, NormalizedJSONRenderer, ColumnarJSONRenderer
+from .middleware import API_NAMESPACE, route_slot, take_route_token
+
+logger = logging.getLogger(__name__)
+
+
+def split_query_param(value):
+    """
+    Splits a comma separated query parameter into a list. Returns None if the parameter is not given.
+    """
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class SparseFieldsetMixin(object):
+    """
+    Supports ?fields=id,name (fields to return) and ?omit=members (fields to leave out) on GET requests.
+    Fields in default_omit are left out unless they are asked for with ?include=members or ?fields=.
+    The selection is passed to the serializer and pushed down to the queryset: columns which are not needed are
+    deferred with only() and relations are only prefetched or joined when their field is requested.
+    """
+    # Serializer fields whose relation is prefetched (prefetch_related) when the field is requested.
+    prefetch_fields = {}
+    # Serializer fields whose relation is joined (select_related) when the field is requested.
+    select_fields = {}
+    # Serializer fields which are computed by an annotation of the queryset when the field is requested.
+    annotate_fields = {}
+    # Serializer fields which are only returned when they are asked for explicitly.
+    default_omit = []
+
+    def get_field_selection(self):
+        """
+        Returns the requested fields and omitted fields. Writes always use all the fields of the serializer.
+        """
+        if self.request.method not in SAFE_METHODS:
+            return None, None
+        params = self.request.query_params
+        fields = split_query_param(params.get('fields'))
+        omit = split_query_param(params.get('omit'))
+        include = split_query_param(params.get('include')) or []
+        default_omit = [name for name in self.default_omit if name not in include and name not in (fields or [])]
+        if fields is None and default_omit:
+            omit = (omit or []) + [name for name in default_omit if name not in (omit or [])]
+        return fields, omit
+
+    def get_serializer(self, *args, **kwargs):
+        fields, omit = self.get_field_selection()
+        kwargs.setdefault('fields', fields)
+        kwargs.setdefault('omit', omit)
+        return super(SparseFieldsetMixin, self).get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super(SparseFieldsetMixin, self).get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        fields, omit = self.get_field_selection()
+        serializer_fields = self.get_serializer_class()(fields=fields, omit=omit).fields
+
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = {queryset.model._meta.pk.name}
+        for name, field in serializer_fields.items():
+            # Method fields (source='*') are named after the model field they format.
+            source = name if field.source == '*' else field.source.split('.')[0]
+            if source in self.prefetch_fields:
+                queryset = queryset.prefetch_related(self.prefetch_fields[source])
+            elif source in self.select_fields:
+                queryset = queryset.select_related(self.select_fields[source])
+            elif source in self.annotate_fields:
+                queryset = queryset.annotate(**{source: self.annotate_fields[source]})
+            if source in model_fields:
+                columns.add(source)
+            elif source not in self.prefetch_fields and source not in self.annotate_fields:
+                # The columns needed by this field are unknown, so none can be deferred.
+                columns = None
+                break
+        if columns is not None and (fields is not None or omit):
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+class NormalizedFormatMixin(object):
+    """
+    Adds the ?format=normalized response format, in which related objects are serialized once into top level maps
+    by entity and are referred to by id.
+    """
+    normalizer = None
+
+    def get_renderers(self):
+        return super(NormalizedFormatMixin, self).get_renderers() + [NormalizedJSONRenderer()]
+
+    def get_serializer_context(self):
+        context = super(NormalizedFormatMixin, self).get_serializer_context()
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if renderer is not None and renderer.format == NormalizedJSONRenderer.format:
+            if self.normalizer is None:
+                self.normalizer = Normalizer()
+            context['normalizer'] = self.normalizer
+        return context
+
+
+def to_timestamp(value):
+    return int(value.timestamp()) if value is not None else None
+
+
+def to_decimal_string(value):
+    return str(value) if value is not None else None
+
+
+def to_money_string(value):
+    return str(value.quantize(Decimal('0.01'))) if value is not None else None
+
+
+class ColumnarFormatMixin(object):
+    """
+    Adds the ?format=columnar response format to list views: {"columns": [...], "data": {column: [values]}}.
+    The rows are read with values_list() and turned into columns without building a dict or a serializer per row.
+    Columns can be selected with ?fields= and ?omit=.
+    """
+    # Column name: (field of values_list(), function which formats the values like the serializer or None)
+    columnar_fields = {}
+
+    def get_renderers(self):
+        return super(ColumnarFormatMixin, self).get_renderers() + [ColumnarJSONRenderer()]
+
+    def is_columnar(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return renderer is not None and renderer.format == ColumnarJSONRenderer.format
+
+    def get_columnar_queryset(self):
+        return self.get_queryset()
+
+    def get_columns(self):
+        fields = split_query_param(self.request.query_params.get('fields'))
+        omit = split_query_param(self.request.query_params.get('omit')) or []
+        unknown = set(fields or []).union(omit).difference(self.columnar_fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        return [name for name in self.columnar_fields if (fields is None or name in fields) and name not in omit]
+
+    def list(self, request, *args, **kwargs):
+        if self.is_columnar():
+            return self.columnar_list()
+        return super(ColumnarFormatMixin, self).list(request, *args, **kwargs)
+
+    def columnar_list(self):
+        columns = self.get_columns()
+        paths = [self.columnar_fields[name][0] for name in columns]
+        # Relations are not needed by values_list().
+        queryset = self.filter_queryset(self.get_columnar_queryset()).prefetch_related(None).values_list(*paths)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        values = list(zip(*rows)) if rows else [()] * len(columns)
+        data = {}
+        for name, column in zip(columns, values):
+            formatter = self.columnar_fields[name][1]
+            data[name] = [formatter(value) for value in column] if formatter else list(column)
+        if page is not None:
+            return self.paginator.get_columnar_paginated_response(columns, data)
+        return Response({'columns': columns, 'data': data}, status=status.HTTP_200_OK)
+
+
+# Number of members of a team. A correlated subquery instead of a join, so that the team list needs no GROUP BY
+# and its ordering can use the create_date and update_date indexes.
+TEAM_MEMBER_COUNT = Coalesce(Subquery(
+    TeamEmployee.objects.filter(team=OuterRef('pk')).order_by().values('team').annotate(count=Count('pk'))
+    .values('count')
+), 0)
 
 
 class EmployeeFilter(FilterSet):
@@ -63,10 +254,19 @@ class WorkArrangementFilter(FilterSet):
         fields = ['employee', 'type']
 
 
-class EmployeeListCreateAPIView(ListCreateAPIView):
+class EmployeeListCreateAPIView(ColumnarFormatMixin, NormalizedFormatMixin, SparseFieldsetMixin, ListCreateAPIView):
     """
      View class for listing, searching and creating employees.
     """
+    prefetch_fields = {'teams': 'teams'}
+    columnar_fields = {
+        'id': ('id', None),
+        'create_date': ('create_date', to_timestamp),
+        'update_date': ('update_date', to_timestamp),
+        'name': ('name', None),
+        'employee_id': ('employee_id', None),
+        'hourly_rate': ('hourly_rate', to_decimal_string),
+    }
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = EmployeeFilter
     ordering_fields = ['create_date', 'update_date']
@@ -76,18 +276,208 @@ class EmployeeListCreateAPIView(ListCreateAPIView):
     queryset = Employee.objects.all()
 
 
-class EmployeeRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+class EmployeeRetrieveUpdateDestroyAPIView(NormalizedFormatMixin, SparseFieldsetMixin,
+                                           RetrieveUpdateDestroyAPIView):
     """
     View class for getting, updating, and deleting an employee object.
     """
+    prefetch_fields = {'teams': 'teams'}
     serializer_class = EmployeeSerializer
     queryset = Employee.objects.all()
 
+    def destroy(self, request, *args, **kwargs):
+        """
+        Employees are soft deleted. The leader of a team can not be deleted.
+        """
+        instance = self.get_object()
+        if Team.objects.filter(leader=instance).exists():
+            return Response('A team leader can not be deleted.', status=status.HTTP_400_BAD_REQUEST)
+        Employee.objects.filter(pk=instance.pk).soft_delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
-class TeamListCreateAPIView(ListCreateAPIView):
+class EmployeeSyncAPIView(GenericAPIView):
+    """
+    View class for synchronizing the employees with an HR system. The employees are matched by employee id:
+    unknown employees are created and existing employees are only updated if one of their fields changed, so a sync
+    without changes reads the employees once and writes nothing. Returns the number of created, updated and
+    unchanged employees, and with report_missing the first settings.EMPLOYEE_SYNC_MAX_MISSING employee ids of the
+    active employees which were not synced and their number.
+
+    The matched employees are locked while they are compared and written, so a concurrent change is not
+    overwritten with values which were read before it. An employee which another request creates at the same time
+    makes the sync fail with 409, and it can be repeated.
+    """
+    serializer_class = EmployeeSyncSerializer
+    # Fields which are set by a sync
+    sync_fields = ['name', 'employee_id', 'hourly_rate']
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        incoming = {employee['employee_id']: employee for employee in serializer.validated_data['employees']}
+        try:
+            with transaction.atomic():
+                existing = {employee.employee_id: employee for employee in Employee.all_objects.select_for_update()
+                            .filter(employee_id__in=list(incoming)).only('id', 'is_deleted', *self.sync_fields)}
+                deleted = sorted(code for code, employee in existing.items() if employee.is_deleted)
+                if deleted:
+                    return Response(f"Employees are deleted and can not be synced until they are purged: "
+                                    f"{', '.join(deleted)}.", status=status.HTTP_400_BAD_REQUEST)
+                created, updated_ids = self.sync(incoming, existing)
+        except IntegrityError:
+            return Response("Employees were created by another request during the sync. Try again.",
+                            status=status.HTTP_409_CONFLICT)
+
+        result = {'created': len(created), 'updated': len(updated_ids),
+                  'unchanged': len(incoming) - len(created) - len(updated_ids)}
+        if serializer.validated_data['report_missing']:
+            missing = Employee.objects.exclude(employee_id__in=list(incoming))
+            result['missing'] = list(missing.order_by('employee_id').values_list('employee_id', flat=True)
+                                     [:settings.EMPLOYEE_SYNC_MAX_MISSING])
+            result['missing_count'] = missing.count()
+        return Response(result, status=status.HTTP_200_OK)
+
+    def sync(self, incoming, existing):
+        """
+        Creates the new employees and updates the changed ones. Returns the created employees and the ids of the
+        updated ones.
+        """
+        # Changed employees are grouped by their changed fields, so each UPDATE only sets those columns.
+        now = timezone.now()
+        created, changed = [], {}
+        for code, data in incoming.items():
+            employee = existing.get(code)
+            if employee is None:
+                created.append(Employee(**data))
+                continue
+            fields = tuple(field for field in self.sync_fields if getattr(employee, field) != data[field])
+            if fields:
+                for field in fields:
+                    setattr(employee, field, data[field])
+                employee.update_date = now
+                changed.setdefault(fields, []).append(employee)
+        updated_ids = [employee.id for employees in changed.values() for employee in employees]
+        for fields, employees in changed.items():
+            Employee.all_objects.bulk_update(employees, [*fields, 'update_date'],
+                                             batch_size=settings.EMPLOYEE_SYNC_BATCH_SIZE)
+        if created:
+            Employee.objects.bulk_create(created, batch_size=settings.EMPLOYEE_SYNC_BATCH_SIZE)
+            created_ids = [employee.pk for employee in created]
+            if None in created_ids:
+                # Databases which do not return the ids of inserted rows (MySQL)
+                created_ids = list(Employee.objects.filter(employee_id__in=[
+                    employee.employee_id for employee in created]).values_list('id', flat=True))
+            bulk_changed.send(sender=Employee, pks=created_ids, action='create')
+        if updated_ids:
+            bulk_changed.send(sender=Employee, pks=updated_ids, action='update')
+        return created, updated_ids
+
+
+class BulkDeleteAPIView(GenericAPIView):
+    """
+    Base view class for soft deleting many objects with a single UPDATE.
+    """
+    serializer_class = BulkDeleteSerializer
+
+    def validate_ids(self, ids):
+        """
+        Returns an error message if the objects can not be deleted.
+        """
+        return None
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        error = self.validate_ids(ids)
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'deleted': self.get_queryset().filter(pk__in=ids).soft_delete()}, status=status.HTTP_200_OK)
+
+
+class EmployeeBulkDeleteAPIView(BulkDeleteAPIView):
+    """
+    View class for deleting many employees.
+    """
+    queryset = Employee.objects.all()
+
+    def validate_ids(self, ids):
+        leaders = sorted(set(Team.objects.filter(leader_id__in=ids).values_list('leader_id', flat=True)))
+        if leaders:
+            return f"Team leaders can not be deleted: {', '.join(map(str, leaders))}."
+
+
+class EmployeeHourlyRateAPIView(GenericAPIView):
+    """
+    View class for changing the hourly rates of many employees with a single UPDATE.
+    The employees are selected by the employee filters in the query string and by team and employees in the body.
+    A request without any of them is rejected unless it sets all, so that a missing filter never changes every rate.
+    """
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = EmployeeFilter
+    serializer_class = HourlyRateAdjustmentSerializer
+    queryset = Employee.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if not (data['all'] or 'team' in data or 'employees' in data or self.has_filters()):
+            return Response("Select the employees with a filter, team or employees, or set all to true.",
+                            status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        if 'team' in data:
+            queryset = queryset.filter(teamemployee__team_id=data['team'])
+        if 'employees' in data:
+            queryset = queryset.filter(id__in=data['employees'])
+
+        rate_field = Employee._meta.get_field('hourly_rate')
+        quantum = Decimal(1).scaleb(-rate_field.decimal_places)
+        max_rate = Decimal(1).scaleb(rate_field.max_digits - rate_field.decimal_places) - quantum
+        if 'percentage' in data:
+            factor = 1 + data['percentage'] / 100
+            new_rate = Func(F('hourly_rate') * Value(factor), Value(rate_field.decimal_places), function='ROUND',
+                            output_field=rate_field)
+        else:
+            new_rate = F('hourly_rate') + Value(data['amount'])
+
+        def adjust(rate):
+            if 'percentage' in data:
+                return (rate * factor).quantize(quantum, rounding=ROUND_HALF_UP)
+            return rate + data['amount']
+
+        with transaction.atomic():
+            rates = list(queryset.select_for_update().values_list('id', 'hourly_rate'))
+            if not rates:
+                return Response({'updated': 0}, status=status.HTTP_200_OK)
+            # Rates only grow or only shrink together, so checking the highest and the lowest one is enough.
+            new_rates = [adjust(max(rate for _, rate in rates)), adjust(min(rate for _, rate in rates))]
+            if max(new_rates) > max_rate or min(new_rates) < 0:
+                return Response(f'Hourly rates must stay between 0 and {max_rate}.',
+                                status=status.HTTP_400_BAD_REQUEST)
+            updated = queryset.update(hourly_rate=new_rate, update_date=timezone.now())
+            # In the transaction of the update, so that its changes are logged if and only if it commits.
+            bulk_changed.send(sender=Employee, pks=[employee_id for employee_id, _ in rates], action='update')
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
+
+    def has_filters(self):
+        filterset = DjangoFilterBackend().get_filterset(self.request, self.get_queryset(), self)
+        # An invalid filter is reported by filter_queryset
+        if not filterset.is_valid():
+            return True
+        return any(value not in (None, '') for value in filterset.form.cleaned_data.values())
+
+
+class TeamListCreateAPIView(NormalizedFormatMixin, SparseFieldsetMixin, ListCreateAPIView):
     """
      View class for listing, searching and creating teams.
     """
+    prefetch_fields = {'members': 'members'}
+    select_fields = {'leader': 'leader'}
+    annotate_fields = {'member_count': TEAM_MEMBER_COUNT}
+    # Teams can have any number of members, so they are listed by TeamMemberListAPIView instead.
+    default_omit = ['members']
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = TeamFilter
     ordering_fields = ['create_date', 'update_date', 'name']
@@ -97,46 +487,93 @@ class TeamListCreateAPIView(ListCreateAPIView):
     queryset = Team.objects.all()
 
 
-class TeamRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+class TeamRetrieveUpdateDestroyAPIView(NormalizedFormatMixin, SparseFieldsetMixin,
+                                       RetrieveUpdateDestroyAPIView):
     """
     View class for getting, updating, and deleting a team object.
     """
+    prefetch_fields = {'members': 'members'}
+    select_fields = {'leader': 'leader'}
+    annotate_fields = {'member_count': TEAM_MEMBER_COUNT}
     serializer_class = TeamSerializer
     queryset = Team.objects.all()
 
+    def perform_destroy(self, instance):
+        """
+        Teams are soft deleted.
+        """
+        Team.objects.filter(pk=instance.pk).soft_delete()
+
 
-class TeamEmployeeListCreateAPIView(ListCreateAPIView):
+class TeamBulkDeleteAPIView(BulkDeleteAPIView):
+    """
+    View class for deleting many teams.
+    """
+    queryset = Team.objects.all()
+
+
+class TeamMemberListAPIView(NormalizedFormatMixin, SparseFieldsetMixin, ListAPIView):
+    """
+     View class for listing and searching the members of a team with cursor pagination.
+    """
+    prefetch_fields = {'teams': 'teams'}
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = EmployeeFilter
+    serializer_class = EmployeeSerializer
+    pagination_class = DateCursorPagination
+    queryset = Employee.objects.all()
+
+    def get_queryset(self):
+        team = get_object_or_404(Team.objects.only('id'), pk=self.kwargs['pk'])
+        return super().get_queryset().filter(teamemployee__team=team)
+
+
+class TeamEmployeeListCreateAPIView(NormalizedFormatMixin, SparseFieldsetMixin, ListCreateAPIView):
     """
      View class for listing, searching and creating TeamEmployee objects.
     """
+    select_fields = {'employee': 'employee', 'team': 'team'}
     filter_backends = [DjangoFilterBackend]
     filterset_class = TeamEmployeeFilter
     serializer_class = TeamEmployeeSerializer
     queryset = TeamEmployee.objects.all()
 
 
-class TeamEmployeeRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+class TeamEmployeeRetrieveUpdateDestroyAPIView(NormalizedFormatMixin, SparseFieldsetMixin,
+                                               RetrieveUpdateDestroyAPIView):
     """
     View class for getting, updating, and deleting a team employee object.
     """
+    select_fields = {'employee': 'employee', 'team': 'team'}
     serializer_class = TeamEmployeeSerializer
     queryset = TeamEmployee.objects.all()
 
     def destroy(self, request, *args, **kwargs):
         """
         The leader of a team can not be removed from team members unless the team is deleted.
+        Memberships of deleted teams are not found by get_object, so a found team is not deleted.
         """
         instance = self.get_object()
-        if instance.team.leader == instance.employee and Team.objects.filter(id=instance.team.id).exists():
+        if instance.team.leader_id == instance.employee_id:
             return Response('A team leader can not be removed from the team.', status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return super().destroy(self, request, *args, **kwargs)
+        self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class WorkArrangementListCreateAPIView(ListCreateAPIView):
+class WorkArrangementListCreateAPIView(ColumnarFormatMixin, NormalizedFormatMixin, SparseFieldsetMixin,
+                                       ListCreateAPIView):
     """
      View class for listing, searching and creating WorkArrangements.
     """
+    select_fields = {'employee': 'employee'}
+    columnar_fields = {
+        'id': ('id', None),
+        'create_date': ('create_date', to_timestamp),
+        'update_date': ('update_date', to_timestamp),
+        'employee': ('employee_id', None),
+        'type': ('type', None),
+        'percentage': ('percentage', None),
+    }
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = WorkArrangementFilter
     ordering_fields = ['create_date', 'update_date', ]
@@ -145,30 +582,409 @@ class WorkArrangementListCreateAPIView(ListCreateAPIView):
     pagination_class = PagePagination
     queryset = WorkArrangement.objects.all()
 
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().create(request, *args, **kwargs)
+
 
-class WorkArrangementRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+class WorkArrangementRetrieveUpdateDestroyAPIView(NormalizedFormatMixin, SparseFieldsetMixin,
+                                                  RetrieveUpdateDestroyAPIView):
     """
     View class for getting, updating, and deleting a work arrangement object.
     """
+    select_fields = {'employee': 'employee'}
     serializer_class = WorkArrangementSerializer
     queryset = WorkArrangement.objects.all()
 
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
 
-class SalaryAPIView(APIView):
+
+class SalaryFilter(EmployeeFilter):
     """
-    Only supports GET method to returns the salaries.
+    Filter set class for searching in salaries.
+    It can filter based on the employee filters and the payable amount.
     """
+    min_payable = NumberFilter(field_name='payable', lookup_expr='gte')
+    max_payable = NumberFilter(field_name='payable', lookup_expr='lte')
+
+    class Meta(EmployeeFilter.Meta):
+        fields = EmployeeFilter.Meta.fields + ['min_payable', 'max_payable']
+
+
+class SalaryAPIView(ColumnarFormatMixin, GenericAPIView):
+    """
+    Returns salaries with GET. POST looks up the salaries of a list of employees which is too long for a URL.
+    """
+    columnar_fields = {
+        'employee': ('id', None),
+        'name': ('name', None),
+        'employee_id': ('employee_id', None),
+        'payable': ('payable', to_money_string),
+    }
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = SalaryFilter
+    ordering_fields = ['payable', 'hourly_rate', 'name', 'create_date', 'update_date']
+    ordering = ['id']
+    serializer_class = SalarySerializer
+    pagination_class = PagePagination
+    queryset = Employee.objects.all()
 
     def get(self, request, *args, **kwargs):
         """
-        Returns salaries of all employees or a single one.
+        Returns salaries of a single employee (?employee=1), a list of them (?employee=1,2,3)
+        or a page of all employees.
         """
         employee_id = request.query_params.get('employee')
-        if employee_id:
+        if employee_id and ',' in employee_id:
+            return self.lookup(split_query_param(employee_id))
+        elif employee_id:
             employee = get_object_or_404(Employee, id=employee_id)
             salary = Salary(employee)
             return Response(SalarySerializer(salary, many=False, read_only=True).data, status=status.HTTP_200_OK)
         else:
-            employees = Employee.objects.all()
-            salaries = [Salary(employee=employee) for employee in employees]
-            return Response(SalarySerializer(salaries, many=True, read_only=True).data, status=status.HTTP_200_OK)
+            return self.list(request)
+
+    def list(self, request):
+        """
+        Lists salaries of all employees. The salaries are calculated by the database, so they can be filtered
+        (?min_payable=, ?max_payable= and the employee filters), ordered (?ordering=-payable) and paginated.
+        Filtering or ordering by payable calculates the salary of every matching employee (see with_payable).
+        """
+        if self.is_columnar():
+            return self.columnar_list()
+        queryset = self.filter_queryset(self.get_queryset().with_payable())
+        page = self.paginate_queryset(queryset)
+        salaries = [Salary(employee, payable=employee.payable) for employee in page]
+        return self.get_paginated_response(SalarySerializer(salaries, many=True, read_only=True).data)
+
+    def get_columnar_queryset(self):
+        return self.get_queryset().with_payable()
+
+    def post(self, request, *args, **kwargs):
+        """
+        Returns the salaries of the employees whose ids are sent as {"employees": [1, 2, 3]}.
+        """
+        if not isinstance(request.data, dict):
+            return Response('Expected an object with the list of employees.', status=status.HTTP_400_BAD_REQUEST)
+        return self.lookup(request.data.get('employees'))
+
+    def lookup(self, employee_ids):
+        """
+        Returns the salaries of the given employees in the requested order. All of them must exist.
+        """
+        lookup_serializer = SalaryLookupSerializer(data={'employees': employee_ids})
+        lookup_serializer.is_valid(raise_exception=True)
+        employee_ids = list(dict.fromkeys(lookup_serializer.validated_data['employees']))
+        employees = {}
+        for start in range(0, len(employee_ids), Salary.batch_size):
+            employees.update(Employee.objects.in_bulk(employee_ids[start:start + Salary.batch_size]))
+        missing = [employee_id for employee_id in employee_ids if employee_id not in employees]
+        if missing:
+            return Response(f"Employees not found: {', '.join(map(str, missing))}.", status=status.HTTP_404_NOT_FOUND)
+        salaries = Salary.for_employees(employees[employee_id] for employee_id in employee_ids)
+        return Response(SalarySerializer(salaries, many=True, read_only=True).data, status=status.HTTP_200_OK)
+
+
+class SnapshotSalaryAPIView(APIView):
+    """
+    Returns salaries like SalaryAPIView does for ?employee=1 and ?employee=1,2,3, from the memory mapped workforce
+    snapshot instead of the database. The salaries are as recent as the last export_snapshot run.
+    """
+
+    def get(self, request, *args, **kwargs):
+        snapshot = snapshots.get()
+        if snapshot is None:
+            return Response("Snapshot is not available.", status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        employee_ids = split_query_param(request.query_params.get('employee'))
+        lookup_serializer = SalaryLookupSerializer(data={'employees': employee_ids})
+        lookup_serializer.is_valid(raise_exception=True)
+        employee_ids = list(dict.fromkeys(lookup_serializer.validated_data['employees']))
+        salaries = [snapshot.salary(employee_id) for employee_id in employee_ids]
+        missing = [employee_id for employee_id, salary in zip(employee_ids, salaries) if salary is None]
+        if missing:
+            return Response(f"Employees not found: {', '.join(map(str, missing))}.", status=status.HTTP_404_NOT_FOUND)
+        if ',' not in request.query_params['employee']:
+            return Response(SalarySerializer(salaries[0], read_only=True).data, status=status.HTTP_200_OK)
+        return Response(SalarySerializer(salaries, many=True, read_only=True).data, status=status.HTTP_200_OK)
+
+
+class SnapshotMembershipAPIView(APIView):
+    """
+    Returns the member ids of a team (?team=1) or the team ids of an employee (?employee=1) from the memory mapped
+    workforce snapshot.
+    """
+
+    def get(self, request, *args, **kwargs):
+        snapshot = snapshots.get()
+        if snapshot is None:
+            return Response("Snapshot is not available.", status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        team_id = request.query_params.get('team')
+        employee_id = request.query_params.get('employee')
+        try:
+            if team_id:
+                return Response({'team': int(team_id), 'members': snapshot.members(int(team_id))},
+                                status=status.HTTP_200_OK)
+            if employee_id:
+                return Response({'employee': int(employee_id), 'teams': snapshot.teams(int(employee_id))},
+                                status=status.HTTP_200_OK)
+        except ValueError:
+            return Response("Team and employee should be ids.", status=status.HTTP_400_BAD_REQUEST)
+        return Response("A team or an employee should be given.", status=status.HTTP_400_BAD_REQUEST)
+
+
+class MembershipQueryAPIView(APIView):
+    """
+    Set queries over the team memberships, answered from the in-process membership index instead of the database.
+    ?teams=1,2&any_teams=3,4&not_teams=5 returns the employees who are members of teams 1 and 2, of team 3 or 4 and
+    not of team 5. ?employees=, ?any_employees= and ?not_employees= return the teams which the employees share
+    in the same way. At least one of the all and any parameters should be given.
+    """
+    operands = {
+        'employees': ('teams', 'any_teams', 'not_teams'),
+        'teams': ('employees', 'any_employees', 'not_employees'),
+    }
+
+    def get(self, request, *args, **kwargs):
+        params = {}
+        try:
+            for result, names in self.operands.items():
+                for name in names:
+                    value = split_query_param(request.query_params.get(name))
+                    if value is not None:
+                        params.setdefault(result, []).append((name, [int(item) for item in value]))
+        except ValueError:
+            return Response("Teams and employees should be ids.", status=status.HTTP_400_BAD_REQUEST)
+        if len(params) != 1:
+            return Response("Either teams or employees should be given.", status=status.HTTP_400_BAD_REQUEST)
+        [(result, given)] = params.items()
+        all_ids, any_ids, no_ids = (dict(given).get(name, []) for name in self.operands[result])
+        if not all_ids and not any_ids:
+            return Response(f"{self.operands[result][0].capitalize()} or {self.operands[result][1]} should be given.",
+                            status=status.HTTP_400_BAD_REQUEST)
+        if result == 'employees':
+            ids = membership_index.employees(all_ids, any_ids, no_ids)
+        else:
+            ids = membership_index.shared_teams(all_ids, any_ids, no_ids)
+        return Response({'count': len(ids), result: ids}, status=status.HTTP_200_OK)
+
+
+class EmployeeAutocompleteAPIView(APIView):
+    """
+    Type-ahead lookup of employees. Returns up to ?limit= employees whose name, a word of whose name or whose
+    employee id starts with ?q=, case insensitive. The employees are found in the in-process autocomplete index,
+    without a query or a count on the database.
+    """
+
+    def get(self, request, *args, **kwargs):
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            return Response("Q should be given.", status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', settings.AUTOCOMPLETE_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.AUTOCOMPLETE_MAX_LIMIT:
+            return Response(f"Limit should be a number from 1 to {settings.AUTOCOMPLETE_MAX_LIMIT}.",
+                            status=status.HTTP_400_BAD_REQUEST)
+        employees = [{'id': employee_id, 'name': name, 'employee_id': code}
+                     for employee_id, name, code in autocomplete_index.search(prefix, limit)]
+        return Response(employees, status=status.HTTP_200_OK)
+
+
+class EmployeeByCodeAPIView(APIView):
+    """
+    Returns the employee with a company employee id. A cached employee is returned without any query
+    (see employment.codes).
+    """
+
+    def get(self, request, *args, **kwargs):
+        employees = employee_codes.lookup([kwargs['code']])
+        if kwargs['code'] not in employees:
+            return Response("Employee not found.", status=status.HTTP_404_NOT_FOUND)
+        return Response(employees[kwargs['code']], status=status.HTTP_200_OK)
+
+
+class EmployeeByCodeListAPIView(APIView):
+    """
+    Returns the employees with the company employee ids in ?employee_id=A1,B2, in the requested order.
+    All of them must exist.
+    """
+
+    def get(self, request, *args, **kwargs):
+        lookup_serializer = EmployeeCodeLookupSerializer(
+            data={'employee_ids': split_query_param(request.query_params.get('employee_id'))})
+        lookup_serializer.is_valid(raise_exception=True)
+        codes = list(dict.fromkeys(lookup_serializer.validated_data['employee_ids']))
+        employees = employee_codes.lookup(codes)
+        missing = [code for code in codes if code not in employees]
+        if missing:
+            return Response(f"Employees not found: {', '.join(missing)}.", status=status.HTTP_404_NOT_FOUND)
+        return Response([employees[code] for code in codes], status=status.HTTP_200_OK)
+
+
+class EmployeeColleaguesAPIView(APIView):
+    """
+    Returns the teams of an employee, the leaders of those teams and the colleagues of the employee: the members
+    of the same teams (distance 1), their colleagues (distance 2) and so on up to ?depth= (1 by default).
+    The colleagues are found in the in-process membership index, only the employee itself is read from the database.
+    """
+
+    def get(self, request, *args, **kwargs):
+        employee = get_object_or_404(Employee.objects.only('id'), pk=kwargs['pk'])
+        try:
+            depth = int(request.query_params.get('depth', 1))
+        except ValueError:
+            depth = 0
+        if not 1 <= depth <= settings.COLLEAGUES_MAX_DEPTH:
+            return Response(f"Depth should be a number from 1 to {settings.COLLEAGUES_MAX_DEPTH}.",
+                            status=status.HTTP_400_BAD_REQUEST)
+        team_ids, leader_ids, distances = membership_index.colleagues(employee.id, depth)
+        colleagues = [{'id': colleague_id, 'distance': distance}
+                      for colleague_id, distance in sorted(distances.items(), key=lambda item: (item[1], item[0]))]
+        return Response({'employee': employee.id, 'depth': depth, 'teams': team_ids, 'leaders': leader_ids,
+                         'count': len(colleagues), 'colleagues': colleagues}, status=status.HTTP_200_OK)
+
+
+class JobCreateAPIView(CreateAPIView):
+    """
+    View class for queueing a background job. Returns the job with its id, without waiting for it to run.
+    """
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+class JobRetrieveAPIView(RetrieveAPIView):
+    """
+    View class for getting the status, progress and result of a background job.
+    """
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+
+class ChangeListAPIView(GenericAPIView):
+    """
+    The change feed: returns the changes after the sequence number ?since= in order, at most ?limit= of them,
+    optionally only of some entities (?entity=team,team_employee).
+    Consumers pass the returned "since" to the next request, until "has_more" is false. The feed stops before a
+    change which may still be committed below a later one (see settled_sequence), so no change is skipped.
+    """
+    serializer_class = ChangeSerializer
+    queryset = Change.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        params_serializer = ChangeFeedSerializer(data=request.query_params)
+        params_serializer.is_valid(raise_exception=True)
+        params = params_serializer.validated_data
+        position, more = settled_sequence(params['since'])
+        queryset = self.get_queryset().filter(id__gt=params['since'], id__lte=position)
+        if params.get('entity'):
+            queryset = queryset.filter(entity__in=params['entity'])
+        # One change more than the limit tells whether there are more changes.
+        changes = list(queryset.order_by('id')[:params['limit'] + 1])
+        has_more = len(changes) > params['limit']
+        changes = changes[:params['limit']]
+        return Response({
+            # The changes of other entities up to the position are skipped too.
+            'since': changes[-1].id if has_more else position,
+            'has_more': has_more or more,
+            'results': ChangeSerializer(changes, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+class BatchAPIView(APIView):
+    """
+    Runs a list of API requests in one round trip and returns their statuses and bodies in the same order:
+    {"requests": [{"method": "GET", "url": "/api/teams/1/"}, ...]} -> {"responses": [{"status": 200, "body": ...}]}
+
+    The requests run one after the other in one transaction, so they share the DB connection and read consistent
+    data. A request which fails is rolled back alone. The row locks which the requests take are held until the
+    whole batch commits, so a batch of up to settings.BATCH_MAX_REQUESTS writes blocks the other writers of those
+    rows for as long as all of them run. With {"parallel": true}, GET requests run at the same time in
+    settings.BATCH_MAX_WORKERS threads instead. Each request uses the throttle budget and the running requests
+    slots of its own route, and gets a 429 response when they are used up.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sub_requests = serializer.validated_data['requests']
+        if serializer.validated_data['parallel']:
+            with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS) as executor:
+                responses = list(executor.map(self.run_in_thread, [request] * len(sub_requests), sub_requests))
+        else:
+            with transaction.atomic():
+                responses = [self.run(request, sub_request) for sub_request in sub_requests]
+        return Response({'responses': responses}, status=status.HTTP_200_OK)
+
+    def run_in_thread(self, request, sub_request):
+        try:
+            return self.run(request, sub_request)
+        finally:
+            # Every thread of the pool has its own connection.
+            connection.close()
+
+    def run(self, request, sub_request):
+        """
+        Runs a sub-request with the view of its url and returns its status and body.
+        """
+        parts = urlsplit(sub_request['url'])
+        try:
+            match = resolve(parts.path)
+        except Resolver404:
+            match = None
+        if match is None or match.namespace != API_NAMESPACE or match.url_name == 'batch':
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': f"Url {parts.path} is not an API view."}
+        wait = take_route_token(request, match.url_name)
+        if wait:
+            return {'status': status.HTTP_429_TOO_MANY_REQUESTS, 'body': 'Request limit exceeded.'}
+
+        http_request = self.build_request(request._request, sub_request, parts)
+        with route_slot(match.url_name) as acquired:
+            if not acquired:
+                return {'status': status.HTTP_429_TOO_MANY_REQUESTS,
+                        'body': 'Too many requests are running. Try again later.'}
+            try:
+                with transaction.atomic():
+                    response = match.func(http_request, *match.args, **match.kwargs)
+            except Exception:
+                logger.exception('Batch request %s %s failed.', sub_request['method'], sub_request['url'])
+                return {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'body': 'Server error.'}
+        # The data of API responses is rendered with the batch response, instead of being rendered and parsed.
+        body = response.data if hasattr(response, 'data') else response.content.decode()
+        return {'status': response.status_code, 'body': body}
+
+    def build_request(self, request, sub_request, parts):
+        """
+        Returns a copy of the batch request with the method, url and body of a sub-request.
+        """
+        content = json.dumps(sub_request['body']).encode() if 'body' in sub_request else b''
+        http_request = HttpRequest()
+        http_request.method = sub_request['method']
+        http_request.path = http_request.path_info = parts.path
+        http_request.META = {**request.META, 'REQUEST_METHOD': sub_request['method'], 'PATH_INFO': parts.path,
+                             'QUERY_STRING': parts.query, 'CONTENT_TYPE': 'application/json',
+                             'CONTENT_LENGTH': str(len(content))}
+        http_request.GET = QueryDict(parts.query)
+        http_request.COOKIES = request.COOKIES
+        http_request._stream = BytesIO(content)
+        http_request._read_started = False
+        for attribute in ('user', 'session'):
+            if hasattr(request, attribute):
+                setattr(http_request, attribute, getattr(request, attribute))
+        return http_request
+
+
+class MetricsAPIView(APIView):
+    """
+    Exposes the request timing histograms collected by ServerTimingMiddleware in the Prometheus text format.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
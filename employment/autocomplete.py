@@ -0,0 +1,95 @@
+from bisect import bisect_left, insort
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .indexes import ChangeLogIndex
+from .models import Employee
+from .signals import bulk_changed
+
+
+def index_keys(name, employee_id):
+    """
+    Returns the keys under which an employee is found: its name, every later word of the name and its employee id,
+    case folded.
+    """
+    words = name.casefold().split()
+    keys = {' '.join(words[position:]) for position in range(len(words))}
+    keys.add(employee_id.casefold())
+    return keys
+
+
+class AutocompleteIndex(ChangeLogIndex):
+    """
+    In-process prefix index of the employee names and employee ids, for type-ahead lookups without the database.
+    The keys are kept in a sorted list of (key, id) pairs, so the matches of a prefix are found with one bisection
+    and are next to each other.
+    """
+    entities = ('employee',)
+
+    def clear(self):
+        self.keys = []
+        self.employees = {}
+
+    def add(self, employee_id, name, code):
+        self.remove(employee_id)
+        self.employees[employee_id] = (name, code)
+        for key in index_keys(name, code):
+            insort(self.keys, (key, employee_id))
+
+    def remove(self, employee_id):
+        if employee_id not in self.employees:
+            return
+        for key in index_keys(*self.employees.pop(employee_id)):
+            position = bisect_left(self.keys, (key, employee_id))
+            if position < len(self.keys) and self.keys[position] == (key, employee_id):
+                del self.keys[position]
+
+    def load(self):
+        employees = Employee.objects.values_list('id', 'name', 'employee_id').iterator()
+        self.employees = {employee_id: (name, code) for employee_id, name, code in employees}
+        self.keys = sorted((key, employee_id) for employee_id, (name, code) in self.employees.items()
+                           for key in index_keys(name, code))
+
+    def apply(self, changes):
+        # The change log only has the ids of the changed employees, their names are read in one query.
+        employee_ids = {object_id for seq, entity, object_id, action, data in changes}
+        current = Employee.objects.filter(id__in=employee_ids).values_list('id', 'name', 'employee_id')
+        for employee_id, name, code in current:
+            employee_ids.discard(employee_id)
+            self.add(employee_id, name, code)
+        for employee_id in employee_ids:
+            self.remove(employee_id)
+
+    def search(self, prefix, limit):
+        """
+        Returns up to limit employees whose name, a word of whose name or whose employee id starts with prefix,
+        as (id, name, employee_id) tuples ordered by the matched key.
+        """
+        prefix = prefix.casefold()
+        with self._lock:
+            self.ensure_synced()
+            matches = {}
+            for position in range(bisect_left(self.keys, (prefix,)), len(self.keys)):
+                key, employee_id = self.keys[position]
+                if not key.startswith(prefix) or len(matches) == limit:
+                    break
+                if employee_id not in matches:
+                    matches[employee_id] = (employee_id,) + self.employees[employee_id]
+            return list(matches.values())
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def mark_autocomplete_index_dirty(sender, **kwargs):
+    """
+    Makes the next lookup read the change log, so that it sees the changes of this process at once.
+    """
+    autocomplete_index.dirty = True
+
+
+@receiver(bulk_changed)
+def mark_autocomplete_index_dirty_on_bulk_change(sender, **kwargs):
+    if sender is Employee:
+        autocomplete_index.dirty = True
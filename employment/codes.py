@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .indexes import ChangeLogIndex
+from .models import Employee, Team, TeamEmployee
+from .signals import bulk_changed
+from .api.serializers import EmployeeSerializer
+
+
+class EmployeeCodeCache(ChangeLogIndex):
+    """
+    Bounded LRU cache of serialized employees by their company employee id, so that a cached employee is returned
+    without any query. Holds at most settings.EMPLOYEE_CODE_CACHE_SIZE employees, the least recently used one is
+    dropped first. Follows the change log like the in-process indexes: an employee is dropped when it, one of its
+    memberships or one of its teams changes, also when the change was made by another process.
+    """
+    entities = ('employee', 'team_employee', 'team')
+
+    def clear(self):
+        self.employees = OrderedDict()
+        self.codes = {}
+
+    def load(self):
+        # The cache is filled by lookups.
+        self.clear()
+
+    def apply(self, changes):
+        for seq, entity, object_id, action, data in changes:
+            if entity == 'employee':
+                self.discard(object_id)
+            elif entity == 'team_employee':
+                self.discard(data['employee'])
+            else:
+                # Changes of the team name are seen in the teams of its members.
+                for employee_id in [employee_id for employee_id, code in self.codes.items()
+                                    if any(team['id'] == object_id for team in self.employees[code]['teams'])]:
+                    self.discard(employee_id)
+
+    def discard(self, employee_id):
+        code = self.codes.pop(employee_id, None)
+        if code is not None:
+            del self.employees[code]
+
+    def lookup(self, codes):
+        """
+        Returns the serialized employees with the given company employee ids, as a dict by employee id.
+        Unknown codes are left out. The employees which are not cached are read with one query and cached.
+        """
+        with self._lock:
+            self.ensure_synced()
+            employees = {}
+            for code in codes:
+                if code in self.employees:
+                    self.employees.move_to_end(code)
+                    employees[code] = self.employees[code]
+            since = self.since
+        missing = [code for code in codes if code not in employees]
+        if not missing:
+            return employees
+        read = {employee.employee_id: EmployeeSerializer(employee).data
+                for employee in Employee.objects.prefetch_related('teams').filter(employee_id__in=missing)}
+        employees.update(read)
+        with self._lock:
+            # Rows read while changes were applied may be older than those changes, they are not cached.
+            if self.since != since:
+                return employees
+            for code, data in read.items():
+                self.discard(data['id'])
+                self.employees[code] = data
+                self.codes[data['id']] = code
+            while len(self.employees) > settings.EMPLOYEE_CODE_CACHE_SIZE:
+                code, data = self.employees.popitem(last=False)
+                del self.codes[data['id']]
+        return employees
+
+    def __len__(self):
+        return len(self.employees)
+
+
+employee_codes = EmployeeCodeCache()
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=TeamEmployee)
+@receiver(post_delete, sender=TeamEmployee)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def mark_employee_codes_dirty(sender, **kwargs):
+    """
+    Makes the next lookup read the change log, so that it sees the changes of this process at once.
+    """
+    employee_codes.dirty = True
+
+
+@receiver(bulk_changed)
+def mark_employee_codes_dirty_on_bulk_change(sender, **kwargs):
+    if sender in (Employee, TeamEmployee, Team):
+        employee_codes.dirty = True
@@ -0,0 +1,73 @@
+from threading import Lock
+from time import monotonic
+from django.conf import settings
+from .models import Change, settled_sequence, settled_start
+
+
+class ChangeLogIndex(object):
+    """
+    Base class of the in-process indexes which answer queries without the database.
+
+    An index is loaded on first use and then follows the entries of the change log for its entities. A receiver
+    of the save and delete signals marks it dirty, so that the changes of this process are read before the next
+    query. Changes made by other processes are read at most settings.INDEX_SYNC_INTERVAL seconds later.
+    Queries run under the lock of the index, after ensure_synced().
+    """
+    # Entities of the change log which the index follows
+    entities = ()
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drops the index. It is loaded again by the next query.
+        """
+        with self._lock:
+            self.clear()
+            self.since = None
+            self.synced = None
+            self.dirty = False
+
+    def clear(self):
+        raise NotImplementedError
+
+    def load(self):
+        """
+        Loads the index from the database.
+        """
+        raise NotImplementedError
+
+    def apply(self, changes):
+        """
+        Applies a batch of changes, as (id, entity, object_id, action, data) tuples ordered by id.
+        """
+        raise NotImplementedError
+
+    def sync(self):
+        """
+        Loads the index or applies the changes which it has not seen yet.
+        """
+        if self.since is None:
+            # The position in the change log is read first. Changes made during the load or shortly before it are
+            # applied again later, which does not change the result.
+            self.since = settled_start()
+            self.load()
+        else:
+            more = True
+            while more:
+                position, more = settled_sequence(self.since)
+                if position == self.since:
+                    break
+                changes = list(Change.objects.filter(entity__in=self.entities, id__gt=self.since, id__lte=position)
+                               .order_by('id').values_list('id', 'entity', 'object_id', 'action', 'data'))
+                if changes:
+                    self.apply(changes)
+                self.since = position
+        self.synced = monotonic()
+        self.dirty = False
+
+    def ensure_synced(self):
+        if self.dirty or self.synced is None or monotonic() - self.synced >= settings.INDEX_SYNC_INTERVAL:
+            self.sync()
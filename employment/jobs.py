@@ -0,0 +1,148 @@
+import logging
+import traceback
+from datetime import timedelta
+from threading import Event
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from .models import Job, Employee, Salary
+from .purge import purge_deleted
+from .api.serializers import EmployeeSerializer, SalarySerializer
+
+logger = logging.getLogger(__name__)
+
+# Job handlers by kind. A handler takes the job and returns a JSON serializable result.
+handlers = {}
+
+
+def handler(kind):
+    """
+    Registers a function as the handler of a kind of job.
+    """
+    def register(function):
+        handlers[kind] = function
+        return function
+    return register
+
+
+def report_progress(job, progress):
+    """
+    Saves the completed percentage of a running job without touching its other fields.
+    It is the heartbeat of the job too: a job whose update_date is older than settings.JOB_TIMEOUT is failed by
+    fail_stale_jobs, so a handler which runs longer than that has to report progress in between.
+    """
+    job.progress = progress
+    Job.objects.filter(pk=job.pk, status=Job.Statuses.Running).update(progress=progress, update_date=timezone.now())
+
+
+@handler('salary_export')
+def export_salaries(job):
+    """
+    Calculates the salaries of all employees.
+    """
+    queryset = Employee.objects.with_payable().order_by('id')
+    total = queryset.count()
+    salaries = []
+    for employee in queryset.iterator(chunk_size=1000):
+        salaries.append(SalarySerializer(Salary(employee, payable=employee.payable)).data)
+        if len(salaries) % 1000 == 0:
+            report_progress(job, len(salaries) * 100 // total)
+    return salaries
+
+
+@handler('employee_import')
+def import_employees(job):
+    """
+    Creates the employees in params['employees']. Invalid employees are reported by their index.
+    """
+    employees = job.params.get('employees', [])
+    created, errors = 0, {}
+    for index, data in enumerate(employees):
+        serializer = EmployeeSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            created += 1
+        else:
+            errors[index] = serializer.errors
+        if (index + 1) % 100 == 0:
+            report_progress(job, (index + 1) * 100 // len(employees))
+    return {'created': created, 'errors': errors}
+
+
+@handler('purge_deleted')
+def purge(job):
+    """
+    Removes soft deleted teams and employees.
+    """
+    return purge_deleted(job.params.get('batch_size', 1000))
+
+
+def fail_stale_jobs():
+    """
+    Fails the running jobs which have not reported progress for settings.JOB_TIMEOUT seconds, e.g. because their
+    worker was killed. They are not queued again, since the handler may have done a part of the work already
+    (e.g. created some of the employees of an import). Returns the number of failed jobs.
+    """
+    now = timezone.now()
+    return Job.objects.filter(status=Job.Statuses.Running,
+                              update_date__lt=now - timedelta(seconds=settings.JOB_TIMEOUT)).update(
+        status=Job.Statuses.Failed, error=f'No progress was reported for {settings.JOB_TIMEOUT} seconds.',
+        finish_date=now, update_date=now)
+
+
+def claim_job(worker):
+    """
+    Marks the oldest queued job as running by the given worker and returns it, or None if no job is queued.
+    The status check in the UPDATE makes sure that only one worker gets each job, without any lock.
+    Running jobs which timed out are failed first.
+    """
+    if fail_stale_jobs():
+        logger.warning('Failed running jobs without progress for %s seconds.', settings.JOB_TIMEOUT)
+    for job_id in Job.objects.filter(status=Job.Statuses.Queued).order_by('id').values_list('id', flat=True)[:10]:
+        claimed = Job.objects.filter(id=job_id, status=Job.Statuses.Queued).update(
+            status=Job.Statuses.Running, worker=worker, start_date=timezone.now(), update_date=timezone.now())
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Runs a claimed job and saves its result or error. Nothing is saved if the job timed out in the meantime.
+    """
+    try:
+        result = handlers[job.kind](job)
+    except Exception:
+        logger.exception('Job %s (%s) failed.', job.id, job.kind)
+        job.status = Job.Statuses.Failed
+        job.error = traceback.format_exc()
+    else:
+        job.status = Job.Statuses.Succeeded
+        job.progress = 100
+        job.result = result
+    job.finish_date = job.update_date = timezone.now()
+    finished = Job.objects.filter(pk=job.pk, status=Job.Statuses.Running, worker=job.worker).update(
+        status=job.status, progress=job.progress, result=job.result, error=job.error, finish_date=job.finish_date,
+        update_date=job.update_date)
+    if not finished:
+        logger.warning('Job %s (%s) timed out before it finished, its outcome is dropped.', job.id, job.kind)
+
+
+def work(worker, poll_interval=1.0, once=False, stop=None):
+    """
+    Runs queued jobs one after the other. Waits poll_interval seconds when there is no queued job,
+    or returns if once is set. Stops when the stop event is set.
+    """
+    stop = stop or Event()
+    while not stop.is_set():
+        # Drops broken and expired connections between jobs, as is done between requests.
+        # Not inside a transaction (e.g. a test case), where the connection must be kept.
+        if not connection.in_atomic_block:
+            close_old_connections()
+        job = claim_job(worker)
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            stop.wait(poll_interval)
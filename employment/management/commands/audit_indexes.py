@@ -0,0 +1,124 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from rest_framework.request import Request
+from django.db.models import F
+from employment.api.views import EmployeeListCreateAPIView, TeamListCreateAPIView, TeamMemberListAPIView, \
+    TeamEmployeeListCreateAPIView, WorkArrangementListCreateAPIView, SalaryAPIView
+from employment.models import Employee, TeamEmployee, WorkArrangement
+
+# The list views and the query parameters whose queries are audited.
+VIEW_AUDITS = [
+    (EmployeeListCreateAPIView, {}, {}),
+    (EmployeeListCreateAPIView, {}, {'ordering': '-update_date'}),
+    (EmployeeListCreateAPIView, {}, {'employee_id': 'A1234'}),
+    (EmployeeListCreateAPIView, {}, {'create_date_after': '2021-01-01'}),
+    (TeamListCreateAPIView, {}, {}),
+    (TeamListCreateAPIView, {}, {'ordering': '-update_date'}),
+    (TeamMemberListAPIView, {'pk': 1}, {}),
+    (TeamEmployeeListCreateAPIView, {}, {'team': '1'}),
+    (TeamEmployeeListCreateAPIView, {}, {'employee': '1'}),
+    (WorkArrangementListCreateAPIView, {}, {}),
+    (WorkArrangementListCreateAPIView, {}, {'ordering': '-update_date'}),
+    (WorkArrangementListCreateAPIView, {}, {'employee': '1', 'type': '1'}),
+    (SalaryAPIView, {}, {}),
+    (SalaryAPIView, {}, {'min_payable': '1000'}),
+    # Sorts all employees by their calculated salary, see EmployeeQuerySet.with_payable.
+    (SalaryAPIView, {}, {'ordering': '-payable'}),
+]
+
+# Queries which are not made by a list view but run on every write or salary calculation.
+QUERY_AUDITS = [
+    ('add_leader_to_team', lambda: TeamEmployee.objects.filter(team=1).filter(employee=1)),
+    ('Salary.calculate_payable', lambda: WorkArrangement.objects.filter(employee=1).order_by('id')),
+    ('Salary.for_employees leaders', lambda: TeamEmployee.objects.filter(employee_id__in=[1, 2],
+                                                                         team__leader_id=F('employee_id'))),
+    ('Salary.for_employees', lambda: WorkArrangement.objects.filter(employee_id__in=[1, 2]).order_by('id')),
+    # The same join and filter as the locking aggregate of the check.
+    ('WorkArrangementSerializer.validate', lambda: Employee.all_objects.filter(pk=1)
+     .values('workarrangement__type', 'workarrangement__percentage')),
+]
+
+
+def view_queryset(view_class, kwargs, params):
+    """
+    Returns the queryset a GET request with the given query parameters makes in the given list view.
+    """
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    http_request.GET.update(params)
+    view = view_class()
+    view.setup(http_request, **kwargs)
+    view.request = Request(http_request)
+    view.format_kwarg = None
+    if view_class is TeamMemberListAPIView:
+        # Skip the existence check of the team, the audit only needs the shape of the query.
+        queryset = super(TeamMemberListAPIView, view).get_queryset().filter(teamemployee__team=kwargs['pk'])
+    elif view_class is SalaryAPIView:
+        queryset = view.get_queryset().with_payable()
+    else:
+        queryset = view.get_queryset()
+    queryset = view.filter_queryset(queryset)
+    if view.paginator is not None:
+        queryset = queryset[:view.paginator.page_size]
+    return queryset
+
+
+def find_problems(plan):
+    """
+    Looks for full table scans and sorts which can not use an index in an EXPLAIN output.
+    """
+    problems = []
+    for line in plan.splitlines():
+        if connection.vendor == 'mysql':
+            # Columns: id, select_type, table, partitions, type, possible_keys, key, key_len, ref, rows, ...
+            columns = line.split()
+            if len(columns) > 4 and columns[4] == 'ALL':
+                problems.append(f'full scan of {columns[2]}')
+            if 'Using filesort' in line:
+                problems.append(f'filesort on {columns[2]}')
+        elif connection.vendor == 'sqlite':
+            match = re.search(r'\bSCAN (?:TABLE )?(\w+)(.*)', line)
+            if match and 'INDEX' not in match.group(2):
+                problems.append(f'full scan of {match.group(1)}')
+            if 'USE TEMP B-TREE FOR ORDER BY' in line:
+                problems.append('filesort')
+        elif connection.vendor == 'postgresql':
+            match = re.search(r'Seq Scan on (\w+)', line)
+            if match:
+                problems.append(f'full scan of {match.group(1)}')
+            if re.search(r'^\s*(->\s*)?Sort\b', line):
+                problems.append('filesort')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the queries made by the list views, filters and signals and reports full table ' \
+           'scans and sorts that can not use an index. The optimizer may prefer scans on tiny tables, so run it ' \
+           'against a database with production-like data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full EXPLAIN output.')
+        parser.add_argument('--strict', action='store_true', help='Exit with an error if any problem is found.')
+
+    def handle(self, *args, **options):
+        audits = [(f'{view_class.__name__} {params or ""}'.strip(), view_queryset(view_class, kwargs, params))
+                  for view_class, kwargs, params in VIEW_AUDITS]
+        audits += [(name, queryset()) for name, queryset in QUERY_AUDITS]
+
+        problem_count = 0
+        for name, queryset in audits:
+            plan = queryset.explain()
+            problems = find_problems(plan)
+            problem_count += len(problems)
+            if problems:
+                self.stdout.write(self.style.WARNING(f'{name}: {", ".join(problems)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+
+        if problem_count and options['strict']:
+            raise CommandError(f'{problem_count} problem(s) found.')
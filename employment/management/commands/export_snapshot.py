@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from employment.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Exports employees, memberships, leader flags and work arrangements to the memory mapped snapshot ' \
+           'which the /api/snapshot/ views read. The old snapshot is replaced atomically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Snapshot file. Defaults to settings.SNAPSHOT_PATH.')
+
+    def handle(self, *args, **options):
+        counts = write_snapshot(options['path'] or str(settings.SNAPSHOT_PATH))
+        self.stdout.write(f"{counts['employees']} employees, {counts['memberships']} memberships exported")
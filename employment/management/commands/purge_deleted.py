@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from employment.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    help = 'Removes soft deleted teams and employees, with their memberships and work arrangements, ' \
+           'in batches of raw DELETE statements.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        for name, count in purge_deleted(options['batch_size']).items():
+            self.stdout.write(f'{name}: {count} deleted')
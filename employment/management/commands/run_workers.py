@@ -0,0 +1,43 @@
+import os
+import socket
+from threading import Event, Thread
+from django.core.management.base import BaseCommand
+from django.db import connection
+from employment.jobs import work
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued background jobs (employment.models.Job) with a pool of worker threads. ' \
+           'The jobs table is the queue, so no message broker is needed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Number of worker threads.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before looking for new jobs when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+
+    def handle(self, *args, **options):
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        if options['threads'] == 1:
+            work(f'{name}:0', options['poll_interval'], options['once'])
+            return
+
+        stop = Event()
+
+        def run(index):
+            try:
+                work(f'{name}:{index}', options['poll_interval'], options['once'], stop)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=run, args=(index,), name=f'job-worker-{index}') for index in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # Running jobs are finished before the workers stop.
+            stop.set()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,160 @@
+from array import array
+from bisect import bisect_left
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .indexes import ChangeLogIndex
+from .models import Change, TeamEmployee, Employee, Team
+from .signals import bulk_changed
+
+
+class PostingsMap(object):
+    """
+    Maps keys (e.g. team ids) to sets of values (e.g. employee ids) stored as sorted arrays of 64 bit integers,
+    so a set takes 8 bytes per value, whatever the values are.
+    """
+
+    def __init__(self):
+        self.postings = {}
+
+    def get(self, key):
+        return self.postings.get(key, ())
+
+    def add(self, key, value):
+        postings = self.postings.setdefault(key, array('Q'))
+        index = bisect_left(postings, value)
+        if index == len(postings) or postings[index] != value:
+            postings.insert(index, value)
+
+    def remove(self, key, value):
+        postings = self.postings.get(key)
+        if postings is None:
+            return
+        index = bisect_left(postings, value)
+        if index < len(postings) and postings[index] == value:
+            del postings[index]
+            if not postings:
+                del self.postings[key]
+
+    def query(self, all_keys=(), any_keys=(), none_keys=()):
+        """
+        Returns the values which are in the sets of all of all_keys, of at least one of any_keys (if given) and
+        of none of none_keys, in ascending order.
+        """
+        result = None
+        # The smallest set is intersected first, so the intermediate results are as small as they can be.
+        for key in sorted(all_keys, key=lambda key: len(self.get(key))):
+            result = set(self.get(key)) if result is None else result.intersection(self.get(key))
+        if any_keys:
+            union = set().union(*(self.get(key) for key in any_keys))
+            result = union if result is None else result & union
+        if result is None:
+            return []
+        for key in none_keys:
+            result.difference_update(self.get(key))
+        return sorted(result)
+
+
+class MembershipIndex(ChangeLogIndex):
+    """
+    In-process index of the team memberships, for set queries over teams and employees without the database.
+    Team members and the teams of employees are kept as sorted arrays of ids, the team leaders in a dict.
+
+    The index is loaded from TeamEmployee and Team on first use and then follows the team and team_employee entries
+    of the change log, which also has the memberships hidden by deleted teams and employees.
+    """
+    entities = ('team_employee', 'team')
+
+    def clear(self):
+        self.members = PostingsMap()
+        self.teams = PostingsMap()
+        self.memberships = {}
+        self.leaders = {}
+
+    def add(self, membership_id, team_id, employee_id):
+        self.remove(membership_id)
+        self.memberships[membership_id] = (team_id, employee_id)
+        self.members.add(team_id, employee_id)
+        self.teams.add(employee_id, team_id)
+
+    def remove(self, membership_id):
+        team_id, employee_id = self.memberships.pop(membership_id, (None, None))
+        if team_id is not None:
+            self.members.remove(team_id, employee_id)
+            self.teams.remove(employee_id, team_id)
+
+    def load(self):
+        rows = TeamEmployee.objects.values_list('id', 'team_id', 'employee_id')
+        for membership_id, team_id, employee_id in rows.iterator():
+            self.add(membership_id, team_id, employee_id)
+        self.leaders = dict(Team.objects.values_list('id', 'leader_id'))
+
+    def apply(self, changes):
+        for seq, entity, object_id, action, data in changes:
+            if entity == 'team':
+                if action == Change.Actions.Delete:
+                    self.leaders.pop(object_id, None)
+                else:
+                    self.leaders[object_id] = data['leader']
+            elif action == Change.Actions.Delete:
+                self.remove(object_id)
+            else:
+                self.add(object_id, data['team'], data['employee'])
+
+    def employees(self, all_teams=(), any_teams=(), no_teams=()):
+        """
+        Returns the ids of the employees who are members of all of all_teams, of at least one of any_teams and
+        of none of no_teams.
+        """
+        with self._lock:
+            self.ensure_synced()
+            return self.members.query(all_teams, any_teams, no_teams)
+
+    def shared_teams(self, all_employees=(), any_employees=(), no_employees=()):
+        """
+        Returns the ids of the teams which have all of all_employees, at least one of any_employees and
+        none of no_employees as members.
+        """
+        with self._lock:
+            self.ensure_synced()
+            return self.teams.query(all_employees, any_employees, no_employees)
+
+    def colleagues(self, employee_id, depth=1):
+        """
+        Returns the teams of an employee, the leaders of those teams and the employees who can be reached through
+        shared teams in up to depth steps, as a dict of employee ids to their distance from the employee.
+        """
+        with self._lock:
+            self.ensure_synced()
+            team_ids = list(self.teams.get(employee_id))
+            leader_ids = sorted({self.leaders[team_id] for team_id in team_ids if team_id in self.leaders})
+            distances = {}
+            reached, frontier = {employee_id}, [employee_id]
+            for distance in range(1, depth + 1):
+                teams = set().union(*(self.teams.get(colleague_id) for colleague_id in frontier))
+                members = set().union(*(self.members.get(team_id) for team_id in teams)) - reached
+                if not members:
+                    break
+                reached |= members
+                frontier = list(members)
+                distances.update(dict.fromkeys(frontier, distance))
+            return sorted(team_ids), leader_ids, distances
+
+
+membership_index = MembershipIndex()
+
+
+@receiver(post_save, sender=TeamEmployee)
+@receiver(post_delete, sender=TeamEmployee)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def mark_membership_index_dirty(sender, **kwargs):
+    """
+    Makes the next query of the index read the change log, so that it sees the changes of this process at once.
+    """
+    membership_index.dirty = True
+
+
+@receiver(bulk_changed)
+def mark_membership_index_dirty_on_bulk_change(sender, **kwargs):
+    if sender in (TeamEmployee, Team, Employee):
+        membership_index.dirty = True
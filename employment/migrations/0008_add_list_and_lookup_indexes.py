@@ -0,0 +1,45 @@
+# Generated by Django 3.2.5 on 2026-10-19 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employment', '0007_auto_20210717_2134'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['create_date'], name='employee_create_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['update_date'], name='employee_update_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['create_date'], name='team_create_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['update_date'], name='team_update_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teamemployee',
+            index=models.Index(fields=['team', 'employee'], name='teamemployee_team_employee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workarrangement',
+            index=models.Index(fields=['employee', 'type'], name='workarrangement_emp_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workarrangement',
+            index=models.Index(fields=['create_date'], name='workarrangement_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workarrangement',
+            index=models.Index(fields=['update_date'], name='workarrangement_update_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.5 on 2026-10-19 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employment', '0010_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.IntegerField(choices=[(1, 'Create'), (2, 'Update'), (3, 'Delete')])),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('create_date', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['entity', 'id'], name='change_entity_id_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.5 on 2026-10-19 09:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_employee_ids(apps, schema_editor):
+    """
+    Stops the migration with the duplicated employee ids, which have to be fixed by hand before the unique index
+    can be created.
+    """
+    Employee = apps.get_model('employment', 'Employee')
+    duplicates = list(Employee.objects.values('employee_id').annotate(count=Count('id')).filter(count__gt=1)
+                      .values_list('employee_id', flat=True)[:20])
+    if duplicates:
+        raise RuntimeError(f"Employee ids used by more than one employee: {', '.join(duplicates)}.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employment', '0011_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_employee_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='employee',
+            name='employee_id',
+            field=models.CharField(max_length=12, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.5 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employment', '0012_unique_employee_id'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='workarrangement',
+            name='workarrangement_emp_type_idx',
+        ),
+        migrations.AddIndex(
+            model_name='workarrangement',
+            index=models.Index(fields=['employee', 'type', 'create_date'], name='workarrangement_emp_type_idx'),
+        ),
+    ]
@@ -1,10 +1,93 @@
-from django.db import models
+from django.db import DatabaseError, connection, models, transaction
 from django.conf import settings
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.core.validators import MaxValueValidator
 from decimal import Decimal
-from django.db.models import Sum
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import (F, Sum, Case, When, Value, Exists, OuterRef, Subquery, ExpressionWrapper)
+from django.db.models.functions import Cast
+from django.utils import timezone
+from .signals import bulk_changed
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+
+    def soft_delete(self):
+        """
+        Marks the rows as deleted with a single UPDATE. The rows are removed later by the purge_deleted command,
+        so the cost of a delete does not depend on the number of rows which reference the deleted ones.
+        """
+        pks = list(self.filter(is_deleted=False).values_list('pk', flat=True))
+        if pks:
+            # The changes are logged in the transaction of the update.
+            with transaction.atomic():
+                self.model.all_objects.filter(pk__in=pks).update(is_deleted=True, update_date=timezone.now())
+                bulk_changed.send(sender=self.model, pks=pks, action='delete')
+        return len(pks)
+
+
+class SoftDeleteManager(models.Manager):
+    """
+    The default manager of soft deletable models. Leaves out the rows which are marked as deleted.
+    """
+
+    def get_queryset(self):
+        return super(SoftDeleteManager, self).get_queryset().filter(is_deleted=False)
+
+
+class ActiveRelationsManager(models.Manager):
+    """
+    The default manager of models which reference soft deletable models.
+    Leaves out the rows which reference a deleted row.
+    """
+
+    def __init__(self, *relations):
+        super(ActiveRelationsManager, self).__init__()
+        self.relations = relations
+
+    def get_queryset(self):
+        return super(ActiveRelationsManager, self).get_queryset().filter(
+            **{f'{relation}__is_deleted': False for relation in self.relations})
+
+
+class EmployeeQuerySet(SoftDeleteQuerySet):
+
+    def with_payable(self):
+        """
+        Annotates the salary of every employee as 'payable', calculated by the database the same way as
+        Salary.compute_payable, so that salaries can be filtered, ordered and paginated in SQL.
+
+        payable is not stored, so no index can serve it: filtering or ordering by it (e.g. ?ordering=-payable)
+        runs the correlated subqueries for every employee which passes the other filters and then sorts them,
+        even for the first page. The cost grows with the number of employees, not with the page size; filter by
+        the indexed employee fields first where possible.
+        """
+        work_arrangements = WorkArrangement.objects.filter(employee=OuterRef('pk'))
+        hourly_rate = Case(
+            When(Exists(TeamEmployee.objects.filter(employee=OuterRef('pk'), team__leader=OuterRef('pk'))),
+                 then=F('hourly_rate') * Value(Decimal(str(settings.LEADER_COEFFICIENT)))),
+            default=F('hourly_rate'),
+        )
+        full_time_hours = Value(settings.FULL_TIME_HOURS)
+        payable_field = models.DecimalField(max_digits=12, decimal_places=4)
+        payable = Case(
+            When(first_work_type=WorkArrangement.WorkTypes.FullTime,
+                 then=ExpressionWrapper(hourly_rate * full_time_hours, output_field=payable_field)),
+            # The hourly rate comes first, so that the percentage is not divided by 100 as an integer.
+            When(first_work_type=WorkArrangement.WorkTypes.PartTime,
+                 then=ExpressionWrapper(hourly_rate * F('sum_percentage') * full_time_hours / Value(100),
+                                        output_field=payable_field)),
+            default=Value(Decimal(0)),
+            output_field=payable_field,
+        )
+        # The cast gives payable a numeric type on every database, so it compares correctly with filter values.
+        return self.annotate(
+            first_work_type=Subquery(work_arrangements.order_by('id').values('type')[:1]),
+            sum_percentage=Subquery(work_arrangements.order_by().values('employee')
+                                    .annotate(total=Sum('percentage')).values('total')),
+        ).annotate(payable=Cast(payable, output_field=payable_field))
 
 
 class Employee(models.Model):
@@ -13,13 +96,26 @@ class Employee(models.Model):
     """
     name = models.CharField(blank=False, null=False, max_length=settings.NAME_MAX_LEN, db_index=True)
     # The company identification number of the employee(personal number). Not to be mixed with the model's primary key.
-    employee_id = models.CharField(blank=False, null=False, max_length=settings.EMPLOYEE_ID_MAX_LEN, db_index=True)
+    # Unique among all employees, including the deleted ones which are not purged yet.
+    employee_id = models.CharField(blank=False, null=False, max_length=settings.EMPLOYEE_ID_MAX_LEN, unique=True)
     # Employee's hourly wage
     hourly_rate = models.DecimalField(max_digits=5, decimal_places=2, blank=False, null=False)
     create_date = models.DateTimeField(auto_now=False, auto_now_add=True, verbose_name="Created")
     update_date = models.DateTimeField(auto_now=True, auto_now_add=False, verbose_name="Last updated")
     # The teams that the employee is a member of.
     teams = models.ManyToManyField('Team', through='TeamEmployee')
+    # Deleted employees are hidden by the default manager until they are purged.
+    is_deleted = models.BooleanField(default=False, db_index=True)
+
+    objects = SoftDeleteManager.from_queryset(EmployeeQuerySet)()
+    all_objects = models.Manager.from_queryset(EmployeeQuerySet)()
+
+    class Meta:
+        # List views are ordered by create_date or update_date.
+        indexes = [
+            models.Index(fields=['create_date'], name='employee_create_date_idx'),
+            models.Index(fields=['update_date'], name='employee_update_date_idx'),
+        ]
 
 
 class Team(models.Model):
@@ -33,6 +129,17 @@ class Team(models.Model):
     update_date = models.DateTimeField(auto_now=True, auto_now_add=False, verbose_name="Last updated")
     # Employees who are a member of this team.
     members = models.ManyToManyField(Employee, through='TeamEmployee')
+    # Deleted teams are hidden by the default manager until they are purged.
+    is_deleted = models.BooleanField(default=False, db_index=True)
+
+    objects = SoftDeleteManager.from_queryset(SoftDeleteQuerySet)()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['create_date'], name='team_create_date_idx'),
+            models.Index(fields=['update_date'], name='team_update_date_idx'),
+        ]
 
 
 class TeamEmployee(models.Model):
@@ -43,6 +150,16 @@ class TeamEmployee(models.Model):
     team = models.ForeignKey(Team, blank=False, null=False, on_delete=models.CASCADE)
     create_date = models.DateTimeField(auto_now=False, auto_now_add=True, verbose_name="Created")
 
+    # Memberships of deleted teams and employees are hidden.
+    objects = ActiveRelationsManager('team', 'employee')
+    all_objects = models.Manager()
+
+    class Meta:
+        # Membership of an employee in a team is looked up by both columns.
+        indexes = [
+            models.Index(fields=['team', 'employee'], name='teamemployee_team_employee_idx'),
+        ]
+
 
 class WorkArrangement(models.Model):
     """
@@ -59,42 +176,305 @@ class WorkArrangement(models.Model):
     create_date = models.DateTimeField(auto_now=False, auto_now_add=True, verbose_name="Created")
     update_date = models.DateTimeField(auto_now=True, auto_now_add=False, verbose_name="Last updated")
 
+    # Work arrangements of deleted employees are hidden.
+    objects = ActiveRelationsManager('employee')
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Also serves the list filtered by employee and type in its default order (newest first).
+            models.Index(fields=['employee', 'type', 'create_date'], name='workarrangement_emp_type_idx'),
+            models.Index(fields=['create_date'], name='workarrangement_create_idx'),
+            models.Index(fields=['update_date'], name='workarrangement_update_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    Represents a heavy operation which runs in the background, outside of the request which created it.
+    Queued jobs are picked up by the workers of the run_workers command.
+    """
+
+    class Statuses(models.IntegerChoices):
+        Queued = 1
+        Running = 2
+        Succeeded = 3
+        Failed = 4
+
+    # Name of the job handler in employment.jobs
+    kind = models.CharField(blank=False, null=False, max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.IntegerField(choices=Statuses.choices, default=Statuses.Queued, null=False, blank=False)
+    # Completed percentage of the job
+    progress = models.PositiveIntegerField(default=0, validators=[MaxValueValidator(100), ])
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    # Name of the worker which runs the job
+    worker = models.CharField(blank=True, default='', max_length=100)
+    create_date = models.DateTimeField(auto_now=False, auto_now_add=True, verbose_name="Created")
+    update_date = models.DateTimeField(auto_now=True, auto_now_add=False, verbose_name="Last updated")
+    start_date = models.DateTimeField(null=True, blank=True, verbose_name="Started")
+    finish_date = models.DateTimeField(null=True, blank=True, verbose_name="Finished")
+
+    class Meta:
+        # Workers look for the oldest queued job.
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+
+class Change(models.Model):
+    """
+    An entry of the append-only change log of employees, teams, memberships and work arrangements.
+    The primary key is the sequence number which consumers of the change feed continue from.
+    """
+
+    class Actions(models.IntegerChoices):
+        Create = 1
+        Update = 2
+        Delete = 3
+
+    # One of CHANGE_ENTITIES
+    entity = models.CharField(blank=False, null=False, max_length=30)
+    object_id = models.BigIntegerField(null=False)
+    action = models.IntegerField(choices=Actions.choices, null=False, blank=False)
+    # Ids of the objects which the changed object references, e.g. the team and the employee of a membership.
+    data = models.JSONField(default=dict, blank=True)
+    create_date = models.DateTimeField(auto_now=False, auto_now_add=True, verbose_name="Created")
+
+    class Meta:
+        # The feed is read by sequence number, optionally for some entities only.
+        indexes = [
+            models.Index(fields=['entity', 'id'], name='change_entity_id_idx'),
+        ]
+
 
 class Salary(object):
     """
     Takes an employee as a parameter in the constructor and then calculates the salary of
     the employee and stores it in self.payable variable automatically.
+    The leader flag and the work arrangements of the employee can be passed to the constructor when they are
+    already loaded. Salary.for_employees loads them for many employees at once.
     """
     employee = models.ForeignKey(Employee, blank=False, null=False, on_delete=models.CASCADE)
-    payable = 0
+    payable = None
+    # Number of employees whose teams and work arrangements are loaded in one query by for_employees.
+    batch_size = 500
 
-    def calculate_payable(self):
+    @staticmethod
+    def compute_payable(hourly_rate, is_leader, work_arrangements):
         """
-        calculates the salary of the employee based on his work arrangements.
+        Calculates a salary from the hourly rate, the leader flag and the (type, percentage) pairs of the
+        work arrangements of an employee ordered by their id.
         """
         full_time_hours = Decimal(settings.FULL_TIME_HOURS)
         leader_coefficient = Decimal(settings.LEADER_COEFFICIENT)
 
-        is_leader = any(team.leader == self.employee for team in self.employee.teams.all())
-        hourly_rate = Decimal(self.employee.hourly_rate)
+        hourly_rate = Decimal(hourly_rate)
         # If an employee is a leader in any group, his hourly wage should be multiplied to a coefficient.
         if is_leader:
             hourly_rate = leader_coefficient * hourly_rate
 
-        work_arrangements = WorkArrangement.objects.filter(employee=self.employee).all()
-        if work_arrangements.count() > 0:
+        if len(work_arrangements) > 0:
             # If the employee has a full time work arrangement, he has no other work arrangements.
-            if work_arrangements.first().type == WorkArrangement.WorkTypes.FullTime:
-                self.payable = full_time_hours * hourly_rate
+            if work_arrangements[0][0] == WorkArrangement.WorkTypes.FullTime:
+                return full_time_hours * hourly_rate
             else:
                 # If the employee has a part time work arrangement, he may have other work arrangements too.
-                sum_percentage = work_arrangements.aggregate(Sum('percentage'))['percentage__sum']
-                self.payable = Decimal(sum_percentage / 100) * full_time_hours * hourly_rate
+                sum_percentage = sum(percentage for _, percentage in work_arrangements if percentage is not None)
+                return Decimal(sum_percentage / 100) * full_time_hours * hourly_rate
+        return 0
+
+    def calculate_payable(self):
+        """
+        calculates the salary of the employee based on his work arrangements.
+        """
+        if self.payable is not None:
+            return
+        if self.is_leader is None:
+            self.is_leader = any(team.leader_id == self.employee.id for team in self.employee.teams.all())
+        if self.work_arrangements is None:
+            self.work_arrangements = list(WorkArrangement.objects.filter(employee=self.employee).order_by('id')
+                                          .values_list('type', 'percentage'))
+        self.payable = self.compute_payable(self.employee.hourly_rate, self.is_leader, self.work_arrangements)
 
-    def __init__(self, employee, *args, **kwargs):
+    def __init__(self, employee, is_leader=None, work_arrangements=None, payable=None, *args, **kwargs):
         self.employee = employee
+        # Salaries which are already calculated (e.g. by EmployeeQuerySet.with_payable) are not calculated again.
+        self.payable = payable
+        self.is_leader = is_leader
+        self.work_arrangements = work_arrangements
         self.calculate_payable()
 
+    @classmethod
+    def for_employees(cls, employees):
+        """
+        Calculates the salaries of many employees. The leader flags and the work arrangements are loaded with one
+        query each per batch_size employees, instead of several queries per employee.
+        """
+        employees = list(employees)
+        salaries = []
+        for start in range(0, len(employees), cls.batch_size):
+            batch = employees[start:start + cls.batch_size]
+            ids = [employee.id for employee in batch]
+            leader_ids = set(TeamEmployee.objects.filter(employee_id__in=ids, team__leader_id=F('employee_id'))
+                             .values_list('employee_id', flat=True))
+            work_arrangements = defaultdict(list)
+            for employee_id, work_type, percentage in WorkArrangement.objects.filter(employee_id__in=ids)\
+                    .order_by('id').values_list('employee_id', 'type', 'percentage'):
+                work_arrangements[employee_id].append((work_type, percentage))
+            salaries.extend(cls(employee, is_leader=employee.id in leader_ids,
+                                work_arrangements=work_arrangements[employee.id]) for employee in batch)
+        return salaries
+
+
+# Entity names of the models in the change log, and the references which are logged with their changes.
+CHANGE_ENTITIES = {
+    Employee: ('employee', ()),
+    Team: ('team', ('leader_id',)),
+    TeamEmployee: ('team_employee', ('team_id', 'employee_id')),
+    WorkArrangement: ('work_arrangement', ('employee_id',)),
+}
+BULK_CHANGE_ACTIONS = {'create': Change.Actions.Create, 'update': Change.Actions.Update,
+                       'delete': Change.Actions.Delete}
+
+
+def change_data(instance, references):
+    return {reference[:-3]: getattr(instance, reference) for reference in references}
+
+
+def log_changes(model, pks, action):
+    """
+    Logs the same action for many objects of a model, with one query to read their references.
+    """
+    entity, references = CHANGE_ENTITIES[model]
+    changes = []
+    for start in range(0, len(pks), settings.CHANGE_LOG_BATCH_SIZE):
+        batch = pks[start:start + settings.CHANGE_LOG_BATCH_SIZE]
+        if references:
+            rows = model.all_objects.filter(pk__in=batch).values('pk', *references)
+            changes.extend(Change(entity=entity, object_id=row['pk'], action=action,
+                                  data={reference[:-3]: row[reference] for reference in references}) for row in rows)
+        else:
+            changes.extend(Change(entity=entity, object_id=pk, action=action) for pk in batch)
+    Change.objects.bulk_create(changes, batch_size=settings.CHANGE_LOG_BATCH_SIZE)
+
+
+# Age in seconds of the oldest running transaction of another connection which has written rows, by database
+OLDEST_WRITE_SQL = {
+    'mysql': 'SELECT TIMESTAMPDIFF(SECOND, MIN(trx_started), NOW()) FROM information_schema.innodb_trx '
+             'WHERE trx_mysql_thread_id <> CONNECTION_ID() AND trx_rows_modified > 0',
+    'postgresql': 'SELECT EXTRACT(EPOCH FROM clock_timestamp() - MIN(xact_start)) FROM pg_stat_activity '
+                  'WHERE pid <> pg_backend_pid() AND backend_xid IS NOT NULL',
+}
+
+
+def oldest_write_age():
+    """
+    Returns the age in seconds of the oldest running transaction of another connection which has written rows,
+    0 if there is none, or None if the database does not tell.
+    """
+    if connection.vendor == 'sqlite':
+        # SQLite runs one writing transaction at a time, so no other one runs while a change is read.
+        return 0
+    if connection.vendor not in OLDEST_WRITE_SQL:
+        return None
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(OLDEST_WRITE_SQL[connection.vendor])
+            age = cursor.fetchone()[0]
+    except DatabaseError:
+        # e.g. a MySQL user without the PROCESS privilege, which is needed to read information_schema.innodb_trx
+        return None
+    return float(age or 0)
+
+
+def settle_cutoff():
+    """
+    Returns the time from which a logged change may be preceded by a change which is not committed yet.
+
+    A change is inserted by a transaction which started before the change got its sequence number, so a missing
+    sequence number which is followed by a change logged before the oldest running writing transaction started
+    belongs to a transaction which has ended, and which was rolled back. The changes of a long transaction, e.g. a
+    batch of requests, are waited for as long as it runs. If the database does not report its transactions, a
+    missing sequence number is waited for settings.CHANGE_LOG_GAP_TIMEOUT seconds.
+    """
+    age = oldest_write_age()
+    if age is None:
+        age = settings.CHANGE_LOG_GAP_TIMEOUT
+    return timezone.now() - timedelta(seconds=age + settings.CHANGE_LOG_SETTLE_TIME)
+
+
+def settled_sequence(since):
+    """
+    Returns the sequence number up to which the change log can be read after since, and whether there are more
+    changes after it which can be read at once. Looks at settings.CHANGE_FEED_MAX_LIMIT changes at most.
+
+    Sequence numbers are given out when a change is inserted, but a change is only seen when its transaction
+    commits, so a change can appear below the sequence number which a consumer has already passed. The log is
+    read up to the first missing sequence number which may still be committed (settle_cutoff).
+    """
+    cutoff = settle_cutoff()
+    rows = list(Change.objects.filter(id__gt=since).order_by('id').values_list('id', 'create_date')
+                [:settings.CHANGE_FEED_MAX_LIMIT])
+    position = since
+    for seq, create_date in rows:
+        if seq != position + 1 and create_date >= cutoff:
+            return position, False
+        position = seq
+    return position, len(rows) == settings.CHANGE_FEED_MAX_LIMIT
+
+
+def settled_start():
+    """
+    Returns the sequence number from which a new consumer follows the change log: the last change below which no
+    change can be committed later (settle_cutoff).
+    """
+    cutoff = settle_cutoff()
+    return Change.objects.filter(create_date__lt=cutoff).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+@receiver(post_save)
+def log_save(sender, instance, created, raw, **kwargs):
+    """
+    Logs every saved employee, team, membership and work arrangement in the change log.
+    Connected before the other receivers, so that an object is logged before the changes which its save causes.
+    """
+    if sender not in CHANGE_ENTITIES or raw:
+        return
+    entity, references = CHANGE_ENTITIES[sender]
+    Change.objects.create(entity=entity, object_id=instance.pk, data=change_data(instance, references),
+                          action=Change.Actions.Create if created else Change.Actions.Update)
+
+
+@receiver(post_delete)
+def log_delete(sender, instance, **kwargs):
+    if sender not in CHANGE_ENTITIES:
+        return
+    entity, references = CHANGE_ENTITIES[sender]
+    Change.objects.create(entity=entity, object_id=instance.pk, data=change_data(instance, references),
+                          action=Change.Actions.Delete)
+
+
+@receiver(bulk_changed)
+def log_bulk_change(sender, pks, action, **kwargs):
+    """
+    Logs the rows changed by set based operations. Soft deleting teams or employees also hides their memberships
+    and work arrangements, so those are logged as deleted too.
+    """
+    if sender not in CHANGE_ENTITIES:
+        return
+    log_changes(sender, list(pks), BULK_CHANGE_ACTIONS[action])
+    if action == 'delete' and sender in (Employee, Team):
+        # Memberships which were already hidden by the deletion of the other side are not logged twice.
+        relation, other = ('employee', 'team') if sender is Employee else ('team', 'employee')
+        hidden = TeamEmployee.all_objects.filter(**{f'{relation}__in': pks, f'{other}__is_deleted': False}) \
+            .values_list('pk', flat=True)
+        log_changes(TeamEmployee, list(hidden), Change.Actions.Delete)
+        if sender is Employee:
+            hidden = WorkArrangement.all_objects.filter(employee__in=pks).values_list('pk', flat=True)
+            log_changes(WorkArrangement, list(hidden), Change.Actions.Delete)
+
 
 @receiver(post_save, sender=Team)
 def add_leader_to_team(sender, instance, **kwargs):
@@ -0,0 +1,45 @@
+from django.db import connection, transaction
+from django.db.models import Q
+from .models import Employee, Team, TeamEmployee, WorkArrangement
+
+
+def delete_rows(model, pks):
+    """
+    Deletes rows by primary key with one raw DELETE, without loading them or collecting the rows which
+    reference them. Returns the number of deleted rows.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(pks))})', pks)
+        return cursor.rowcount
+
+
+def purge_rows(queryset, batch_size):
+    """
+    Deletes the rows of a queryset in batches of batch_size rows, each one in its own short transaction.
+    Returns the number of deleted rows.
+    """
+    deleted = 0
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            deleted += delete_rows(queryset.model, pks)
+
+
+def purge_deleted(batch_size=1000):
+    """
+    Removes the soft deleted teams and employees and the rows which reference them.
+    Rows which reference a deleted row are removed first, so no foreign key is violated.
+    Returns the number of deleted rows per model.
+    """
+    return {
+        'team_employees': purge_rows(
+            TeamEmployee.all_objects.filter(Q(team__is_deleted=True) | Q(employee__is_deleted=True)), batch_size),
+        'work_arrangements': purge_rows(WorkArrangement.all_objects.filter(employee__is_deleted=True), batch_size),
+        'teams': purge_rows(Team.all_objects.filter(is_deleted=True), batch_size),
+        # Deleted employees can not lead a team, but skip any leader of a team so the purge never fails.
+        'employees': purge_rows(Employee.all_objects.filter(is_deleted=True, team_leader_employee=None), batch_size),
+    }
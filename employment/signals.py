@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent after rows are changed by a set based operation which does not send post_save or post_delete for each row
+# (QuerySet.update, bulk_create, bulk_update, ...), so that caches and other derived data can be updated in bulk.
+# Arguments: sender (the model class), pks (primary keys of the changed rows) and action ('create', 'update' or
+# 'delete').
+bulk_changed = Signal()
@@ -0,0 +1,213 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from threading import Lock
+from time import monotonic
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from .models import Employee, TeamEmployee, WorkArrangement, Salary
+
+MAGIC = b'EMPSNAP\x00'
+VERSION = 1
+# Magic, version, byte order of the arrays (b'<' or b'>'), creation time and number of sections.
+HEADER = struct.Struct('<8sIcxxxqI')
+# Offset and number of items of a section.
+SECTION = struct.Struct('<QQ')
+# The arrays of the snapshot, in file order. Employee arrays are ordered by employee id. Memberships are stored
+# twice, ordered by team (team_ids, team_members) and by employee (member_ids, member_teams).
+SECTIONS = (
+    ('employee_ids', 'q'),
+    ('create_dates', 'q'),
+    # Hourly rates in cents
+    ('hourly_rates', 'i'),
+    ('leader_flags', 'B'),
+    # Type of the first work arrangement, 0 if the employee has none
+    ('work_types', 'B'),
+    # Sum of the work arrangement percentages
+    ('percentages', 'H'),
+    # Start of the name and the employee id of every employee in strings, plus the end of the last one
+    ('name_offsets', 'I'),
+    ('employee_id_offsets', 'I'),
+    ('strings', 'B'),
+    ('team_ids', 'q'),
+    ('team_members', 'q'),
+    ('member_ids', 'q'),
+    ('member_teams', 'q'),
+)
+BYTE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+
+def write_snapshot(path):
+    """
+    Exports the employees, their memberships, leader flags and work arrangements to a snapshot file.
+    The file is written next to the old one and then replaced in one step, so readers never see a partial file.
+    Returns the number of employees and memberships.
+    """
+    arrays = {name: array(typecode) for name, typecode in SECTIONS}
+    strings = bytearray()
+    with transaction.atomic():
+        # One transaction, so that all the tables are read at the same point in time.
+        leader_ids = set(TeamEmployee.objects.filter(team__leader_id=F('employee_id'))
+                         .values_list('employee_id', flat=True))
+        work_arrangements = {}
+        for employee_id, work_type, percentage in WorkArrangement.objects.order_by('employee_id', 'id') \
+                .values_list('employee_id', 'type', 'percentage'):
+            first_type, total = work_arrangements.get(employee_id, (work_type, 0))
+            work_arrangements[employee_id] = (first_type, total + (percentage or 0))
+        memberships = list(TeamEmployee.objects.values_list('team_id', 'employee_id'))
+        employees = Employee.objects.order_by('id').values_list('id', 'create_date', 'name', 'employee_id',
+                                                                'hourly_rate')
+        for employee_id, create_date, name, code, hourly_rate in employees.iterator(chunk_size=2000):
+            work_type, percentage = work_arrangements.get(employee_id, (0, 0))
+            arrays['employee_ids'].append(employee_id)
+            arrays['create_dates'].append(int(create_date.timestamp()))
+            arrays['hourly_rates'].append(int(hourly_rate * 100))
+            arrays['leader_flags'].append(employee_id in leader_ids)
+            arrays['work_types'].append(work_type)
+            arrays['percentages'].append(percentage)
+            arrays['name_offsets'].append(len(strings))
+            strings += name.encode()
+            arrays['employee_id_offsets'].append(len(strings))
+            strings += code.encode()
+    arrays['name_offsets'].append(len(strings))
+    arrays['employee_id_offsets'].append(len(strings))
+    # Names and employee ids are stored one after the other, so the end of a name is the start of its employee id
+    # and the end of an employee id is the start of the next name.
+    arrays['strings'] = array('B', strings)
+    for team_id, employee_id in sorted(memberships):
+        arrays['team_ids'].append(team_id)
+        arrays['team_members'].append(employee_id)
+    for team_id, employee_id in sorted(memberships, key=lambda membership: (membership[1], membership[0])):
+        arrays['member_ids'].append(employee_id)
+        arrays['member_teams'].append(team_id)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        offset = HEADER.size + SECTION.size * len(SECTIONS)
+        table = []
+        for name, typecode in SECTIONS:
+            # Every array starts at a multiple of 8 bytes.
+            offset += -offset % 8
+            table.append((offset, len(arrays[name])))
+            offset += len(arrays[name]) * arrays[name].itemsize
+        snapshot_file.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, int(datetime.now().timestamp()), len(SECTIONS)))
+        for section in table:
+            snapshot_file.write(SECTION.pack(*section))
+        for (name, typecode), (section_offset, count) in zip(SECTIONS, table):
+            snapshot_file.write(b'\x00' * (section_offset - snapshot_file.tell()))
+            arrays[name].tofile(snapshot_file)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_path, path)
+    return {'employees': len(arrays['employee_ids']), 'memberships': len(memberships)}
+
+
+class Snapshot(object):
+    """
+    Read-only view of a snapshot file. The file is memory mapped and its arrays are used in place, so processes
+    which map the same file share its pages and a lookup does not copy the arrays.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, byte_order, created, section_count = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION or section_count != len(SECTIONS):
+            raise ValueError(f'{path} is not a version {VERSION} snapshot.')
+        if byte_order != BYTE_ORDER:
+            raise ValueError(f'{path} was written on a machine with another byte order.')
+        self.created = created
+        for index, (name, typecode) in enumerate(SECTIONS):
+            offset, count = SECTION.unpack_from(view, HEADER.size + SECTION.size * index)
+            item_size = array(typecode).itemsize
+            setattr(self, name, view[offset:offset + count * item_size].cast(typecode))
+
+    def __len__(self):
+        return len(self.employee_ids)
+
+    def index(self, employee_id):
+        """
+        Returns the position of an employee in the employee arrays, or None if the employee is not in the snapshot.
+        """
+        position = bisect_left(self.employee_ids, employee_id)
+        if position < len(self.employee_ids) and self.employee_ids[position] == employee_id:
+            return position
+        return None
+
+    def salary(self, employee_id):
+        """
+        Returns the salary of an employee, calculated like SalaryAPIView does, or None if the employee does not exist.
+        """
+        position = self.index(employee_id)
+        if position is None:
+            return None
+        names, codes = self.name_offsets, self.employee_id_offsets
+        employee = Employee(
+            id=employee_id,
+            create_date=datetime.fromtimestamp(self.create_dates[position], dt_timezone.utc),
+            name=bytes(self.strings[names[position]:codes[position]]).decode(),
+            employee_id=bytes(self.strings[codes[position]:names[position + 1]]).decode(),
+            hourly_rate=Decimal(self.hourly_rates[position]).scaleb(-2),
+        )
+        work_type = self.work_types[position]
+        work_arrangements = [(work_type, self.percentages[position])] if work_type else []
+        return Salary(employee, is_leader=bool(self.leader_flags[position]), work_arrangements=work_arrangements)
+
+    def members(self, team_id):
+        """
+        Returns the ids of the members of a team.
+        """
+        return self.team_members[bisect_left(self.team_ids, team_id):bisect_right(self.team_ids, team_id)].tolist()
+
+    def teams(self, employee_id):
+        """
+        Returns the ids of the teams of an employee.
+        """
+        return self.member_teams[bisect_left(self.member_ids, employee_id):
+                                 bisect_right(self.member_ids, employee_id)].tolist()
+
+
+class SnapshotLoader(object):
+    """
+    Keeps the snapshot at settings.SNAPSHOT_PATH mapped, and maps the new file when the snapshot is replaced.
+    The file is checked at most once every settings.SNAPSHOT_CHECK_INTERVAL seconds.
+    Requests which still use the old snapshot keep it mapped until they are finished.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+        self._file_key = None
+        self._checked = None
+
+    def get(self):
+        """
+        Returns the current snapshot, or None if there is no snapshot file.
+        """
+        now = monotonic()
+        if self._checked is not None and now - self._checked < settings.SNAPSHOT_CHECK_INTERVAL:
+            return self._snapshot
+        with self._lock:
+            path = str(settings.SNAPSHOT_PATH)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._snapshot, self._file_key = None, None
+            else:
+                file_key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if file_key != self._file_key:
+                    self._snapshot, self._file_key = Snapshot(path), file_key
+            self._checked = now
+            return self._snapshot
+
+
+snapshots = SnapshotLoader()
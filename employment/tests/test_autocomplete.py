@@ -0,0 +1,69 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from employment.autocomplete import autocomplete_index
+from employment.models import Employee, Change
+
+
+@override_settings(INDEX_SYNC_INTERVAL=3600)
+class EmployeeAutocompleteTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        autocomplete_index.reset()
+        self.addCleanup(autocomplete_index.reset)
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        self.employee_jenny = Employee.objects.create(name='Jenny Smith', employee_id='A2345B', hourly_rate=18.6)
+        self.url = reverse("employment-api:employee_autocomplete")
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [employee['id'] for employee in response.data]
+
+    def test_autocomplete(self):
+        response = self.client.get(self.url, {'q': 'ja'})
+        self.assertEqual(response.data, [{'id': self.employee_jane.id, 'name': 'Jane Doe', 'employee_id': '12345B'}])
+        self.assertEqual(self.search(q='J'), [self.employee_jane.id, self.employee_jenny.id, self.employee_john.id])
+        # Later words of the name and employee ids are matched too.
+        self.assertEqual(self.search(q='doe'), [self.employee_john.id, self.employee_jane.id])
+        self.assertEqual(self.search(q='a23'), [self.employee_jenny.id])
+        self.assertEqual(self.search(q='1234', limit=1), [self.employee_john.id])
+        self.assertEqual(self.search(q='x'), [])
+
+    def test_autocomplete_without_queries(self):
+        self.search(q='j')
+        with self.assertNumQueries(0):
+            self.search(q='jo')
+
+    def test_autocomplete_follows_changes(self):
+        self.search(q='j')
+        self.employee_jenny.name = 'Jenna Smith'
+        self.employee_jenny.save()
+        employee_jim = Employee.objects.create(name='Jim Doe', employee_id='A2345C', hourly_rate=12.1)
+        self.employee_john.delete()
+        self.assertEqual(self.search(q='j'), [self.employee_jane.id, self.employee_jenny.id, employee_jim.id])
+        self.assertEqual(self.search(q='jenny'), [])
+        Employee.objects.filter(id=employee_jim.id).soft_delete()
+        self.assertEqual(self.search(q='doe'), [self.employee_jane.id])
+
+    def test_autocomplete_change_committed_out_of_order(self):
+        self.search(q='j')
+        since = Change.objects.order_by('id').last().id
+        # Jim is committed with since + 2 while the rename of Jenny with since + 1 is not committed yet.
+        employee_jim = Employee.objects.create(name='Jim Doe', employee_id='A2345C', hourly_rate=12.1)
+        Change.objects.filter(id=since + 1).update(id=since + 2)
+        self.assertEqual(self.search(q='jim'), [])
+        Employee.objects.filter(id=self.employee_jenny.id).update(name='Jenna Smith')
+        Change.objects.create(id=since + 1, entity='employee', object_id=self.employee_jenny.id,
+                              action=Change.Actions.Update)
+        autocomplete_index.dirty = True
+        self.assertEqual(self.search(q='j'), [self.employee_jane.id, self.employee_jenny.id, employee_jim.id,
+                                              self.employee_john.id])
+        self.assertEqual(self.search(q='jenny'), [])
+
+    def test_autocomplete_invalid(self):
+        for params in [{}, {'q': ' '}, {'q': 'j', 'limit': 0}, {'q': 'j', 'limit': 'a'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from employment.models import Employee, Team, WorkArrangement
+
+
+class BatchSetup(object):
+    def setUp(self):
+        super().setUp()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        WorkArrangement.objects.create(employee=self.employee_jane, type=WorkArrangement.WorkTypes.FullTime)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.url = reverse("employment-api:batch")
+
+
+class BatchTests(BatchSetup, APITestCase):
+    def test_batch(self):
+        """
+        The responses are returned in the order of the requests. Writes are seen by the following requests.
+        """
+        team_url = reverse("employment-api:team_retrieve_update_destroy", kwargs={'pk': self.team_backend.id})
+        response = self.client.post(self.url, {'requests': [
+            {'url': team_url},
+            {'method': 'POST', 'url': reverse("employment-api:team_employee_list_create"),
+             'body': {'team': self.team_backend.id, 'employee': self.employee_jane.id}},
+            {'url': f"{reverse('employment-api:salary_list')}?employee={self.employee_jane.id}"},
+            {'url': f"{reverse('employment-api:team_employee_list_create')}?team={self.team_backend.id}"},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        responses = response.data['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 201, 200, 200])
+        self.assertEqual(responses[0]['body']['name'], self.team_backend.name)
+        self.assertEqual(responses[0]['body']['member_count'], 1)
+        self.assertEqual(responses[2]['body']['payable'], '452.00')
+        self.assertEqual(len(responses[3]['body']), 2)
+
+    def test_batch_errors(self):
+        """
+        Failed requests do not stop the batch.
+        """
+        response = self.client.post(self.url, {'requests': [
+            {'url': reverse("employment-api:employee_retrieve_update_destroy", kwargs={'pk': 1000})},
+            {'method': 'POST', 'url': reverse("employment-api:employee_list_create"), 'body': {'name': 'No id'}},
+            {'url': '/admin/'},
+            {'url': self.url},
+            {'url': reverse("employment-api:employee_list_create")},
+        ]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [404, 400, 404, 404, 200])
+        self.assertIn('employee_id', response.data['responses'][1]['body'])
+
+    @override_settings(THROTTLE_SCOPES={'employee_bulk_delete': 'bulk'},
+                       THROTTLE_RATES={'default': (100, 20, 50), 'bulk': (10, 0.2, 0)})
+    def test_batch_concurrency_limit(self):
+        """
+        A request is rejected when its route already runs as many requests as its scope allows (none here).
+        """
+        cache.clear()
+        self.addCleanup(cache.clear)
+        response = self.client.post(self.url, {'requests': [
+            {'method': 'POST', 'url': reverse("employment-api:employee_bulk_delete"),
+             'body': {'ids': [self.employee_jane.id]}},
+            {'url': reverse("employment-api:employee_list_create")},
+        ]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [429, 200])
+        self.assertTrue(Employee.objects.filter(id=self.employee_jane.id).exists())
+        self.assertEqual(cache.get('throttle:running:employee_bulk_delete'), 0)
+
+    def test_invalid_batch(self):
+        response = self.client.post(self.url, {'requests': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'parallel': True, 'requests': [
+            {'method': 'DELETE', 'url': reverse("employment-api:employee_retrieve_update_destroy", kwargs={'pk': 1})},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Employee.objects.filter(id=1).exists())
+
+
+class ParallelBatchTests(BatchSetup, TransactionTestCase):
+    """
+    Parallel requests use their own connections, so the data has to be committed.
+    """
+
+    def test_parallel_batch(self):
+        urls = [reverse("employment-api:employee_retrieve_update_destroy", kwargs={'pk': employee.id})
+                for employee in (self.employee_john, self.employee_jane)]
+        response = APIClient().post(self.url, {'parallel': True, 'requests': [{'url': url} for url in urls]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['body']['name'] for item in response.data['responses']], ['John Doe', 'Jane Doe'])
@@ -0,0 +1,144 @@
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from employment.models import Employee, Team, TeamEmployee, WorkArrangement, Change
+
+
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.url = reverse("employment-api:change_list")
+        self.since = Change.objects.order_by('id').last().id
+
+    def changes(self, response):
+        return [(change['entity'], change['object_id'], change['action']) for change in response.data['results']]
+
+    def test_get_changes(self):
+        """
+        Creating a team also logs the membership of its leader.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        membership = TeamEmployee.objects.get(team=self.team_backend)
+        self.assertEqual(self.changes(response), [
+            ('employee', self.employee_john.id, Change.Actions.Create),
+            ('employee', self.employee_jane.id, Change.Actions.Create),
+            ('team', self.team_backend.id, Change.Actions.Create),
+            ('team_employee', membership.id, Change.Actions.Create),
+        ])
+        self.assertEqual(response.data['results'][3]['data'],
+                         {'team': self.team_backend.id, 'employee': self.employee_john.id})
+        self.assertEqual(response.data['since'], self.since)
+        self.assertFalse(response.data['has_more'])
+
+    def test_get_changes_since(self):
+        self.client.patch(reverse("employment-api:employee_retrieve_update_destroy",
+                                  kwargs={'pk': self.employee_jane.id}), {'hourly_rate': 12}, format='json')
+        response = self.client.get(f'{self.url}?since={self.since}')
+        self.assertEqual(self.changes(response), [('employee', self.employee_jane.id, Change.Actions.Update)])
+
+    def test_get_changes_limit(self):
+        response = self.client.get(f'{self.url}?limit=2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(response.data['has_more'])
+        response = self.client.get(f"{self.url}?limit=2&since={response.data['since']}")
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFalse(response.data['has_more'])
+
+    def test_get_changes_of_entity(self):
+        response = self.client.get(f'{self.url}?entity=team,work_arrangement')
+        self.assertEqual(self.changes(response), [('team', self.team_backend.id, Change.Actions.Create)])
+
+    def test_get_changes_invalid_params(self):
+        response = self.client.get(f'{self.url}?entity=salary')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(f'{self.url}?limit=0')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_membership_delete(self):
+        membership = TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jane)
+        self.client.delete(reverse("employment-api:team_employee_retrieve_update_destroy",
+                                   kwargs={'pk': membership.id}))
+        response = self.client.get(f'{self.url}?since={self.since}&entity=team_employee')
+        self.assertEqual(self.changes(response), [('team_employee', membership.id, Change.Actions.Create),
+                                                  ('team_employee', membership.id, Change.Actions.Delete)])
+        self.assertEqual(response.data['results'][1]['data'],
+                         {'team': self.team_backend.id, 'employee': self.employee_jane.id})
+
+    def test_soft_delete(self):
+        """
+        Soft deleting an employee also logs the deletion of the memberships and work arrangements it hides.
+        """
+        membership = TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jane)
+        work_arrangement = WorkArrangement.objects.create(employee=self.employee_jane,
+                                                          type=WorkArrangement.WorkTypes.FullTime)
+        since = Change.objects.order_by('id').last().id
+        self.client.delete(reverse("employment-api:employee_retrieve_update_destroy",
+                                   kwargs={'pk': self.employee_jane.id}))
+        response = self.client.get(f'{self.url}?since={since}')
+        self.assertEqual(self.changes(response), [
+            ('employee', self.employee_jane.id, Change.Actions.Delete),
+            ('team_employee', membership.id, Change.Actions.Delete),
+            ('work_arrangement', work_arrangement.id, Change.Actions.Delete),
+        ])
+
+    def test_bulk_update(self):
+        self.client.post(reverse("employment-api:employee_hourly_rate"), {'percentage': 10, 'all': True}, format='json')
+        response = self.client.get(f'{self.url}?since={self.since}')
+        self.assertEqual(sorted(self.changes(response)), [
+            ('employee', self.employee_john.id, Change.Actions.Update),
+            ('employee', self.employee_jane.id, Change.Actions.Update),
+        ])
+
+    def test_changes_committed_out_of_order(self):
+        """
+        The feed stops before a missing sequence number while a later change is recent, since the missing change
+        may still be committed.
+        """
+        # The change of Jane is committed first, while the one of John with a lower sequence number is not yet.
+        Change.objects.create(id=self.since + 2, entity='employee', object_id=self.employee_jane.id,
+                              action=Change.Actions.Update)
+        response = self.client.get(f'{self.url}?since={self.since}')
+        self.assertEqual(self.changes(response), [])
+        self.assertEqual(response.data['since'], self.since)
+        self.assertFalse(response.data['has_more'])
+        Change.objects.create(id=self.since + 1, entity='employee', object_id=self.employee_john.id,
+                              action=Change.Actions.Update)
+        response = self.client.get(f'{self.url}?since={self.since}')
+        self.assertEqual(self.changes(response), [('employee', self.employee_john.id, Change.Actions.Update),
+                                                  ('employee', self.employee_jane.id, Change.Actions.Update)])
+        self.assertEqual(response.data['since'], self.since + 2)
+
+    def test_changes_after_rolled_back_change(self):
+        """
+        A missing sequence number is skipped once no writing transaction which started before the change after it
+        still runs.
+        """
+        change = Change.objects.create(id=self.since + 2, entity='employee', object_id=self.employee_jane.id,
+                                       action=Change.Actions.Update)
+        Change.objects.filter(id=change.id).update(
+            create_date=timezone.now() - timedelta(seconds=settings.CHANGE_LOG_SETTLE_TIME))
+        response = self.client.get(f'{self.url}?since={self.since}&entity=team')
+        self.assertEqual(self.changes(response), [])
+        # The changes of other entities are skipped too.
+        self.assertEqual(response.data['since'], change.id)
+
+    def test_changes_of_long_transaction(self):
+        """
+        A missing sequence number is not skipped while a writing transaction which may commit it still runs, or
+        for CHANGE_LOG_GAP_TIMEOUT seconds if the database does not tell.
+        """
+        change = Change.objects.create(id=self.since + 2, entity='employee', object_id=self.employee_jane.id,
+                                       action=Change.Actions.Update)
+        Change.objects.filter(id=change.id).update(create_date=timezone.now() - timedelta(seconds=60))
+        for age, since in [(120, self.since), (None, self.since), (30, change.id)]:
+            with mock.patch('employment.models.oldest_write_age', return_value=age):
+                response = self.client.get(f'{self.url}?since={self.since}')
+            self.assertEqual(response.data['since'], since)
@@ -0,0 +1,42 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from employment.models import Employee, Team, TeamEmployee, WorkArrangement
+
+
+class AuditIndexesTests(TestCase):
+    def test_audit_indexes(self):
+        """
+        Every audited query is explained and reported on its own line.
+        """
+        out = StringIO()
+        call_command('audit_indexes', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 20)
+        self.assertTrue(lines[0].startswith('EmployeeListCreateAPIView: '))
+        self.assertIn('add_leader_to_team: OK', lines)
+
+
+class PurgeDeletedTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        WorkArrangement.objects.create(employee=self.employee_jane, type=WorkArrangement.WorkTypes.FullTime)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_jane)
+        self.team_frontend = Team.objects.create(name='Front end', leader=self.employee_john)
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_john)
+
+    def test_purge_deleted(self):
+        """
+        Deleted rows and the rows referencing them are removed. Other rows are kept.
+        """
+        Team.objects.filter(id=self.team_backend.id).soft_delete()
+        Employee.objects.filter(id=self.employee_jane.id).soft_delete()
+        out = StringIO()
+        call_command('purge_deleted', batch_size=1, stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), ['team_employees: 2 deleted', 'work_arrangements: 1 deleted',
+                                                       'teams: 1 deleted', 'employees: 1 deleted'])
+        self.assertEqual(list(Employee.all_objects.all()), [self.employee_john])
+        self.assertEqual(list(Team.all_objects.all()), [self.team_frontend])
+        self.assertEqual(TeamEmployee.all_objects.count(), 1)
@@ -1,8 +1,13 @@
 from rest_framework.test import APITestCase
+from django.db import DatabaseError, connection
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from employment.api.serializers import EmployeeSerializer
-from employment.models import Employee
+from employment.models import Employee, Team, TeamEmployee, Change
+from employment.signals import bulk_changed
+from employment.codes import employee_codes
+from decimal import Decimal
 
 
 class EmployeeCreateUpdateSetup(APITestCase):
@@ -112,6 +117,16 @@ class EmployeeCreateTests(EmployeeCreateUpdateSetup):
         response = self.client.post(self.url, self.invalid_payload_hourly_rate_too_many_digits, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_invalid_employee_employee_id_taken(self):
+        """
+        Employee ids of deleted employees stay taken until the employees are purged.
+        """
+        employee = Employee.objects.create(name='Jane Doe', employee_id='a1234b', hourly_rate=11.3)
+        Employee.objects.filter(pk=employee.pk).soft_delete()
+        response = self.client.post(self.url, self.valid_payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('employee_id', response.data)
+
 
 class EmployeeUpdateTests(EmployeeCreateUpdateSetup):
     def setUp(self):
@@ -129,6 +144,19 @@ class EmployeeUpdateTests(EmployeeCreateUpdateSetup):
         response = self.client.put(self.url, self.invalid_payload_name_empty, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_update_can_not_delete_or_restore_employee(self):
+        """
+        Employees are only deleted with DELETE, which checks that they lead no team and hides their memberships.
+        """
+        response = self.client.patch(self.url, {'is_deleted': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_deleted'])
+        self.assertFalse(Employee.all_objects.get(pk=self.employee.pk).is_deleted)
+        Employee.objects.filter(pk=self.employee.pk).soft_delete()
+        response = self.client.patch(self.url, {'is_deleted': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Employee.all_objects.get(pk=self.employee.pk).is_deleted)
+
     def test_update_invalid_employee_employee_id_empty(self):
         response = self.client.put(self.url, self.invalid_payload_employee_id_empty, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -167,6 +195,89 @@ class EmployeeListTests(EmployeeListGetDeleteSetup):
         self.assertEqual(response.data["results"], serializer.data)
 
 
+class EmployeeSparseFieldsetTests(EmployeeListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("employment-api:employee_list_create")
+
+    def test_get_employees_selected_fields(self):
+        """
+        Only the selected columns are fetched and the teams are not prefetched. (One count and one select query)
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.url}?fields=id,name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0], {'id': self.employee_jenny.id, 'name': self.employee_jenny.name})
+
+    def test_get_single_employee_omit_fields(self):
+        url = reverse("employment-api:employee_retrieve_update_destroy", kwargs={'pk': self.employee_jane.pk})
+        response = self.client.get(f'{url}?omit=teams,hourly_rate')
+        serializer = EmployeeSerializer(self.employee_jane, omit=['teams', 'hourly_rate'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, serializer.data)
+        self.assertNotIn('teams', response.data)
+
+    def test_get_employees_unknown_field(self):
+        response = self.client.get(f'{self.url}?fields=id,salary')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EmployeeHourlyRateTests(EmployeeListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.url = reverse("employment-api:employee_hourly_rate")
+
+    def test_raise_team_hourly_rate_by_percentage(self):
+        changed = []
+
+        def handler(sender, pks, action, **kwargs):
+            changed.append((sender, sorted(pks), action))
+        bulk_changed.connect(handler)
+        self.addCleanup(bulk_changed.disconnect, handler)
+        update_date = self.employee_john.update_date
+
+        response = self.client.post(self.url, {'team': self.team_backend.id, 'percentage': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': 1})
+        self.employee_john.refresh_from_db()
+        self.assertEqual(self.employee_john.hourly_rate, Decimal('19.03'))
+        self.assertGreater(self.employee_john.update_date, update_date)
+        self.assertEqual(Employee.objects.get(id=self.employee_jane.id).hourly_rate, Decimal('11.30'))
+        self.assertEqual(changed, [(Employee, [self.employee_john.id], 'update')])
+
+    def test_change_filtered_hourly_rate_by_amount(self):
+        response = self.client.post(f'{self.url}?name=j', {'employees': [self.employee_jane.id, self.employee_jenny.id],
+                                                           'amount': '-1.30'}, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(Employee.objects.get(id=self.employee_jane.id).hourly_rate, Decimal('10.00'))
+        self.assertEqual(Employee.objects.get(id=self.employee_jenny.id).hourly_rate, Decimal('17.30'))
+
+    def test_change_hourly_rate_too_many_digits(self):
+        """
+        The change is rejected for everyone if a single rate would not fit in the hourly_rate column.
+        """
+        response = self.client.post(self.url, {'amount': '990.00', 'all': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Employee.objects.get(id=self.employee_jane.id).hourly_rate, Decimal('11.30'))
+
+    def test_change_hourly_rate_percentage_and_amount(self):
+        response = self.client.post(self.url, {'percentage': 5, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_hourly_rate_without_filter(self):
+        """
+        Every rate is only changed when all is set.
+        """
+        for url in [self.url, f'{self.url}?name=']:
+            response = self.client.post(url, {'amount': 1}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Employee.objects.get(id=self.employee_jane.id).hourly_rate, Decimal('11.30'))
+        response = self.client.post(self.url, {'amount': 1, 'all': True}, format='json')
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(Employee.objects.get(id=self.employee_jane.id).hourly_rate, Decimal('12.30'))
+
+
 class EmployeeGetTests(EmployeeListGetDeleteSetup):
     def setUp(self):
         super().setUp()
@@ -196,8 +307,242 @@ class EmployeeDeleteTests(EmployeeListGetDeleteSetup):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertIsNone(employee)
 
+    def test_delete_valid_employee_is_soft_deleted(self):
+        self.client.delete(self.url)
+        self.assertTrue(Employee.all_objects.get(id=self.employee_jane.pk).is_deleted)
+        response = self.client.get(reverse("employment-api:employee_list_create"))
+        self.assertEqual(response.data["count"], 2)
+
+    def test_soft_delete_logged_in_its_transaction(self):
+        """
+        The rows are not marked as deleted when logging their changes fails.
+        """
+        def handler(sender, pks, action, **kwargs):
+            raise DatabaseError('Change log is not available.')
+        bulk_changed.connect(handler, sender=Employee)
+        self.addCleanup(bulk_changed.disconnect, handler, sender=Employee)
+        with self.assertRaises(DatabaseError):
+            Employee.objects.filter(pk=self.employee_jane.pk).soft_delete()
+        self.assertFalse(Employee.all_objects.get(id=self.employee_jane.pk).is_deleted)
+
+    def test_delete_invalid_team_leader(self):
+        Team.objects.create(name='Back end', leader=self.employee_jane)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Employee.all_objects.get(id=self.employee_jane.pk).is_deleted)
+
+    def test_bulk_delete_employees(self):
+        response = self.client.post(reverse("employment-api:employee_bulk_delete"),
+                                    {'ids': [self.employee_jane.pk, self.employee_jenny.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(list(Employee.objects.all()), [self.employee_john])
+
+    def test_bulk_delete_invalid_team_leader(self):
+        Team.objects.create(name='Back end', leader=self.employee_jenny)
+        response = self.client.post(reverse("employment-api:employee_bulk_delete"),
+                                    {'ids': [self.employee_jane.pk, self.employee_jenny.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Employee.objects.count(), 3)
+
     def test_delete_invalid_employee(self):
         response = self.client.delete(
             reverse("employment-api:employee_retrieve_update_destroy", kwargs={'pk': 1000000})
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EmployeeNormalizedFormatTests(EmployeeListGetDeleteSetup):
+    def test_get_employees_normalized(self):
+        """
+        Teams are returned once in the teams map and referred to by id.
+        """
+        team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        TeamEmployee.objects.create(team=team_backend, employee=self.employee_jane)
+        response = self.client.get(f'{reverse("employment-api:employee_list_create")}?format=normalized')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        teams = {employee['id']: employee['teams'] for employee in data['results']}
+        self.assertEqual(teams, {self.employee_john.id: [team_backend.id], self.employee_jane.id: [team_backend.id],
+                                 self.employee_jenny.id: []})
+        create_date = int(team_backend.create_date.timestamp())
+        self.assertEqual(data['teams'], {str(team_backend.id): {'id': team_backend.id, 'name': 'Back end',
+                                                                'create_date': create_date}})
+
+
+class EmployeeColumnarFormatTests(EmployeeListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("employment-api:employee_list_create")
+
+    def test_get_employees_columnar(self):
+        response = self.client.get(f'{self.url}?format=columnar&ordering=create_date')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['columns'], ['id', 'create_date', 'update_date', 'name', 'employee_id', 'hourly_rate'])
+        self.assertNotIn('results', data)
+        rows = EmployeeSerializer(Employee.objects.order_by('create_date'), many=True).data
+        for column in data['columns']:
+            self.assertEqual(data['data'][column], [row[column] for row in rows])
+
+    def test_get_employees_columnar_selected_fields(self):
+        """
+        Only the selected columns are read, without the teams. (One count and one select query)
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.url}?format=columnar&fields=id,name&page_size=2&name=Doe')
+        data = response.json()
+        self.assertEqual(list(data['data']), ['id', 'name'])
+        self.assertEqual(len(data['data']['id']), 2)
+        self.assertIsNotNone(data['next'])
+
+    def test_get_employees_columnar_unknown_field(self):
+        response = self.client.get(f'{self.url}?format=columnar&fields=teams')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(INDEX_SYNC_INTERVAL=3600)
+class EmployeeByCodeTests(EmployeeListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        employee_codes.reset()
+        self.addCleanup(employee_codes.reset)
+
+    def test_get_employee_by_code(self):
+        url = reverse("employment-api:employee_by_code", kwargs={'code': '12345B'})
+        # The position in the change log is read on first use, then the employee with its teams.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, EmployeeSerializer(self.employee_jane).data)
+        # The serialized employee is cached.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, response.data)
+
+    def test_get_employees_by_code(self):
+        response = self.client.get(reverse("employment-api:employee_by_code_list"), {'employee_id': 'A2345B,123456'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([employee['id'] for employee in response.data],
+                         [self.employee_jenny.id, self.employee_john.id])
+        response = self.client.get(reverse("employment-api:employee_by_code_list"), {'employee_id': '123456,X1'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("employment-api:employee_by_code_list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_employee_by_code_after_change(self):
+        url = reverse("employment-api:employee_by_code", kwargs={'code': '12345B'})
+        self.client.get(url)
+        self.employee_jane.employee_id = '12345C'
+        self.employee_jane.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("employment-api:employee_by_code", kwargs={'code': '12345C'}))
+        self.assertEqual(response.data['id'], self.employee_jane.id)
+        Employee.objects.filter(pk=self.employee_jane.pk).soft_delete()
+        response = self.client.get(reverse("employment-api:employee_by_code", kwargs={'code': '12345C'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_employee_by_code_after_team_change(self):
+        url = reverse("employment-api:employee_by_code", kwargs={'code': '123456'})
+        self.client.get(url)
+        team = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.assertEqual([team['name'] for team in self.client.get(url).data['teams']], ['Back end'])
+        team.name = 'Front end'
+        team.save()
+        self.assertEqual([team['name'] for team in self.client.get(url).data['teams']], ['Front end'])
+
+    def test_change_of_another_process(self):
+        """
+        Changes whose signals did not reach this process are read from the change log.
+        """
+        url = reverse("employment-api:employee_by_code", kwargs={'code': '12345B'})
+        self.client.get(url)
+        Employee.objects.filter(pk=self.employee_jane.pk).update(hourly_rate=12)
+        Change.objects.create(entity='employee', object_id=self.employee_jane.pk, action=Change.Actions.Update)
+        with override_settings(INDEX_SYNC_INTERVAL=0):
+            self.assertEqual(self.client.get(url).data['hourly_rate'], '12.00')
+
+    def test_code_cache_is_bounded(self):
+        with self.settings(EMPLOYEE_CODE_CACHE_SIZE=2):
+            employee_codes.lookup(['123456', '12345B'])
+            employee_codes.lookup(['123456'])
+            employee_codes.lookup(['A2345B'])
+        self.assertEqual(list(employee_codes.employees), ['123456', 'A2345B'])
+
+
+class EmployeeSyncTests(EmployeeListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("employment-api:employee_sync")
+        self.employees = [
+            {'name': 'John Doe', 'employee_id': '123456', 'hourly_rate': '17.30'},
+            {'name': 'Jane Doe', 'employee_id': '12345B', 'hourly_rate': '11.30'},
+        ]
+
+    def test_sync_without_changes(self):
+        """
+        A sync which changes nothing reads the employees once and writes nothing.
+        """
+        update_date = Employee.objects.get(pk=self.employee_john.pk).update_date
+        # The read and the savepoint of the transaction which runs inside the transaction of the test
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, {'employees': self.employees}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'created': 0, 'updated': 0, 'unchanged': 2})
+        self.assertEqual(Employee.objects.get(pk=self.employee_john.pk).update_date, update_date)
+
+    def test_sync_creates_and_updates(self):
+        signals = []
+
+        def receiver(sender, pks, action, **kwargs):
+            signals.append((action, sorted(pks)))
+        bulk_changed.connect(receiver, sender=Employee)
+        self.addCleanup(bulk_changed.disconnect, receiver, sender=Employee)
+        self.employees[0]['hourly_rate'] = '18.00'
+        self.employees[1]['name'] = 'Jane Smith'
+        self.employees.append({'name': 'Jim Doe', 'employee_id': 'A2345C', 'hourly_rate': '12.10'})
+        response = self.client.post(self.url, {'employees': self.employees, 'report_missing': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'created': 1, 'updated': 2, 'unchanged': 0, 'missing': ['A2345B'],
+                                         'missing_count': 1})
+        self.assertEqual(Employee.objects.get(pk=self.employee_john.pk).hourly_rate, Decimal('18.00'))
+        self.assertEqual(Employee.objects.get(pk=self.employee_jane.pk).name, 'Jane Smith')
+        employee_jim = Employee.objects.get(employee_id='A2345C')
+        self.assertEqual(signals, [('create', [employee_jim.pk]),
+                                   ('update', sorted([self.employee_john.pk, self.employee_jane.pk]))])
+
+    @override_settings(EMPLOYEE_SYNC_MAX_MISSING=1)
+    def test_sync_report_missing_is_bounded(self):
+        response = self.client.post(self.url, {'employees': self.employees[:1], 'report_missing': True}, format='json')
+        self.assertEqual(response.data['missing'], ['12345B'])
+        self.assertEqual(response.data['missing_count'], 2)
+
+    def test_sync_concurrent_create(self):
+        """
+        An employee which another request creates between the read and the insert of the sync makes it fail
+        with 409, without any of its changes.
+        """
+        self.employees[0]['hourly_rate'] = '18.00'
+        self.employees.append({'name': 'Jim Doe', 'employee_id': 'A2345C', 'hourly_rate': '12.10'})
+        inserted = []
+
+        def create_first(execute, sql, params, many, context):
+            if not inserted and sql.startswith('INSERT') and Employee._meta.db_table in sql:
+                inserted.append(True)
+                Employee.objects.create(name='Jim Smith', employee_id='A2345C', hourly_rate=10)
+            return execute(sql, params, many, context)
+        with connection.execute_wrapper(create_first):
+            response = self.client.post(self.url, {'employees': self.employees}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Employee.objects.get(pk=self.employee_john.pk).hourly_rate, Decimal('17.30'))
+
+    def test_sync_invalid(self):
+        response = self.client.post(self.url, {'employees': self.employees + self.employees[:1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'employees': [{'name': 'Jim-Doe', 'employee_id': 'A2345C',
+                                                             'hourly_rate': '12.10'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        Employee.objects.filter(pk=self.employee_jane.pk).soft_delete()
+        response = self.client.post(self.url, {'employees': self.employees}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Employee.all_objects.get(pk=self.employee_john.pk).hourly_rate, Decimal('17.30'))
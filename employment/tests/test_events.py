@@ -0,0 +1,135 @@
+import asyncio
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase, override_settings
+from employment.api import events
+from employment.api.events import events_application, load_events
+from employment.models import Employee, Team, Change
+
+
+class EventStream(object):
+    """
+    Runs the events application for one client and collects what it sends.
+    """
+
+    def __init__(self, query_string='', headers=()):
+        self.scope = {'type': 'http', 'method': 'GET', 'path': '/api/events/',
+                      'query_string': query_string.encode(), 'headers': list(headers)}
+        self.messages = []
+        self.disconnect = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    def start(self):
+        self.task = asyncio.ensure_future(events_application(self.scope, self.receive, self.send))
+
+    async def stop(self):
+        self.disconnect.set()
+        await self.task
+
+    @property
+    def body(self):
+        return b''.join(message.get('body', b'') for message in self.messages).decode()
+
+    async def wait_for(self, text, timeout=2):
+        for _ in range(int(timeout / 0.01)):
+            if text in self.body:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError(f'{text!r} not in {self.body!r}')
+
+
+@override_settings(EVENTS_POLL_INTERVAL=0.01)
+class EventStreamTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+
+    def test_invalid_entity(self):
+        async def scenario():
+            stream = EventStream('entity=salaries')
+            stream.start()
+            await stream.task
+            return stream
+        stream = async_to_sync(scenario)()
+        self.assertEqual(stream.messages[0]['status'], 400)
+
+    def test_push_changes(self):
+        """
+        Changes made after the client connects are pushed to it, with the salaries they change.
+        """
+        async def scenario():
+            stream = EventStream()
+            stream.start()
+            await stream.wait_for('retry: 3000')
+            # Lets the poller read the position of the change log before the changes are made.
+            await asyncio.sleep(0.05)
+            team = await sync_to_async(Team.objects.create)(name='Back end', leader=self.employee_john)
+            await stream.wait_for('event: salary')
+            await stream.stop()
+            return stream, team
+        stream, team = async_to_sync(scenario)()
+        self.assertEqual(stream.messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), stream.messages[0]['headers'])
+        self.assertIn('event: team\ndata: {"id": ', stream.body)
+        self.assertIn(f'"object_id": {team.id}', stream.body)
+        self.assertIn('event: team_employee', stream.body)
+        self.assertNotIn('event: employee\n', stream.body)
+        self.assertIn('"payable": "0.00"', stream.body)
+
+    def test_filter_and_replay(self):
+        """
+        A reconnecting client receives the changes it missed, only of the entities and ids it asked for.
+        """
+        since = Change.objects.order_by('id').last().id
+        employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        self.employee_john.save()
+
+        async def scenario():
+            stream = EventStream(f'entity=employee&id={employee_jane.id}', [(b'last-event-id', str(since).encode())])
+            stream.start()
+            await stream.wait_for(f'"object_id": {employee_jane.id}')
+            await stream.stop()
+            return stream
+        stream = async_to_sync(scenario)()
+        self.assertEqual(stream.body.count('event: '), 1)
+        self.assertIn(f'id: {since + 1}\nevent: employee\n', stream.body)
+
+    def test_leader_change_sends_both_salaries(self):
+        """
+        Changing the leader of a team sends the salaries of the new and of the previous leader.
+        """
+        employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        team = Team.objects.create(name='Back end', leader=self.employee_john)
+        since = Change.objects.order_by('id').last().id
+        team.leader = employee_jane
+        team.save()
+        events, position, more = load_events(since, True)
+        salaries = {event.object_id for event in events if event.entity == 'salary'}
+        self.assertEqual(salaries, {self.employee_john.id, employee_jane.id})
+
+    def test_poller_survives_failed_read(self):
+        """
+        A failed read of the change log is retried, the connected clients still receive the later changes.
+        """
+        start_position = events.start_position
+
+        async def scenario():
+            stream = EventStream()
+            stream.start()
+            await stream.wait_for('retry: 3000')
+            await asyncio.sleep(0.05)
+            team = await sync_to_async(Team.objects.create)(name='Back end', leader=self.employee_john)
+            await stream.wait_for(f'"object_id": {team.id}')
+            await stream.stop()
+            return stream
+        failures = [Exception('Lost connection'), start_position()]
+        with mock.patch('employment.api.events.start_position', side_effect=failures):
+            with self.assertLogs('employment.api.events', 'ERROR'):
+                stream = async_to_sync(scenario)()
+        self.assertIn('event: team\n', stream.body)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from employment.jobs import claim_job, report_progress, run_job
+from employment.models import Employee, Job
+
+
+class JobTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.url = reverse("employment-api:job_create")
+
+    def test_create_job(self):
+        """
+        The job is queued and returned without being run.
+        """
+        response = self.client.post(self.url, {'kind': 'salary_export'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Job.Statuses.Queued)
+        self.assertIsNone(response.data['result'])
+        self.assertEqual(Job.objects.get(id=response.data['id']).kind, 'salary_export')
+
+    def test_create_job_invalid_kind(self):
+        response = self.client.post(self.url, {'kind': 'unknown'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('kind', response.data)
+
+    def test_run_salary_export(self):
+        job_id = self.client.post(self.url, {'kind': 'salary_export'}, format='json').data['id']
+        call_command('run_workers', threads=1, once=True)
+        response = self.client.get(reverse("employment-api:job_retrieve", kwargs={'pk': job_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Job.Statuses.Succeeded)
+        self.assertEqual(response.data['progress'], 100)
+        self.assertEqual([salary['employee']['id'] for salary in response.data['result']], [self.employee_john.id])
+        self.assertIsNotNone(response.data['finish_date'])
+
+    def test_run_employee_import(self):
+        employees = [{'name': 'Jane Doe', 'employee_id': '12345B', 'hourly_rate': 11.3},
+                     {'name': 'No rate', 'employee_id': '12345C'}]
+        job_id = self.client.post(self.url, {'kind': 'employee_import', 'params': {'employees': employees}},
+                                  format='json').data['id']
+        call_command('run_workers', threads=1, once=True)
+        job = Job.objects.get(id=job_id)
+        self.assertEqual(job.status, Job.Statuses.Succeeded)
+        self.assertEqual(job.result['created'], 1)
+        self.assertEqual(list(job.result['errors']), ['1'])
+        self.assertTrue(Employee.objects.filter(employee_id='12345B').exists())
+
+    def test_failed_job(self):
+        job = Job.objects.create(kind='employee_import', params={'employees': None})
+        call_command('run_workers', threads=1, once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Statuses.Failed)
+        self.assertIn('Traceback', job.error)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_stale_running_job(self):
+        """
+        A running job without progress for JOB_TIMEOUT seconds is failed, a job with recent progress is left running.
+        """
+        stale = Job.objects.create(kind='salary_export', status=Job.Statuses.Running, worker='killed:0')
+        running = Job.objects.create(kind='salary_export', status=Job.Statuses.Running, worker='alive:0')
+        Job.objects.filter(id=stale.id).update(update_date=timezone.now() - timedelta(seconds=61))
+        report_progress(running, 50)
+        call_command('run_workers', threads=1, once=True)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.Statuses.Failed)
+        self.assertIn('60 seconds', stale.error)
+        self.assertIsNotNone(stale.finish_date)
+        self.assertEqual(Job.objects.get(id=running.id).status, Job.Statuses.Running)
+
+    def test_timed_out_job_outcome_dropped(self):
+        """
+        A worker which finishes a job after it was failed for timing out does not overwrite the failure.
+        """
+        Job.objects.create(kind='salary_export')
+        job = claim_job('slow:0')
+        Job.objects.filter(id=job.id).update(status=Job.Statuses.Failed, error='Timed out')
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Statuses.Failed)
+        self.assertIsNone(job.result)
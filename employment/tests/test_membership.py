@@ -0,0 +1,123 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from employment.membership import membership_index
+from employment.models import Employee, Team, TeamEmployee
+
+
+@override_settings(INDEX_SYNC_INTERVAL=3600)
+class MembershipQueryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        membership_index.reset()
+        self.addCleanup(membership_index.reset)
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        self.employee_jenny = Employee.objects.create(name='Jenny Doe', employee_id='A2345B', hourly_rate=18.6)
+        # Leaders are members of their teams.
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.team_frontend = Team.objects.create(name='Front end', leader=self.employee_jane)
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jane)
+        TeamEmployee.objects.create(team=self.team_frontend, employee=self.employee_jenny)
+        self.url = reverse("employment-api:membership_query")
+
+    def query(self, **params):
+        response = self.client.get(self.url, {name: ','.join(map(str, ids)) for name, ids in params.items()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_employees_of_teams(self):
+        backend, frontend = self.team_backend.id, self.team_frontend.id
+        self.assertEqual(self.query(teams=[backend, frontend]), {'count': 1, 'employees': [self.employee_jane.id]})
+        self.assertEqual(self.query(any_teams=[backend, frontend])['employees'],
+                         [self.employee_john.id, self.employee_jane.id, self.employee_jenny.id])
+        self.assertEqual(self.query(teams=[backend], not_teams=[frontend])['employees'], [self.employee_john.id])
+
+    def test_teams_shared_by_employees(self):
+        self.assertEqual(self.query(employees=[self.employee_jane.id])['teams'],
+                         [self.team_backend.id, self.team_frontend.id])
+        self.assertEqual(self.query(employees=[self.employee_john.id, self.employee_jenny.id])['teams'], [])
+        self.assertEqual(self.query(any_employees=[self.employee_jenny.id], not_employees=[self.employee_john.id]),
+                         {'count': 1, 'teams': [self.team_frontend.id]})
+
+    def test_index_follows_changes(self):
+        backend = self.team_backend.id
+        self.assertEqual(self.query(teams=[backend])['employees'], [self.employee_john.id, self.employee_jane.id])
+        membership = TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jenny)
+        self.assertEqual(self.query(teams=[backend])['employees'],
+                         [self.employee_john.id, self.employee_jane.id, self.employee_jenny.id])
+        membership.delete()
+        self.assertEqual(self.query(teams=[backend])['employees'], [self.employee_john.id, self.employee_jane.id])
+        # Soft deleting an employee hides the memberships.
+        self.employee_jenny.delete()
+        self.assertEqual(self.query(any_teams=[backend, self.team_frontend.id])['employees'],
+                         [self.employee_john.id, self.employee_jane.id])
+
+    def test_index_follows_other_processes_after_sync_interval(self):
+        self.query(teams=[self.team_backend.id])
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jenny)
+        # Changes made by another process do not mark the index.
+        membership_index.dirty = False
+        self.assertNotIn(self.employee_jenny.id, self.query(teams=[self.team_backend.id])['employees'])
+        with override_settings(INDEX_SYNC_INTERVAL=0):
+            self.assertIn(self.employee_jenny.id, self.query(teams=[self.team_backend.id])['employees'])
+
+    def test_invalid_queries(self):
+        for params in [{}, {'teams': '1', 'employees': '1'}, {'not_teams': '1'}, {'teams': 'a'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(INDEX_SYNC_INTERVAL=3600)
+class EmployeeColleaguesTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        membership_index.reset()
+        self.addCleanup(membership_index.reset)
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        self.employee_jenny = Employee.objects.create(name='Jenny Doe', employee_id='A2345B', hourly_rate=18.6)
+        self.employee_dan = Employee.objects.create(name='Dan Doe', employee_id='A2345C', hourly_rate=12.1)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.team_frontend = Team.objects.create(name='Front end', leader=self.employee_jane)
+        self.team_ops = Team.objects.create(name='Ops', leader=self.employee_dan)
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jane)
+        TeamEmployee.objects.create(team=self.team_frontend, employee=self.employee_jenny)
+        TeamEmployee.objects.create(team=self.team_ops, employee=self.employee_jenny)
+
+    def get_colleagues(self, employee, **params):
+        return self.client.get(reverse("employment-api:employee_colleagues", kwargs={'pk': employee.id}), params)
+
+    def test_colleagues(self):
+        response = self.get_colleagues(self.employee_john)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'employee': self.employee_john.id, 'depth': 1,
+                                         'teams': [self.team_backend.id], 'leaders': [self.employee_john.id],
+                                         'count': 1, 'colleagues': [{'id': self.employee_jane.id, 'distance': 1}]})
+
+    def test_colleagues_by_depth(self):
+        response = self.get_colleagues(self.employee_john, depth=3)
+        self.assertEqual(response.data['colleagues'], [{'id': self.employee_jane.id, 'distance': 1},
+                                                       {'id': self.employee_jenny.id, 'distance': 2},
+                                                       {'id': self.employee_dan.id, 'distance': 3}])
+        response = self.get_colleagues(self.employee_jenny, depth=2)
+        self.assertEqual(response.data['leaders'], [self.employee_jane.id, self.employee_dan.id])
+        self.assertEqual([colleague['distance'] for colleague in response.data['colleagues']], [1, 1, 2])
+
+    def test_colleagues_follow_changes(self):
+        self.get_colleagues(self.employee_john)
+        self.team_backend.leader = self.employee_jane
+        self.team_backend.save()
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_dan)
+        response = self.get_colleagues(self.employee_john)
+        self.assertEqual(response.data['leaders'], [self.employee_jane.id])
+        self.assertEqual([colleague['id'] for colleague in response.data['colleagues']],
+                         [self.employee_jane.id, self.employee_dan.id])
+
+    def test_colleagues_invalid(self):
+        self.assertEqual(self.get_colleagues(self.employee_john, depth=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_colleagues(self.employee_john, depth='a').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("employment-api:employee_colleagues", kwargs={'pk': 1000}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+from rest_framework.test import APITestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from employment.api.metrics import registry
+from employment.models import Employee, Team
+
+
+class ServerTimingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("employment-api:team_list_create"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        phases = [entry.strip().split(';')[0] for entry in response['Server-Timing'].split(',')]
+        self.assertEqual(phases, ['db', 'total', 'serialize', 'render'])
+        self.assertRegex(response['Server-Timing'], r'db;dur=[0-9.]+;desc="[1-9][0-9]* queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("employment-api:team_list_create"))
+        response = self.client.get(reverse("employment-api:metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('employment_api_request_phase_seconds_bucket{method="GET",route="api/teams/",phase="db",'
+                      'le="+Inf"} 1', body)
+        self.assertIn('employment_api_request_db_queries_count{method="GET",route="api/teams/"} 1', body)
+        # The metrics endpoint does not measure itself.
+        self.assertNotIn('_metrics', body)
+
+
+class SamplingProfilerTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.url = reverse("employment-api:salary_list")
+
+    def test_request_not_profiled_without_token(self):
+        with override_settings(PROFILER_TOKEN='secret', PROFILER_OUTPUT_DIR=self.directory.name):
+            response = self.client.get(self.url, HTTP_X_PROFILE='wrong')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_profiled_requests_keep_slowest_index(self):
+        """
+        Only the slowest PROFILER_SLOWEST_COUNT profiles are kept on disk and in the index.
+        """
+        with override_settings(PROFILER_TOKEN='secret', PROFILER_OUTPUT_DIR=self.directory.name,
+                               PROFILER_INTERVAL=0.001, PROFILER_SLOWEST_COUNT=1):
+            first = self.client.get(self.url, HTTP_X_PROFILE='secret')
+            second = self.client.get(self.url, HTTP_X_PROFILE='secret')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with open(os.path.join(self.directory.name, 'slowest.json')) as index_file:
+            index = json.load(index_file)
+        self.assertEqual(len(index), 1)
+        self.assertIn(index[0]['profile'], [first['X-Profile-Id'], second['X-Profile-Id']])
+        self.assertEqual(sorted(os.listdir(self.directory.name)), sorted(['slowest.json', index[0]['profile']]))
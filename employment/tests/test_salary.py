@@ -2,7 +2,7 @@ from rest_framework.test import APITestCase
 from django.urls import reverse
 from rest_framework import status
 from employment.api.serializers import SalarySerializer
-from employment.models import Employee, WorkArrangement, Salary
+from employment.models import Employee, Team, WorkArrangement, Salary
 
 
 class SalaryListGetSetup(APITestCase):
@@ -35,7 +35,50 @@ class SalaryListTests(SalaryListGetSetup):
         salaries = [Salary(employee=employee) for employee in employees]
         serializer = SalarySerializer(salaries, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
+
+    def test_get_all_salaries_of_leaders(self):
+        """
+        Salaries calculated by the database are the same as the ones calculated by Salary.
+        """
+        Team.objects.create(name='Back end', leader=self.employee_john)
+        Team.objects.create(name='Front end', leader=self.employee_jane)
+        response = self.client.get(self.url)
+        serializer = SalarySerializer([Salary(employee=self.employee_john), Salary(employee=self.employee_jane)],
+                                      many=True)
+        self.assertEqual(response.data["results"], serializer.data)
+
+    def test_get_top_salaries(self):
+        """
+        Salaries are filtered, ordered and paginated with one count and one select query.
+        """
+        employee_jenny = Employee.objects.create(name='Jenny Doe', employee_id='A2345B', hourly_rate=18.6)
+        WorkArrangement.objects.create(employee=employee_jenny, type=WorkArrangement.WorkTypes.PartTime,
+                                       percentage=90)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.url}?min_payable=300&ordering=-payable&page_size=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["results"], SalarySerializer([Salary(employee=self.employee_john)],
+                                                                    many=True).data)
+
+    def test_get_salaries_columnar(self):
+        """
+        Columns have the same values as the salary rows.
+        """
+        Team.objects.create(name='Back end', leader=self.employee_john)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.url}?format=columnar&ordering=-payable')
+        data = response.json()
+        self.assertEqual(data['columns'], ['employee', 'name', 'employee_id', 'payable'])
+        salaries = SalarySerializer([Salary(employee=self.employee_john), Salary(employee=self.employee_jane)],
+                                    many=True).data
+        self.assertEqual(data['data'], {
+            'employee': [salary['employee']['id'] for salary in salaries],
+            'name': [salary['employee']['name'] for salary in salaries],
+            'employee_id': [salary['employee']['employee_id'] for salary in salaries],
+            'payable': [salary['payable'] for salary in salaries],
+        })
 
 
 class SalaryGetTests(SalaryListGetSetup):
@@ -59,3 +102,55 @@ class SalaryGetTests(SalaryListGetSetup):
         """
         response = self.client.get(f'{reverse("employment-api:salary_list")}?employee=1000000')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_leader_flag_without_leader_queries(self):
+        """
+        Leaders are recognized by the leader ids of the teams, without loading the leaders.
+        """
+        Team.objects.create(name='Back end', leader=self.employee_john)
+        employee = Employee.objects.get(pk=self.employee_john.pk)
+        # Teams of the employee and work arrangements
+        with self.assertNumQueries(2):
+            self.assertTrue(Salary(employee).is_leader)
+
+
+class SalaryLookupTests(SalaryListGetSetup):
+    def setUp(self):
+        super().setUp()
+        self.employee_jenny = Employee.objects.create(name='Jenny Doe', employee_id='A2345B', hourly_rate=18.6)
+        WorkArrangement.objects.create(employee=self.employee_jenny, type=WorkArrangement.WorkTypes.PartTime,
+                                       percentage=30)
+        WorkArrangement.objects.create(employee=self.employee_jenny, type=WorkArrangement.WorkTypes.PartTime,
+                                       percentage=50)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.url = reverse("employment-api:salary_list")
+
+    def test_get_multiple_employee_salaries(self):
+        """
+        Salaries are returned in the requested order with the same values as single salaries.
+        One query loads the employees, one the leader flags and one the work arrangements.
+        """
+        employees = [self.employee_jenny, self.employee_john, self.employee_jane]
+        with self.assertNumQueries(3):
+            response = self.client.get(f'{self.url}?employee={",".join(str(employee.pk) for employee in employees)}')
+        serializer = SalarySerializer([Salary(employee=employee) for employee in employees], many=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, serializer.data)
+
+    def test_post_employee_salaries(self):
+        response = self.client.post(self.url, {'employees': [self.employee_jane.pk, self.employee_john.pk]},
+                                    format='json')
+        serializer = SalarySerializer([Salary(employee=self.employee_jane), Salary(employee=self.employee_john)],
+                                      many=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, serializer.data)
+
+    def test_get_multiple_employee_salaries_not_found(self):
+        response = self.client.get(f'{self.url}?employee={self.employee_john.pk},1000000')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_post_employee_salaries_invalid(self):
+        response = self.client.post(self.url, {'employees': ['john']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, [self.employee_john.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,91 @@
+from threading import Event, Thread
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.urls import reverse
+from employment.api.middleware import SingleFlightMiddleware
+
+
+class SlowView(object):
+    """
+    Stands in for the rest of the middleware chain and the view. Blocks until it is released.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.started = Event()
+        self.release = Event()
+
+    def __call__(self, request):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        response = HttpResponse(f'{request.path} {self.calls}', content_type='application/json')
+        response['Server-Timing'] = 'total;dur=1'
+        return response
+
+
+@override_settings(SINGLE_FLIGHT_TIMEOUT=5, SINGLE_FLIGHT_POLL_INTERVAL=0.01)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.url = reverse("employment-api:salary_list")
+
+    def run_concurrently(self, middlewares, requests, view):
+        responses = [None] * len(requests)
+
+        def run(index):
+            responses[index] = middlewares[index](requests[index])
+        threads = [Thread(target=run, args=(0,))]
+        threads[0].start()
+        view.started.wait(5)
+        threads.extend(Thread(target=run, args=(index,)) for index in range(1, len(requests)))
+        for thread in threads[1:]:
+            thread.start()
+        # Gives the followers time to start waiting for the leader.
+        threads[1].join(0.1)
+        view.release.set()
+        for thread in threads:
+            thread.join(5)
+        return responses
+
+    def test_identical_requests_share_response(self):
+        """
+        Requests with the same parameters in another order wait for the first one and get a copy of its response.
+        """
+        view = SlowView()
+        middleware = SingleFlightMiddleware(view)
+        requests = [self.factory.get(f'{self.url}?ordering=-payable&min_payable=10'),
+                    self.factory.get(f'{self.url}?min_payable=10&ordering=-payable'),
+                    self.factory.get(f'{self.url}?min_payable=10&ordering=-payable&page=')]
+        responses = self.run_concurrently([middleware] * 3, requests, view)
+        self.assertEqual(view.calls, 1)
+        self.assertEqual([response.content for response in responses], [f'{self.url} 1'.encode()] * 3)
+        self.assertEqual(responses[1]['Content-Type'], 'application/json')
+        self.assertEqual(responses[1]['X-Single-Flight'], 'shared')
+        self.assertNotIn('Server-Timing', responses[1])
+        self.assertIn('Server-Timing', responses[0])
+
+    def test_different_requests_not_shared(self):
+        view = SlowView()
+        view.release.set()
+        middleware = SingleFlightMiddleware(view)
+        middleware(self.factory.get(f'{self.url}?ordering=-payable'))
+        middleware(self.factory.get(f'{self.url}?ordering=payable'))
+        middleware(self.factory.get(reverse("employment-api:employee_list_create")))
+        self.assertEqual(view.calls, 3)
+
+    @override_settings(SINGLE_FLIGHT_CACHE='default')
+    def test_requests_shared_across_processes(self):
+        """
+        Middlewares of different processes share the response through the cache.
+        """
+        cache.clear()
+        view = SlowView()
+        middlewares = [SingleFlightMiddleware(view), SingleFlightMiddleware(view)]
+        requests = [self.factory.get(self.url), self.factory.get(self.url)]
+        responses = self.run_concurrently(middlewares, requests, view)
+        self.assertEqual(view.calls, 1)
+        self.assertEqual(responses[1].content, responses[0].content)
+        self.assertEqual(responses[1]['X-Single-Flight'], 'shared')
@@ -0,0 +1,82 @@
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from employment.api.serializers import SalarySerializer
+from employment.models import Employee, Team, TeamEmployee, WorkArrangement, Salary
+
+
+class SnapshotTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.employee_jane = Employee.objects.create(name='Jane Doe', employee_id='12345B', hourly_rate=11.3)
+        self.employee_jenny = Employee.objects.create(name='Jenny Doe', employee_id='A2345B', hourly_rate=18.6)
+        WorkArrangement.objects.create(employee=self.employee_john, type=WorkArrangement.WorkTypes.FullTime)
+        WorkArrangement.objects.create(employee=self.employee_jane, type=WorkArrangement.WorkTypes.PartTime,
+                                       percentage=60)
+        WorkArrangement.objects.create(employee=self.employee_jane, type=WorkArrangement.WorkTypes.PartTime,
+                                       percentage=30)
+        self.team_backend = Team.objects.create(name='Back end', leader=self.employee_john)
+        self.team_frontend = Team.objects.create(name='Front end', leader=self.employee_jane)
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jane)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'workforce.snapshot')
+        settings_override = override_settings(SNAPSHOT_PATH=self.path, SNAPSHOT_CHECK_INTERVAL=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = reverse("employment-api:snapshot_salary_list")
+
+    def export(self):
+        out = StringIO()
+        call_command('export_snapshot', stdout=out)
+        return out.getvalue()
+
+    def test_snapshot_not_available(self):
+        response = self.client.get(f'{self.url}?employee={self.employee_john.id}')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_salaries(self):
+        """
+        Salaries from the snapshot are the same as the ones calculated from the database, without any query.
+        """
+        self.assertEqual(self.export(), '3 employees, 3 memberships exported\n')
+        employees = [self.employee_jenny, self.employee_john, self.employee_jane]
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{self.url}?employee={','.join(str(employee.id) for employee in employees)}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, SalarySerializer([Salary(employee) for employee in employees], many=True).data)
+        response = self.client.get(f'{self.url}?employee={self.employee_jane.id}')
+        self.assertEqual(response.data, SalarySerializer(Salary(self.employee_jane)).data)
+
+    def test_salaries_not_found(self):
+        self.export()
+        response = self.client.get(f'{self.url}?employee={self.employee_john.id},1000')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data, 'Employees not found: 1000.')
+
+    def test_memberships(self):
+        self.export()
+        url = reverse("employment-api:snapshot_membership_list")
+        response = self.client.get(f'{url}?team={self.team_backend.id}')
+        self.assertEqual(response.data['members'], sorted([self.employee_john.id, self.employee_jane.id]))
+        response = self.client.get(f'{url}?employee={self.employee_jane.id}')
+        self.assertEqual(response.data['teams'], sorted([self.team_backend.id, self.team_frontend.id]))
+        response = self.client.get(f'{url}?employee={self.employee_jenny.id}')
+        self.assertEqual(response.data['teams'], [])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_new_snapshot_is_swapped_in(self):
+        self.export()
+        self.client.get(f'{self.url}?employee={self.employee_jenny.id}')
+        Employee.objects.filter(id=self.employee_jenny.id).update(name='Jenny')
+        self.export()
+        response = self.client.get(f'{self.url}?employee={self.employee_jenny.id}')
+        self.assertEqual(response.data['employee']['name'], 'Jenny')
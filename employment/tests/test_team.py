@@ -2,7 +2,7 @@ from rest_framework.test import APITestCase
 from django.urls import reverse
 from rest_framework import status
 from employment.api.serializers import TeamSerializer
-from employment.models import Employee, Team
+from employment.models import Employee, Team, TeamEmployee
 
 
 class TeamCreateUpdateSetup(APITestCase):
@@ -122,6 +122,19 @@ class TeamUpdateTests(TeamCreateUpdateSetup):
         response = self.client.put(self.url, self.invalid_payload_leader_not_number, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_update_can_not_delete_or_restore_team(self):
+        """
+        Teams are only deleted with DELETE, which also hides their memberships.
+        """
+        response = self.client.patch(self.url, {'is_deleted': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_deleted'])
+        self.assertFalse(Team.all_objects.get(pk=self.team.pk).is_deleted)
+        Team.objects.filter(pk=self.team.pk).soft_delete()
+        response = self.client.patch(self.url, {'is_deleted': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Team.all_objects.get(pk=self.team.pk).is_deleted)
+
 
 class TeamListTests(TeamListGetDeleteSetup):
     def setUp(self):
@@ -129,13 +142,73 @@ class TeamListTests(TeamListGetDeleteSetup):
         self.url = reverse("employment-api:team_list_create")
 
     def test_get_all_teams(self):
+        """
+        Members are not embedded in the team list unless they are included explicitly.
+        """
         response = self.client.get(self.url)
         teams = Team.objects.all().order_by('-create_date')
+        serializer = TeamSerializer(teams, many=True, omit=['members'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], serializer.data)
+        self.assertEqual(response.data["results"][0]['member_count'], 1)
+
+    def test_get_all_teams_include_members(self):
+        response = self.client.get(f'{self.url}?include=members')
+        teams = Team.objects.all().order_by('-create_date')
         serializer = TeamSerializer(teams, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["results"], serializer.data)
 
 
+class TeamSparseFieldsetTests(TeamListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("employment-api:team_list_create")
+
+    def test_get_teams_omit_members(self):
+        """
+        Omitted members are not prefetched and the leader is joined. (One count and one select query)
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.url}?omit=members')
+        teams = Team.objects.all().order_by('-create_date')
+        serializer = TeamSerializer(teams, many=True, omit=['members'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], serializer.data)
+
+    def test_get_teams_selected_fields(self):
+        response = self.client.get(f'{self.url}?fields=id,name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0], {'id': self.team_frontend.id, 'name': self.team_frontend.name})
+
+
+class TeamMemberListTests(TeamListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        self.employee_jenny = Employee.objects.create(name='Jenny Doe', employee_id='A2345B', hourly_rate=18.6)
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jane)
+        TeamEmployee.objects.create(team=self.team_backend, employee=self.employee_jenny)
+        self.url = reverse("employment-api:team_member_list", kwargs={'pk': self.team_backend.pk})
+
+    def test_get_team_members_pages(self):
+        response = self.client.get(f'{self.url}?page_size=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([member['id'] for member in response.data["results"]],
+                         [self.employee_jenny.id, self.employee_jane.id])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([member['id'] for member in response.data["results"]], [self.employee_john.id])
+        self.assertIsNone(response.data["next"])
+
+    def test_get_team_members_filtered(self):
+        response = self.client.get(f'{self.url}?name=jenny&fields=id,name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [{'id': self.employee_jenny.id, 'name': 'Jenny Doe'}])
+
+    def test_get_invalid_team_members(self):
+        response = self.client.get(reverse("employment-api:team_member_list", kwargs={'pk': 1000000}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class TeamGetTests(TeamListGetDeleteSetup):
     def setUp(self):
         super().setUp()
@@ -165,8 +238,60 @@ class TeamDeleteTests(TeamListGetDeleteSetup):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertIsNone(team)
 
+    def test_delete_valid_team_hides_memberships(self):
+        """
+        Memberships of a deleted team are hidden until the team is purged.
+        """
+        self.client.delete(self.url)
+        self.assertTrue(Team.all_objects.get(id=self.team_backend.pk).is_deleted)
+        self.assertFalse(TeamEmployee.objects.filter(team_id=self.team_backend.pk).exists())
+        self.assertEqual(list(self.employee_john.teams.all()), [])
+
+    def test_bulk_delete_teams(self):
+        response = self.client.post(reverse("employment-api:team_bulk_delete"),
+                                    {'ids': [self.team_backend.pk, self.team_frontend.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(Team.objects.count(), 0)
+
     def test_delete_invalid_team(self):
         response = self.client.delete(
             reverse("employment-api:team_retrieve_update_destroy", kwargs={'pk': 1000000})
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TeamNormalizedFormatTests(TeamListGetDeleteSetup):
+    def setUp(self):
+        super().setUp()
+        TeamEmployee.objects.create(team=self.team_frontend, employee=self.employee_john)
+        self.url = reverse("employment-api:team_list_create")
+
+    def test_get_teams_normalized(self):
+        """
+        Members and leaders are returned once in the employees map and referred to by id.
+        """
+        response = self.client.get(f'{self.url}?format=normalized&include=members')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        teams = {team['id']: team for team in data['results']}
+        self.assertEqual(teams[self.team_frontend.id]['leader'], self.employee_jane.id)
+        self.assertEqual(sorted(teams[self.team_frontend.id]['members']),
+                         sorted([self.employee_john.id, self.employee_jane.id]))
+        self.assertEqual(teams[self.team_backend.id]['members'], [self.employee_john.id])
+        self.assertEqual(sorted(data['employees']), [str(self.employee_john.id), str(self.employee_jane.id)])
+        self.assertEqual(data['employees'][str(self.employee_john.id)]['name'], 'John Doe')
+        self.assertNotIn('teams', data)
+
+    def test_get_single_team_normalized(self):
+        url = reverse("employment-api:team_retrieve_update_destroy", kwargs={'pk': self.team_backend.pk})
+        data = self.client.get(f'{url}?format=normalized').json()
+        self.assertEqual(data['result']['leader'], self.employee_john.id)
+        self.assertEqual(list(data['employees']), [str(self.employee_john.id)])
+
+    def test_get_teams_default_format(self):
+        response = self.client.get(f'{self.url}?include=members')
+        teams = {team['id']: team for team in response.data['results']}
+        self.assertEqual(teams[self.team_backend.id]['members'][0]['name'], 'John Doe')
+        self.assertNotIn('employees', response.data)
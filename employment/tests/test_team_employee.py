@@ -1,4 +1,6 @@
 from rest_framework.test import APITestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from employment.api.serializers import TeamEmployeeSerializer
@@ -179,3 +181,16 @@ class TeamEmployeeDeleteTests(TeamEmployeeListGetDeleteSetup):
             reverse("employment-api:team_employee_retrieve_update_destroy", kwargs={'pk': team_employee.id})
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_team_employee_queries(self):
+        """
+        The membership and its team are read once: membership, team, delete and change log.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 4)
+        team_employee = TeamEmployee.objects.get(employee__employee_id=self.employee_john.employee_id)
+        with self.assertNumQueries(2):
+            self.client.delete(
+                reverse("employment-api:team_employee_retrieve_update_destroy", kwargs={'pk': team_employee.id}))
@@ -0,0 +1,87 @@
+from threading import Thread
+from django.core.cache import cache
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from employment.api.middleware import SingleFlightMiddleware, ThrottleMiddleware, route_slot
+from employment.models import Employee
+from employment.tests.test_single_flight import SlowView
+
+
+@override_settings(THROTTLE_RATES={'default': (100, 20, 50), 'salaries': (2, 0.5, 8), 'bulk': (10, 0.2, 0)})
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.employee_john = Employee.objects.create(name='John Doe', employee_id='123456', hourly_rate=17.3)
+        self.url = reverse("employment-api:salary_list")
+
+    def test_token_bucket(self):
+        """
+        A client can make capacity requests at once, then it has to wait for new tokens.
+        """
+        for _ in range(2):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '2')
+        # Other clients and other routes have their own buckets.
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse("employment-api:employee_list_create")).status_code,
+                         status.HTTP_200_OK)
+
+    @override_settings(THROTTLE_NUM_PROXIES=1)
+    def test_client_behind_proxy(self):
+        for _ in range(2):
+            self.client.get(self.url, HTTP_X_FORWARDED_FOR='10.0.0.3')
+        response = self.client.get(self.url, HTTP_X_FORWARDED_FOR='10.0.0.3')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.client.get(self.url, HTTP_X_FORWARDED_FOR='10.0.0.4').status_code, status.HTTP_200_OK)
+
+    def test_concurrency_limit(self):
+        """
+        A route rejects requests when it already runs as many as its scope allows (none here).
+        """
+        response = self.client.post(reverse("employment-api:employee_bulk_delete"), {'ids': [self.employee_john.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.json(),
+                         'Too many requests are running. Try again later.')
+        self.assertTrue(Employee.objects.filter(id=self.employee_john.id).exists())
+
+    @override_settings(THROTTLE_RATES={'default': (100, 20, 50), 'salaries': (100, 20, 1), 'bulk': (10, 0.2, 0)})
+    def test_single_flight_followers_not_limited(self):
+        """
+        Requests which wait for an identical running request do not take one of the slots of the route.
+        """
+        view = SlowView()
+        middleware = SingleFlightMiddleware(ThrottleMiddleware(view))
+        factory = RequestFactory()
+        responses = [None] * 3
+
+        def run(index):
+            responses[index] = middleware(factory.get(self.url))
+        threads = [Thread(target=run, args=(index,)) for index in range(3)]
+        threads[0].start()
+        view.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        threads[1].join(0.1)
+        view.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(view.calls, 1)
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_200_OK] * 3)
+
+    def test_expired_running_counter(self):
+        """
+        A request which ends after the counter of its route expired does not make the counter negative.
+        """
+        with route_slot('salary_list') as acquired:
+            self.assertTrue(acquired)
+            cache.delete('throttle:running:salary_list')
+            with route_slot('salary_list'):
+                pass
+        self.assertEqual(cache.get('throttle:running:salary_list'), 0)
@@ -1,4 +1,6 @@
 from rest_framework.test import APITestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from employment.api.serializers import WorkArrangementSerializer
@@ -133,14 +135,29 @@ class WorkArrangementCreateTests(WorkArrangementCreateUpdateSetup):
         response = self.client.post(self.url, self.invalid_payload_employee_not_number, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_work_arrangement_queries(self):
+        """
+        The other work arrangements are checked with one query, which also locks the employee: employee, check,
+        insert and change log.
+        """
+        self.client.post(self.url, self.valid_payload_part_time, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, self.valid_payload_part_time, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 4)
+
+    def test_create_invalid_work_arrangement_list_body(self):
+        response = self.client.post(self.url, [self.valid_payload_part_time], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class WorkArrangementUpdateTests(WorkArrangementCreateUpdateSetup):
     def setUp(self):
         super().setUp()
-        self.work_arrangement_full_time = WorkArrangement.objects.create(employee=self.employee_john,
+        self.work_arrangement_full_time = WorkArrangement.objects.create(employee=self.employee_jane,
                                                                          type=WorkArrangement.WorkTypes.FullTime)
         self.work_arrangement_part_time = WorkArrangement.objects.create(employee=self.employee_john,
-                                                                         type=WorkArrangement.WorkTypes.FullTime,
+                                                                         type=WorkArrangement.WorkTypes.PartTime,
                                                                          percentage=40)
         self.url_full_time = reverse("employment-api:work_arrangement_retrieve_update_destroy",
                                      kwargs={'pk': self.work_arrangement_full_time.pk})
@@ -162,6 +179,36 @@ class WorkArrangementUpdateTests(WorkArrangementCreateUpdateSetup):
             WorkArrangement.objects.filter(id=self.work_arrangement_part_time.id).first().type,
             self.valid_payload_full_time.get('type'))
 
+    def test_update_valid_work_arrangement_percentage_without_itself(self):
+        """
+        The old percentage of the updated work arrangement does not count towards the sum.
+        """
+        payload = dict(self.valid_payload_part_time, percentage=80)
+        response = self.client.put(self.url_part_time, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payload = dict(self.valid_payload_part_time, percentage=30)
+        response = self.client.patch(self.url_full_time, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_invalid_work_arrangement_full_time_with_others(self):
+        """
+        A work arrangement can not become full time while the employee has another one.
+        """
+        WorkArrangement.objects.create(employee=self.employee_john, type=WorkArrangement.WorkTypes.PartTime,
+                                       percentage=20)
+        response = self.client.patch(self.url_part_time, {'type': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(WorkArrangement.objects.get(pk=self.work_arrangement_part_time.pk).type,
+                         WorkArrangement.WorkTypes.PartTime)
+
+    def test_update_invalid_work_arrangement_part_time_with_full_time(self):
+        response = self.client.patch(self.url_part_time, {'employee': self.employee_jane.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_invalid_work_arrangement_list_body(self):
+        response = self.client.put(self.url_part_time, [self.valid_payload_part_time], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_update_invalid_work_arrangement_percentage_negative(self):
         response = self.client.put(self.url_part_time, self.invalid_payload_percentage_negative, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)